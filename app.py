@@ -1,5 +1,6 @@
 import logging
 from json import loads
+from time import perf_counter
 
 import structlog
 from retrying import RetryError
@@ -8,11 +9,14 @@ from logger_config import logger_initial_config
 from run import create_app, initialise_db
 
 """
-This is a duplicate of run.py, with minor modifications to support gunicorn execution
+This is a duplicate of run.py, with minor modifications to support gunicorn execution. With preload_app (see
+gunicorn.conf.py) it runs once in the gunicorn master, and the workers forked from it start with the app already built.
 """
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
+start = perf_counter()
+# Imports the views, the controllers and their dependencies, most of the time taken to start
 app = create_app()
 
 with open(app.config["PARTY_SCHEMA"]) as io:
@@ -21,6 +25,7 @@ with open(app.config["PARTY_SCHEMA"]) as io:
 logger_initial_config(log_level=app.config["LOGGING_LEVEL"])
 
 logger.debug("Created Flask app.")
+created = perf_counter()
 
 try:
     initialise_db(app)
@@ -28,4 +33,11 @@ except RetryError:
     logger.exception("Failed to initialise database")
     exit(1)
 
+logger.info(
+    "Initialised app",
+    create_app_ms=round((created - start) * 1000, 1),
+    initialise_db_ms=round((perf_counter() - created) * 1000, 1),
+    database_schema_check=app.config["DATABASE_SCHEMA_CHECK"],
+)
+
 scheme, host, port = app.config["SCHEME"], app.config["HOST"], int(app.config["PORT"])
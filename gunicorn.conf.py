@@ -0,0 +1,64 @@
+import os
+import shutil
+from time import perf_counter
+
+from prometheus_client import multiprocess
+
+from config import _is_true
+
+"""
+Read by gunicorn from the working directory. When PROMETHEUS_MULTIPROC_DIR is set each worker writes its metrics to
+files in that directory, so that a scrape of /metrics handled by any worker reports the totals for all of them.
+"""
+
+config_loaded = perf_counter()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8080")
+workers = int(os.getenv("GUNICORN_WORKERS", "6"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+timeout = 0
+keepalive = 2
+
+# Builds the app once in the master, so the workers forked from it don't each import and initialise it before they can
+# serve requests
+preload_app = _is_true(os.getenv("GUNICORN_PRELOAD_APP", True))
+
+if preload_app and worker_class == "gevent":
+    # The gevent worker patches the standard library as it starts, which is too late for the modules the preloaded app
+    # has already imported
+    from gevent import monkey
+
+    monkey.patch_all()
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this run's
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+
+def when_ready(server):
+    server.log.info(
+        "Ready in %.1fms with preload_app=%s", (perf_counter() - config_loaded) * 1000, server.cfg.preload_app
+    )
+
+
+def post_fork(server, worker):
+    worker.forked_at = perf_counter()
+    if server.cfg.preload_app:
+        # Connections the master opened while initialising the app mustn't be shared with its workers
+        server.app.wsgi().db.dispose(close=False)
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s ready in %.1fms", worker.pid, (perf_counter() - worker.forked_at) * 1000)
+
+
+def child_exit(server, worker):
+    # Drops the gauges of a worker that has exited, so the pool gauges only count live workers
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
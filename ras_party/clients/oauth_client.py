@@ -1,5 +1,6 @@
 from flask import current_app
 
+from ras_party.support.metrics import downstream_request_timer
 from ras_party.support.requests_wrapper import Requests
 
 
@@ -16,9 +17,11 @@ class OauthClient:
             "username": username,
             "password": password,
         }
-        return Requests.post(self.admin_url, data=payload)
+        with downstream_request_timer("auth"):
+            return Requests.post(self.admin_url, data=payload)
 
     def update_account(self, **kwargs):
         payload = {}
         payload.update(kwargs)
-        return Requests.put(self.admin_url, data=payload)
+        with downstream_request_timer("auth"):
+            return Requests.put(self.admin_url, data=payload)
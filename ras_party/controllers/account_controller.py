@@ -1,5 +1,6 @@
 import logging
 import uuid
+from functools import partial
 
 import requests
 import structlog
@@ -17,27 +18,38 @@ from werkzeug.exceptions import (
 )
 
 from ras_party.clients.oauth_client import OauthClient
+from ras_party.controllers.cache_controller import (
+    business_cache_key,
+    invalidate_on_commit,
+    is_respondent_enrolled_cache_key,
+    respondent_cache_key,
+)
 from ras_party.controllers.case_controller import (
     get_cases_for_casegroup,
     post_case_event,
 )
+from ras_party.controllers.enrolments_controller import (
+    invalidate_is_respondent_enrolled,
+)
 from ras_party.controllers.iac_controller import disable_iac, request_iac
-from ras_party.controllers.notify_gateway import NotifyGateway
 from ras_party.controllers.queries import (
     add_respondent_password_verification_token,
     count_enrolment_by_survey_business,
+    count_enrolments_by_business_surveys,
     delete_respondent_password_verification_token,
+    disable_all_enrolments_respondent,
     get_respondent_password_verification_token,
     increase_password_reset_counter,
-    query_all_non_disabled_enrolments_respondent,
     query_business_by_party_uuid,
     query_business_respondent_by_respondent_id_and_business_id,
     query_enrolment_by_survey_business_respondent,
+    query_password_reset_counter,
     query_respondent_by_email,
     query_respondent_by_party_uuid,
     query_respondent_by_pending_email,
     query_single_respondent_by_email,
     reset_password_reset_counter,
+    update_enrolment_statuses,
 )
 from ras_party.controllers.validate import Exists, Validator
 from ras_party.exceptions import RasNotifyError
@@ -49,6 +61,8 @@ from ras_party.models.models import (
     Respondent,
     RespondentStatus,
 )
+from ras_party.support.metrics import downstream_request_timer
+from ras_party.support.parallel import call_in_parallel
 from ras_party.support.public_website import PublicWebsite
 from ras_party.support.requests_wrapper import Requests
 from ras_party.support.session_decorator import (
@@ -232,6 +246,86 @@ def change_respondent_enrolment_status(payload, session):
     )
 
 
+@with_db_session
+def change_respondent_enrolment_statuses(changes, session):
+    """
+    Change the enrolment status of many respondents at once.  The enrolments are updated in one transaction, with an
+    update for each status, and then the case service is told whether each business and survey that changed has any
+    enabled enrolments left.  The cases are looked up and the events posted in parallel, once per business and survey,
+    and a failure to post one doesn't undo the change.
+
+    :param changes: list of dicts holding the respondent_id, business_id, survey_id and change_flag of each enrolment
+    :return: the changes, each with the result of the update and of its case event
+    """
+    enrolments = [
+        (str(uuid.UUID(change["respondent_id"])), str(uuid.UUID(change["business_id"])), change["survey_id"])
+        for change in changes
+    ]
+    if len(set(enrolments)) != len(enrolments):
+        raise BadRequest("An enrolment can only be changed once in a request")
+
+    logger.info("Attempting to change respondent enrolments", enrolments=len(enrolments))
+    enrolments_by_status = {}
+    for enrolment, change in zip(enrolments, changes):
+        enrolments_by_status.setdefault(EnrolmentStatus[change["change_flag"]], []).append(enrolment)
+    updated = set()
+    for status, status_enrolments in enrolments_by_status.items():
+        for party_uuid, business_id, survey_id in update_enrolment_statuses(status_enrolments, status, session):
+            updated.add((str(party_uuid), str(business_id), survey_id))
+
+    invalidate_on_commit(
+        session,
+        *(respondent_cache_key(party_uuid) for party_uuid, _, _ in updated),
+        *(business_cache_key(business_id) for _, business_id, _ in updated),
+        *(is_respondent_enrolled_cache_key(*enrolment) for enrolment in updated),
+    )
+    session.commit()  # Needs to be committed before call to case as that may look up party
+
+    # In the order of the changes, once for each business and survey
+    business_surveys = list(dict.fromkeys(enrolment[1:] for enrolment in enrolments if enrolment in updated))
+    case_events = _post_enrolment_case_events(business_surveys, session) if business_surveys else {}
+
+    results = []
+    for enrolment, change in zip(enrolments, changes):
+        if enrolment in updated:
+            sent = case_events[enrolment[1:]]
+            results.append({**change, "result": "UPDATED", "case_event": "SENT" if sent else "FAILED"})
+        else:
+            results.append({**change, "result": "NOT_FOUND", "case_event": None})
+    logger.info("Completed changing respondent enrolments", enrolments=len(enrolments), updated=len(updated))
+    return results
+
+
+def _post_enrolment_case_events(business_surveys, session):
+    """
+    Tells the case service whether each business and survey has any enabled enrolments left
+
+    :return: dict of whether the event was posted by (business_id, survey_id)
+    """
+    enrolment_counts = {
+        (str(business_id), survey_id): total
+        for business_id, survey_id, total in count_enrolments_by_business_surveys(business_surveys, session)
+    }
+    case_ids = get_case_ids_for_business_surveys(business_surveys)
+
+    def post_event(business_survey):
+        if case_ids[business_survey] is None:
+            return False
+        try:
+            post_case_event(
+                case_id=case_ids[business_survey],
+                category="RESPONDENT_ENROLED" if enrolment_counts.get(business_survey) else "NO_ACTIVE_ENROLMENTS",
+                desc="No active enrolments remaining for case",
+            )
+        except requests.RequestException:
+            logger.exception("Failed to post case event", case_id=case_ids[business_survey])
+            return False
+        return True
+
+    sent = call_in_parallel(partial(post_event, business_survey) for business_survey in business_surveys)
+    return dict(zip(business_surveys, sent))
+
+
 def _change_respondent_enrolment_status(respondent, survey_id, business_id, status, session):
     logger.info(
         "Attempting to change respondent enrolment",
@@ -251,6 +345,7 @@ def _change_respondent_enrolment_status(respondent, survey_id, business_id, stat
     )
     enrolment.status = status
     session.commit()  # Needs to be committed before call to case as that may look up party
+    invalidate_is_respondent_enrolled(respondent.party_uuid, business_id, survey_id)
 
     # If no enrolments are remaining for business/survey
     # then send NO_ACTIVE_ENROLMENTS case event
@@ -283,36 +378,58 @@ def _change_respondent_enrolment_status(respondent, survey_id, business_id, stat
 
 @with_db_session
 def disable_all_respondent_enrolments(respondent_email, session):
-    """Disables all enrolments for a respondent ,  returns the count of the removed enrolments"""
+    """
+    Disables all enrolments for a respondent, returns the count of the removed enrolments.  The enrolments are disabled
+    in one update, and the case service is told whether each business and survey has any enrolments left, with the
+    cases looked up and the events posted in parallel.
+    """
 
     obfuscated_email = obfuscate_email(respondent_email)
 
     logger.info("Disabling all enrolments for respondent", email=obfuscated_email)
 
-    removed_enrolments_count = 0
-
     # raises errors if none or multiple, unusual import to avoid circular references
     respondent = get_single_respondent_by_email(respondent_email, session)
 
-    enrolments = query_all_non_disabled_enrolments_respondent(respondent.id, session)
+    business_surveys = [tuple(row) for row in disable_all_enrolments_respondent(respondent.id, session)]
+    invalidate_on_commit(
+        session,
+        respondent_cache_key(respondent.party_uuid),
+        *(business_cache_key(business_id) for business_id, _ in business_surveys),
+        *(
+            is_respondent_enrolled_cache_key(respondent.party_uuid, business_id, survey_id)
+            for business_id, survey_id in business_surveys
+        ),
+    )
+    session.commit()  # Needs to be committed before call to case as that may look up party
 
-    for enrolment in enrolments:
-        _change_respondent_enrolment_status(
-            respondent=respondent,
-            survey_id=enrolment.survey_id,
-            business_id=enrolment.business_id,
-            status="DISABLED",
-            session=session,
+    if business_surveys:
+        enrolment_counts = {
+            (business_id, survey_id): total
+            for business_id, survey_id, total in count_enrolments_by_business_surveys(business_surveys, session)
+        }
+        case_ids = get_case_ids_for_business_surveys(business_surveys)
+        unresolved = [business_survey for business_survey in business_surveys if case_ids[business_survey] is None]
+        if unresolved:
+            logger.error("No case events posted for businesses and surveys without a case", business_surveys=unresolved)
+        call_in_parallel(
+            partial(
+                post_case_event,
+                case_id=case_ids[business_survey],
+                category="RESPONDENT_ENROLED" if enrolment_counts.get(business_survey) else "NO_ACTIVE_ENROLMENTS",
+                desc="No active enrolments remaining for case",
+            )
+            for business_survey in business_surveys
+            if case_ids[business_survey] is not None
         )
-        removed_enrolments_count += 1
 
     logger.info(
         "Completed disabling respondent enrolments",
         email=obfuscated_email,
-        removed_enrolment_count=removed_enrolments_count,
+        removed_enrolment_count=len(business_surveys),
     )
 
-    return removed_enrolments_count
+    return len(business_surveys)
 
 
 def get_single_respondent_by_email(email, session):
@@ -353,7 +470,8 @@ def change_respondent(payload, session):
         logger.info("Respondent does not exist")
         raise NotFound("Respondent does not exist")
 
-    if new_email_address == email_address:
+    # Email addresses are stored lower case, so a change of case alone isn't a change
+    if new_email_address.lower() == email_address.lower():
         return respondent.to_respondent_with_associations_dict()
 
     respondent_with_new_email = query_respondent_by_email(new_email_address, session)
@@ -432,12 +550,12 @@ def get_respondent_password_token(respondent_id, session):
     :returns: verification token
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
+    token = get_respondent_password_verification_token(respondent_id, session)
+    if not token:
         logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
         raise NotFound("Respondent id does not exist")
 
-    return get_respondent_password_verification_token(respondent_id, session)
+    return token.password_verification_token
 
 
 @with_db_session
@@ -451,12 +569,10 @@ def add_respondent_password_token(respondent_id, token, session):
     :return: None on success
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
+    if not add_respondent_password_verification_token(respondent_id, token, session):
         logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
         raise NotFound("Respondent id does not exist")
-
-    add_respondent_password_verification_token(respondent_id, token, session)
+    invalidate_on_commit(session, respondent_cache_key(respondent_id))
 
 
 @with_db_session
@@ -470,18 +586,18 @@ def delete_respondent_password_token(respondent_id, token, session):
     :return: None on success
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
-        logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
-        raise NotFound("Respondent id does not exist")
-    if not respondent.password_verification_token:
-        logger.info("Verification token not found")
-        raise NotFound("Verification token not found")
     if not token:
         logger.info("Verification token not received")
         raise BadRequest("Verification token not received")
 
-    delete_respondent_password_verification_token(respondent_id, session)
+    if not delete_respondent_password_verification_token(respondent_id, session):
+        # Only looked up to tell why nothing was removed
+        if not query_respondent_by_party_uuid(respondent_id, session):
+            logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
+            raise NotFound("Respondent id does not exist")
+        logger.info("Verification token not found")
+        raise NotFound("Verification token not found")
+    invalidate_on_commit(session, respondent_cache_key(respondent_id))
 
 
 @with_query_only_db_session
@@ -494,11 +610,11 @@ def get_password_counter(respondent_id, session):
     :return: current number of password reset attempts
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
+    counter = query_password_reset_counter(respondent_id, session)
+    if not counter:
         logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
         raise NotFound("Respondent id does not exist")
-    return respondent.password_reset_counter
+    return counter.password_reset_counter
 
 
 @with_db_session
@@ -508,15 +624,15 @@ def increase_password_counter(respondent_id, session):
 
     :param respondent_id: the respondent's id
     :param session: a db session
-    :return: None on success
+    :return: the increased number of password reset attempts
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
+    counter = increase_password_reset_counter(respondent_id, session)
+    if counter is None:
         logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
         raise NotFound("Respondent id does not exist")
-
-    increase_password_reset_counter(respondent_id, respondent.password_reset_counter + 1, session)
+    invalidate_on_commit(session, respondent_cache_key(respondent_id))
+    return counter
 
 
 @with_db_session
@@ -529,12 +645,10 @@ def reset_password_counter(respondent_id, session):
     :return: None on success
     """
 
-    respondent = query_respondent_by_party_uuid(respondent_id, session)
-    if not respondent:
+    if not reset_password_reset_counter(respondent_id, session):
         logger.info("Respondent with party id does not exist", respondent_id=respondent_id)
         raise NotFound("Respondent id does not exist")
-
-    reset_password_reset_counter(respondent_id, session)
+    invalidate_on_commit(session, respondent_cache_key(respondent_id))
 
 
 @transactional
@@ -578,7 +692,7 @@ def change_respondent_password(payload, tran, session):
     party_id = respondent.party_uuid
 
     try:
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email_address,
             template_name="confirm_password_change",
             personalisation=personalisation,
@@ -618,7 +732,7 @@ def request_password_change(payload, session):
     logger.info("Reset password url", url=verification_url, party_id=party_id)
 
     try:
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email_address,
             template_name="request_password_change",
             personalisation=personalisation,
@@ -693,7 +807,7 @@ def notify_change_account_status(payload, party_id: str, session):
         logger.info("Unlock account via password reset url", url=verification_url, party_id=party_id)
 
         try:
-            NotifyGateway(current_app.config).request_to_notify(
+            current_app.notify_gateway.request_to_notify(
                 email=email_address,
                 template_name="notify_account_locked",
                 personalisation=personalisation,
@@ -980,7 +1094,7 @@ def _send_email_verification(party_id, email):
     logger.info("Verification URL for party_id", party_id=str(party_id), url=verification_url)
 
     try:
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email, template_name="email_verification", personalisation=personalisation, reference=str(party_id)
         )
         logger.info("Verification email sent", party_id=str(party_id))
@@ -995,7 +1109,7 @@ def _send_account_email_change_email(personalisation, template, email, party_id)
     """
     try:
         logger.info("sending confirmation email for respondent account change", party_id=str(party_id))
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email, template_name=template, personalisation=personalisation
         )
         logger.info("confirmation email for respondent account change sent", party_id=str(party_id))
@@ -1083,7 +1197,8 @@ def request_case(enrolment_code):
     """
     case_url = f'{current_app.config["CASE_URL"]}/cases/iac/{enrolment_code}'
     logger.info("Retrieving case from an enrolment code", enrolment_code=enrolment_code)
-    response = Requests.get(case_url)
+    with downstream_request_timer("case"):
+        response = Requests.get(case_url)
     response.raise_for_status()
     logger.info("Successfully retrieved case from an enrolment code", enrolment_code=enrolment_code)
     return response.json()
@@ -1097,7 +1212,8 @@ def request_collection_exercise(collection_exercise_id):
     """
     ce_url = f'{current_app.config["COLLECTION_EXERCISE_URL"]}/collectionexercises/{collection_exercise_id}'
     logger.info("Retrieving collection exercise by id", collection_exercise_id=collection_exercise_id)
-    response = Requests.get(ce_url)
+    with downstream_request_timer("collection_exercise"):
+        response = Requests.get(ce_url)
     response.raise_for_status()
     logger.info("Successfully retrived collection exercise by id")
     return response.json()
@@ -1107,7 +1223,8 @@ def request_casegroups_for_business(business_id):
     logger.info("Retrieving casegroups for business", business_id=business_id)
     url = f'{current_app.config["CASE_URL"]}/casegroups/partyid/{business_id}'
     auth = (current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
-    response = requests.get(url, auth=auth)
+    with downstream_request_timer("case"):
+        response = requests.get(url, auth=auth)
     response.raise_for_status()
     logger.info("Successfully retrieved casegroups for business", business_id=business_id)
     return response.json()
@@ -1117,7 +1234,8 @@ def request_collection_exercises_for_survey(survey_id):
     logger.info("Retrieving collection exercises for survey", survey_id=survey_id)
     url = f'{current_app.config["COLLECTION_EXERCISE_URL"]}/collectionexercises/survey/{survey_id}'
     auth = (current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
-    response = requests.get(url, auth=auth)
+    with downstream_request_timer("collection_exercise"):
+        response = requests.get(url, auth=auth)
     response.raise_for_status()
     logger.info("Successfully retrieved collection exercises for survey", survey_id=survey_id)
     return response.json()
@@ -1147,6 +1265,85 @@ def get_case_id_for_business_survey(survey_id, business_id):
     return cases[0]["id"]
 
 
+def get_case_ids_for_business_surveys(business_surveys):
+    """
+    Gets the case for each of many business and survey pairs, as get_case_id_for_business_survey does for one, but
+    requesting the collection exercises of each survey, the casegroups of each business and the cases of each casegroup
+    only once, and in parallel
+
+    :param business_surveys: list of (business_id, survey_id) tuples
+    :return: dict of case id by (business_id, survey_id), None for a pair whose case couldn't be found, so that one
+             failed lookup doesn't stop the others
+    """
+    logger.info("Retrieving cases for businesses and surveys", business_surveys=len(business_surveys))
+    survey_ids = list({survey_id for _, survey_id in business_surveys})
+    business_ids = list({business_id for business_id, _ in business_surveys})
+
+    responses = call_in_parallel(
+        [partial(_request_or_none, request_collection_exercises_for_survey, survey_id) for survey_id in survey_ids]
+        + [partial(_request_or_none, request_casegroups_for_business, business_id) for business_id in business_ids]
+    )
+    collection_exercises = dict(zip(survey_ids, responses))
+    casegroups = dict(zip(business_ids, responses[len(survey_ids) :]))
+
+    case_group_ids = {
+        (business_id, survey_id): _case_group_id(casegroups[business_id], collection_exercises[survey_id])
+        for business_id, survey_id in business_surveys
+    }
+    distinct_case_group_ids = list({case_group_id for case_group_id in case_group_ids.values() if case_group_id})
+    cases = dict(
+        zip(
+            distinct_case_group_ids,
+            call_in_parallel(
+                partial(_request_or_none, get_cases_for_casegroup, case_group_id)
+                for case_group_id in distinct_case_group_ids
+            ),
+        )
+    )
+
+    case_ids = {
+        business_survey: _case_id(cases.get(case_group_id)) for business_survey, case_group_id in case_group_ids.items()
+    }
+    for (business_id, survey_id), case_id in case_ids.items():
+        if case_id is None:
+            logger.error(
+                "Unable to find the case for business and survey", business_id=business_id, survey_id=survey_id
+            )
+    return case_ids
+
+
+def _request_or_none(request, *args):
+    try:
+        return request(*args)
+    except (requests.RequestException, ValueError):
+        logger.exception("Failed to retrieve from downstream service", request=request.__name__, args=args)
+        return None
+
+
+def _case_group_id(casegroups, collection_exercises):
+    """
+    :return: the id of the first of the business's casegroups in one of the survey's collection exercises, or None if
+             there isn't one or either response couldn't be retrieved or read
+    """
+    try:
+        collection_exercise_ids = {collection_exercise["id"] for collection_exercise in collection_exercises}
+        return next(
+            casegroup["id"] for casegroup in casegroups if casegroup["collectionExerciseId"] in collection_exercise_ids
+        )
+    except (StopIteration, TypeError, KeyError):
+        return None
+
+
+def _case_id(cases):
+    """
+    :return: the id of the first of the casegroup's cases, or None if it has none or they couldn't be retrieved or read
+    """
+    try:
+        return cases[0]["id"]
+    except (IndexError, TypeError, KeyError):
+        return None
+
+
 def _is_valid(payload, attribute):
     v = Validator(Exists(attribute))
     if v.validate(payload):
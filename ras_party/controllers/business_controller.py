@@ -5,13 +5,19 @@ import structlog
 from flask import current_app, session
 from werkzeug.exceptions import BadRequest, NotFound
 
+from ras_party.controllers.cache_controller import get_or_set_business
 from ras_party.controllers.queries import (
+    count_business_attributes_by_sample_summary_id,
+    delete_business_attributes_batch_by_sample_summary_id,
+    query_business_associations_by_party_uuids,
     query_business_attributes,
-    query_business_attributes_by_collection_exercise,
     query_business_by_party_uuid,
     query_business_by_ref,
-    query_businesses_by_party_uuids,
+    query_business_names_by_party_uuids,
+    query_business_summaries_by_party_uuids,
+    query_business_version,
     query_latest_business_details,
+    search_business_attributes,
     search_business_with_ru_ref,
     search_businesses,
 )
@@ -24,6 +30,13 @@ from ras_party.support.session_decorator import (
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
+# Each key is projected with a name and a value argument, and postgres functions take at most 100 arguments
+MAX_ATTRIBUTE_KEYS = 50
+# A page of an attribute search, and the matches counted exactly before the count is estimated, are bounded so that a
+# search can't return or count a whole sample
+MAX_SEARCH_LIMIT = 1000
+MAX_SEARCH_MAX_REC = 100000
+
 
 @with_query_only_db_session
 def get_business_by_ref(ref, session):
@@ -60,8 +73,57 @@ def get_businesses_by_ids(party_uuids, session):
             logger.info("Invalid party uuid value", party_uuid=party_uuid)
             raise BadRequest(f"'{party_uuid}' is not a valid UUID format for property 'id'")
 
-    businesses = query_businesses_by_party_uuids(party_uuids, session)
-    return [business.to_business_summary_dict() for business in businesses]
+    businesses = query_business_summaries_by_party_uuids(party_uuids, session)
+    associations = Business.associations_from_rows(query_business_associations_by_party_uuids(party_uuids, session))
+    business_summaries = []
+    for business in businesses:
+        if business.attributes_business_id is None:
+            logger.error("No active attributes for business", reference=business.business_ref, status=400)
+            raise BadRequest("Business with reference does not have any active attributes.")
+        business_summaries.append(
+            Business.business_summary_dict(
+                business.party_uuid,
+                business.business_ref,
+                business.sample_summary_id,
+                business.name,
+                business.trading_as,
+                associations.get(business.party_uuid, []),
+            )
+        )
+    return business_summaries
+
+
+@with_query_only_db_session
+def get_business_names_by_ids(party_uuids, session) -> dict:
+    """
+    Get the names of a list of businesses, as found in their most recent active attributes, in a single query.
+
+    :param party_uuids: A list of party_ids' to get the names of
+    :param session: A database session
+    :returns: A dict of business name keyed by party id, in the order the ids were supplied
+    :raises BadRequest: Raised if any of the uuids provided aren't valid uuids
+    :raises NotFound: Raised if any of the businesses don't exist or have no active attributes
+    """
+    # The names are found by the canonical form of each id, as the database returns them, so an id given in upper
+    # case or braces is still found
+    canonical_uuids = {}
+    for party_uuid in party_uuids:
+        try:
+            canonical_uuids[str(party_uuid)] = str(uuid.UUID(str(party_uuid)))
+        except ValueError:
+            logger.info("Invalid party uuid value", party_uuid=party_uuid)
+            raise BadRequest(f"'{party_uuid}' is not a valid UUID format for property 'id'")
+
+    names = {
+        str(business_id): name
+        for business_id, name in query_business_names_by_party_uuids(list(canonical_uuids.values()), session)
+    }
+    missing = [party_uuid for party_uuid, canonical_uuid in canonical_uuids.items() if canonical_uuid not in names]
+    if missing:
+        logger.info("Business with id does not exist", party_uuids=missing)
+        raise NotFound("Business with party id does not exist")
+
+    return {party_uuid: names[canonical_uuid] for party_uuid, canonical_uuid in canonical_uuids.items()}
 
 
 @with_query_only_db_session
@@ -78,7 +140,7 @@ def get_latest_business_details(party_uuids: list, session: session) -> list:
 
 
 @with_query_only_db_session
-def get_business_attributes(business_id, session, collection_exercise_ids=None):
+def get_business_attributes(business_id, session, collection_exercise_ids=None, attribute_keys=None):
     """
     Get a list of businesses by business id and (optionally) collection exercise ids
 
@@ -87,35 +149,108 @@ def get_business_attributes(business_id, session, collection_exercise_ids=None):
 
     :param business_id: A business's uuid
     :param collection_exercise_ids: A list of collection exercise ids
+    :param attribute_keys: A list of the attribute keys to return, instead of all of them
     :param session: A database session
     :returns: A dict of BusinessAttributes, keyed by the collection_exercise id
     :rtype: dict of (str, BusinessAttributes)
     :raises BadRequest: Raised if any of the uuids provided aren't valid uuids
     """
-    try:
-        uuid.UUID(business_id)
-    except ValueError:
-        logger.warning("Invalid party uuid value", business_id=business_id)
-        raise BadRequest(f"'{business_id}' is not a valid UUID format for property 'id'")
+    attributes = _get_businesses_attributes([business_id], collection_exercise_ids, attribute_keys, session)
+    return next(iter(attributes.values()))
+
+
+@with_query_only_db_session
+def get_businesses_attributes(business_ids, session, collection_exercise_ids=None, attribute_keys=None):
+    """
+    Get the attributes of many businesses at once, such as all of those in a sample, in a single query
+
+    :param business_ids: A list of business uuids
+    :param collection_exercise_ids: A list of collection exercise ids
+    :param attribute_keys: A list of the attribute keys to return, instead of all of them
+    :param session: A database session
+    :returns: A dict of the attributes of each business, keyed by the collection_exercise id, keyed by business id
+    :raises BadRequest: Raised if any of the uuids provided aren't valid uuids or there are too many attribute keys
+    """
+    return _get_businesses_attributes(business_ids, collection_exercise_ids, attribute_keys, session)
+
+
+def _get_businesses_attributes(business_ids, collection_exercise_ids, attribute_keys, session):
+    normalised_business_ids = []
+    for business_id in business_ids:
+        try:
+            normalised_business_ids.append(str(uuid.UUID(business_id)))
+        except (TypeError, ValueError, AttributeError):
+            logger.warning("Invalid party uuid value", business_id=business_id)
+            raise BadRequest(f"'{business_id}' is not a valid UUID format for property 'id'")
 
     if collection_exercise_ids:
         for collection_exercise_id in collection_exercise_ids:
             try:
                 uuid.UUID(collection_exercise_id)
-            except ValueError:
+            except (TypeError, ValueError, AttributeError):
                 logger.warning("Invalid collection exercise uuid value", collection_exercise_id=collection_exercise_id)
                 raise BadRequest(f"'{collection_exercise_id}' is not a valid UUID format for property 'id'")
-        attributes = query_business_attributes_by_collection_exercise(business_id, collection_exercise_ids, session)
-    else:
-        attributes = query_business_attributes(business_id, session)
 
+    if attribute_keys and len(attribute_keys) > MAX_ATTRIBUTE_KEYS:
+        logger.warning("Too many attribute keys", attribute_keys=len(attribute_keys))
+        raise BadRequest(f"At most {MAX_ATTRIBUTE_KEYS} attribute keys can be requested")
+
+    attributes = {business_id: {} for business_id in normalised_business_ids}
+    rows = query_business_attributes(
+        normalised_business_ids, session, collection_exercise_ids=collection_exercise_ids, attribute_keys=attribute_keys
+    )
+    for row in rows:
+        attributes[str(row.business_id)][row.collection_exercise] = BusinessAttributes.attributes_dict(row)
+    return attributes
+
+
+@with_query_only_db_session
+def search_businesses_by_attributes(
+    collection_exercise_id, attributes, page, limit, max_rec, session, attribute_keys=None
+) -> dict:
+    """
+    Find the businesses in a collection exercise by the values of their attributes, a page at a time, instead of
+    fetching the attributes of every business in the sample and filtering them
+
+    :param collection_exercise_id: A collection exercise id
+    :param attributes: A dict of the attribute values the businesses must have, e.g. {"region": "WW"}
+    :param page: The page of results to return, from 1
+    :param limit: The number of results in a page
+    :param max_rec: The number of matches to count exactly, past which the count is an estimate
+    :param attribute_keys: A list of the attribute keys to return, instead of all of them
+    :param session: A database session
+    :returns: A dict of the page of BusinessAttributes, the total count of matches and whether it's an estimate
+    :raises BadRequest: Raised if the collection exercise id isn't a valid uuid, the search is malformed or limit or
+                        max_rec is over its maximum
+    """
+    try:
+        uuid.UUID(collection_exercise_id)
+    except (TypeError, ValueError):
+        logger.warning("Invalid collection exercise uuid value", collection_exercise_id=collection_exercise_id)
+        raise BadRequest(f"'{collection_exercise_id}' is not a valid UUID format for property 'collection_exercise_id'")
+    if not isinstance(attributes, dict):
+        raise BadRequest("attributes must be an object of the attribute values to match")
+    if page < 1 or limit < 1 or max_rec < 1:
+        raise BadRequest("page, limit and max_rec must be positive")
+    if limit > MAX_SEARCH_LIMIT or max_rec > MAX_SEARCH_MAX_REC:
+        logger.warning("Attribute search too large", limit=limit, max_rec=max_rec)
+        raise BadRequest(f"limit can be at most {MAX_SEARCH_LIMIT} and max_rec at most {MAX_SEARCH_MAX_REC}")
+    if attribute_keys and len(attribute_keys) > MAX_ATTRIBUTE_KEYS:
+        logger.warning("Too many attribute keys", attribute_keys=len(attribute_keys))
+        raise BadRequest(f"At most {MAX_ATTRIBUTE_KEYS} attribute keys can be requested")
+
+    rows, total, estimated = search_business_attributes(
+        collection_exercise_id, attributes, page, limit, max_rec, session, attribute_keys=attribute_keys
+    )
     return {
-        attribute.collection_exercise: attribute.to_dict() for attribute in attributes if attribute.collection_exercise
+        "attributes": [BusinessAttributes.attributes_dict(row) for row in rows],
+        "total_count": total,
+        "total_count_estimated": estimated,
     }
 
 
 @with_query_only_db_session
-def get_business_by_id(party_uuid, session, verbose=False, collection_exercise_id=None):
+def get_business_by_id(party_uuid, session, verbose=False, collection_exercise_id=None, version=None):
     """
     Get a Business by its Party ID
 
@@ -124,6 +259,7 @@ def get_business_by_id(party_uuid, session, verbose=False, collection_exercise_i
     :param verbose: Verbosity of business details
     :param collection_exercise_id: ID of Collection Exercise version of party
     :type collection_exercise_id: str
+    :param version: the version from get_business_version the response is for, so a cached copy of another isn't used
     :returns: A business object containing the data for the business
     :rtype: Business
     :raises BadRequest: Raised if the party_uuid is an invalid uuid
@@ -135,6 +271,30 @@ def get_business_by_id(party_uuid, session, verbose=False, collection_exercise_i
         logger.info("Invalid party uuid value", party_uuid=party_uuid)
         raise BadRequest(f"'{party_uuid}' is not a valid UUID format for property 'id'")
 
+    return get_or_set_business(
+        party_uuid,
+        f"{verbose}:{collection_exercise_id}",
+        lambda: _get_business_dict(party_uuid, verbose, collection_exercise_id, session),
+        version,
+    )
+
+
+@with_query_only_db_session
+def get_business_version(party_uuid, session):
+    """
+    Get a hash that changes whenever any representation of the business does, for use as an ETag
+
+    :param party_uuid: ID of the business
+    :return: the version or None if the business doesn't exist or the id isn't a valid uuid
+    """
+    try:
+        uuid.UUID(party_uuid)
+    except ValueError:
+        return None
+    return query_business_version(party_uuid, session)
+
+
+def _get_business_dict(party_uuid, verbose, collection_exercise_id, session):
     business = query_business_by_party_uuid(party_uuid, session)
     if not business:
         logger.info("Business with id does not exist", party_uuid=party_uuid)
@@ -167,11 +327,12 @@ def businesses_post(business_data, session):
     business = query_business_by_ref(party_data["sampleUnitRef"], session)
     if business:
         party_data["id"] = str(business.party_uuid)
-        business.add_versioned_attributes(party_data)
+        attributes = business.add_versioned_attributes(party_data, current_app.config["ATTRIBUTES_SNAPSHOT_INTERVAL"])
         session.merge(business)
-    else:
-        business = Business.from_party_dict(party_data)
-        session.add(business)
+        return business.to_post_response_dict(attributes)
+
+    business = Business.from_party_dict(party_data)
+    session.add(business)
     return business.to_post_response_dict()
 
 
@@ -213,12 +374,17 @@ def get_businesses_by_search_query(search_query: str, page: int, limit: int, max
 
 
 @with_db_session
-def delete_attributes_by_sample_summary_id(sample_summary_id: str, session) -> None:
+def delete_attributes_by_sample_summary_id(sample_summary_id: str, session, dry_run: bool = False) -> int:
     """
-    Delete all the business attributes for a given sample_summary_id.
+    Delete all the business attributes for a given sample_summary_id.  The rows are removed in batches of
+    DELETE_ATTRIBUTES_BATCH_SIZE, committing after each batch so row locks are only held for the duration of a
+    single batch rather than the whole sample.
 
     :param sample_summary_id: A sample summary id
     :param session: A db session
+    :param dry_run: If True, only count the attributes that would be deleted
+    :return: The number of attributes deleted, or that would be deleted if dry_run is set
+    :rtype: int
     """
     logger.info("Searching for business attributes to delete by sample summary id", sample_summary_id=sample_summary_id)
     try:
@@ -226,12 +392,26 @@ def delete_attributes_by_sample_summary_id(sample_summary_id: str, session) -> N
     except ValueError:
         logger.info("Invalid sample_summary_id value", sample_summary_id=sample_summary_id)
         raise BadRequest(f"'{sample_summary_id}' is not a valid UUID format")
-    attributes = session.query(BusinessAttributes).filter(BusinessAttributes.sample_summary_id == sample_summary_id)
-    attribute_count = attributes.count()
-    if attribute_count > 0:
-        attributes.delete()
+
+    if dry_run:
+        attribute_count = count_business_attributes_by_sample_summary_id(sample_summary_id, session)
+        logger.info("Dry run, no attributes deleted", sample_summary_id=sample_summary_id, records=attribute_count)
+        return attribute_count
+
+    batch_size = current_app.config["DELETE_ATTRIBUTES_BATCH_SIZE"]
+    records_deleted = 0
+    while True:
+        deleted = delete_business_attributes_batch_by_sample_summary_id(sample_summary_id, batch_size, session)
+        session.commit()
+        records_deleted += deleted
+        if deleted < batch_size:
+            break
+        logger.info("Deleted batch of attributes", sample_summary_id=sample_summary_id, records_deleted=records_deleted)
+
+    if records_deleted > 0:
         logger.info(
-            "Successfully deleted attributes", sample_summary_id=sample_summary_id, records_deleted=attribute_count
+            "Successfully deleted attributes", sample_summary_id=sample_summary_id, records_deleted=records_deleted
         )
     else:
         logger.info("No attributes to delete", sample_summary_id=sample_summary_id)
+    return records_deleted
@@ -0,0 +1,134 @@
+import logging
+from itertools import chain
+
+import structlog
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from ras_party.controllers.queries import (
+    query_businesses_and_enrolments_by_respondent_ids,
+    query_respondent_party_uuids_by_ids,
+)
+from ras_party.models.models import (
+    Business,
+    BusinessAttributes,
+    BusinessRespondent,
+    Enrolment,
+    Respondent,
+)
+from ras_party.support.metrics import record_cache_lookup
+
+logger = structlog.wrap_logger(logging.getLogger(__name__))
+
+SURVEYS_CACHE_KEY = "surveys"
+
+_PENDING_INVALIDATIONS = "cache_invalidations"
+
+
+def business_cache_key(party_uuid) -> str:
+    return f"business:{party_uuid}"
+
+
+def respondent_cache_key(party_uuid) -> str:
+    return f"respondent:{party_uuid}"
+
+
+def is_respondent_enrolled_cache_key(party_uuid, business_id, survey_id) -> str:
+    return f"is_respondent_enrolled:{party_uuid}:{business_id}:{survey_id}"
+
+
+def get_or_set_business(party_uuid, variant: str, loader, version=None):
+    """
+    Cache-aside read of a business representation. Every variant of a business (verbose, per collection exercise) is
+    held under the one key so that a single delete invalidates all of them. Each is held with the version it was
+    built for, and given a version a variant built for another one is built again, so that it matches the ETag.
+    """
+    key = business_cache_key(party_uuid)
+    variants = dict(current_app.cache.get(key) or {})
+    entry = variants.get(variant)
+    hit = entry is not None and (version is None or entry["version"] == version)
+    record_cache_lookup(key, hit=hit)
+    if not hit:
+        entry = {"version": version, "value": loader()}
+        variants[variant] = entry
+        current_app.cache.set(key, variants, current_app.config["CACHE_TTL"])
+    return entry["value"]
+
+
+def invalidate_on_commit(session, *keys):
+    """
+    Queues cache keys to be deleted once the session commits, for writes the session can't see such as bulk
+    updates and core inserts. Deleting after the commit stops another request caching the old value in between.
+    """
+    session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(keys)
+
+
+def register_cache_invalidation(session_factory):
+    """
+    Deletes the cached business and respondent for every Business, BusinessAttributes, BusinessRespondent, Enrolment
+    and Respondent flushed by a session, once that session commits, along with the enrolment check of every Enrolment
+    and the businesses and enrolment checks of a respondent whose status changed. As the cache is shared between
+    workers when CACHE_REDIS_URL is set, this invalidates them all.
+    """
+    event.listen(session_factory, "after_flush", _collect_invalidations)
+    event.listen(session_factory, "after_commit", _apply_invalidations)
+    event.listen(session_factory, "after_rollback", _discard_invalidations)
+
+
+def _collect_invalidations(session, _):
+    keys = set()
+    respondents_changing_status = {}
+    enrolments = set()
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, Respondent):
+            keys.add(respondent_cache_key(instance.party_uuid))
+            if instance in session.dirty and inspect(instance).attrs.status.history.has_changes():
+                respondents_changing_status[instance.id] = instance.party_uuid
+        elif isinstance(instance, Business):
+            keys.add(business_cache_key(instance.party_uuid))
+        elif isinstance(instance, (BusinessAttributes, BusinessRespondent, Enrolment)):
+            keys.add(business_cache_key(instance.business_id))
+            if isinstance(instance, Enrolment):
+                enrolments.add((instance.respondent_id, instance.business_id, instance.survey_id))
+    if respondents_changing_status:
+        keys.update(_respondent_status_keys(respondents_changing_status, session))
+    if enrolments:
+        keys.update(_enrolment_keys(enrolments, session))
+    if keys:
+        invalidate_on_commit(session, *keys)
+
+
+def _respondent_status_keys(respondents, session):
+    """
+    The keys of what depends on the status of the respondents: whether they're enrolled, and their businesses, as
+    those hold the status of each of their respondents
+    """
+    for respondent_id, business_id, survey_id in query_businesses_and_enrolments_by_respondent_ids(
+        list(respondents), session
+    ):
+        yield business_cache_key(business_id)
+        if survey_id is not None:
+            yield is_respondent_enrolled_cache_key(respondents[respondent_id], business_id, survey_id)
+
+
+def _enrolment_keys(enrolments, session):
+    """
+    The keys of the enrolment checks of the enrolments, as a check that found no enrolment is cached too
+    """
+    party_uuids = query_respondent_party_uuids_by_ids(
+        list({respondent_id for respondent_id, _, _ in enrolments}), session
+    )
+    for respondent_id, business_id, survey_id in enrolments:
+        if respondent_id in party_uuids:
+            yield is_respondent_enrolled_cache_key(party_uuids[respondent_id], business_id, survey_id)
+
+
+def _apply_invalidations(session):
+    keys = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if keys and has_app_context():
+        logger.debug("Invalidating cache entries", keys=len(keys))
+        current_app.cache.delete(*keys)
+
+
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
@@ -4,6 +4,8 @@ import requests
 import structlog
 from flask import current_app
 
+from ras_party.support.metrics import downstream_request_timer
+
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
 
@@ -18,7 +20,8 @@ def post_case_event(case_id: str, category="Default category message", desc="Def
     payload = {"description": desc, "category": category, "createdBy": "Party Service"}
     auth = (current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
 
-    response = requests.post(case_url, json=payload, auth=auth)
+    with downstream_request_timer("case"):
+        response = requests.post(case_url, json=payload, auth=auth)
     response.raise_for_status()
     logger.info("Successfully posted case event", case_id=case_id)
     return response.json()
@@ -29,7 +32,8 @@ def get_cases_for_casegroup(case_group_id: str):
     case_svc = current_app.config["CASE_URL"]
     get_case_url = f"{case_svc}/cases/casegroupid/{case_group_id}"
     auth = (current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
-    response = requests.get(get_case_url, auth=auth)
+    with downstream_request_timer("case"):
+        response = requests.get(get_case_url, auth=auth)
     response.raise_for_status()
     logger.info("Successfully retrieved case for case group", casegroup_id=case_group_id)
     return response.json()
@@ -3,17 +3,22 @@ from collections import defaultdict
 from uuid import UUID
 
 import structlog
-from flask import session
+from flask import current_app, session
 from sqlalchemy.orm.exc import NoResultFound
 
+from ras_party.controllers.cache_controller import is_respondent_enrolled_cache_key
 from ras_party.controllers.queries import (
-    query_enrolment_by_survey_business_respondent,
+    query_is_respondent_enrolled,
     query_respondent_by_party_uuid,
     query_respondent_enrolments,
+    rebuild_respondent_enrolment_summary,
 )
 from ras_party.controllers.survey_controller import get_surveys_details
-from ras_party.models.models import Enrolment, RespondentStatus
-from ras_party.support.session_decorator import with_query_only_db_session
+from ras_party.models.models import Enrolment
+from ras_party.support.session_decorator import (
+    with_db_session,
+    with_query_only_db_session,
+)
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
@@ -32,7 +37,7 @@ def respondent_enrolments(
 
     enrolments = query_respondent_enrolments(session, respondent.id, business_id, survey_id, status)
 
-    if enrolments.rowcount == 0:
+    if not enrolments:
         return []
 
     surveys_details = get_surveys_details()
@@ -42,33 +47,59 @@ def respondent_enrolments(
         business_ref = enrolment.business_ref
         survey_id = enrolment.survey_id
 
-        enrolments_map[business_ref]["business_name"] = enrolment.attributes["name"]
+        enrolments_map[business_ref]["business_name"] = enrolment.business_name
         enrolments_map[business_ref]["business_id"] = enrolment.business_id
         enrolments_map[business_ref]["ru_ref"] = enrolment.business_ref
-        enrolments_map[business_ref]["trading_as"] = enrolment.attributes["trading_as"]
+        enrolments_map[business_ref]["trading_as"] = enrolment.trading_as
         enrolments_map[business_ref]["survey_details"].append(
             {
                 "id": survey_id,
                 "long_name": surveys_details.get(survey_id)["long_name"],
                 "short_name": surveys_details.get(survey_id)["short_name"],
                 "ref": surveys_details.get(survey_id)["ref"],
-                "enrolment_status": enrolment.status,
+                "enrolment_status": enrolment.status.name,
             }
         )
 
     return list(enrolments_map.values())
 
 
+@with_db_session
+def rebuild_enrolment_summary(session: session) -> int:
+    """
+    Rebuilds the respondent enrolment summary from the enrolment and business attributes tables, for use if the
+    summary is ever found to be out of step with them
+
+    :return: the number of enrolments in the rebuilt summary
+    """
+    records = rebuild_respondent_enrolment_summary(session)
+    logger.info("Rebuilt respondent enrolment summary", records=records)
+    return records
+
+
 def _business_survey_details() -> dict:
     return {"survey_details": []}
 
 
-@with_query_only_db_session
-def is_respondent_enrolled(party_uuid: UUID, business_id: UUID, survey_id: UUID, session: session) -> bool:
-    respondent = query_respondent_by_party_uuid(party_uuid, session)
+def is_respondent_enrolled(party_uuid: UUID, business_id: UUID, survey_id: UUID) -> bool:
+    """
+    Checks whether an active respondent is enrolled on a survey for a business. Results are cached for
+    IS_RESPONDENT_ENROLLED_CACHE_TTL seconds as this is called to authorise almost every frontstage and secure-message
+    page
+
+    :return: True if the respondent is active and enrolled, otherwise False
+    """
+    return current_app.cache.get_or_set(
+        is_respondent_enrolled_cache_key(party_uuid, business_id, survey_id),
+        lambda: _is_respondent_enrolled(party_uuid, business_id, survey_id),
+        current_app.config["IS_RESPONDENT_ENROLLED_CACHE_TTL"],
+    )
+
 
-    if respondent and respondent.status == RespondentStatus.ACTIVE:
-        enrolment = query_enrolment_by_survey_business_respondent(respondent.id, business_id, survey_id, session)
-        if enrolment:
-            return True
-    return False
+def invalidate_is_respondent_enrolled(party_uuid: UUID, business_id: UUID, survey_id: UUID) -> None:
+    current_app.cache.delete(is_respondent_enrolled_cache_key(party_uuid, business_id, survey_id))
+
+
+@with_query_only_db_session
+def _is_respondent_enrolled(party_uuid: UUID, business_id: UUID, survey_id: UUID, session: session) -> bool:
+    return query_is_respondent_enrolled(party_uuid, business_id, survey_id, session)
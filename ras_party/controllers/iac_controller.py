@@ -4,6 +4,7 @@ import requests
 import structlog
 from flask import current_app
 
+from ras_party.support.metrics import downstream_request_timer
 from ras_party.support.requests_wrapper import Requests
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
@@ -11,7 +12,8 @@ logger = structlog.wrap_logger(logging.getLogger(__name__))
 
 def request_iac(enrolment_code):
     iac_url = f'{current_app.config["IAC_URL"]}/iacs/{enrolment_code}'
-    response = Requests.get(iac_url)
+    with downstream_request_timer("iac"):
+        response = Requests.get(iac_url)
     response.raise_for_status()
     return response.json()
 
@@ -27,7 +29,8 @@ def disable_iac(enrolment_code, case_id):
     """
     iac_url = f'{current_app.config["IAC_URL"]}/iacs/{enrolment_code}'
     payload = {"updatedBy": "Party Service"}
-    response = Requests.put(iac_url, json=payload)
+    with downstream_request_timer("iac"):
+        response = Requests.put(iac_url, json=payload)
     try:
         response.raise_for_status()
     except requests.HTTPError:
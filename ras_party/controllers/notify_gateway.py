@@ -1,39 +1,83 @@
+import atexit
 import json
 import logging
+import os
+import threading
 from concurrent.futures import TimeoutError
+from time import perf_counter
 
 import structlog
 from google.cloud import pubsub_v1
 
 from ras_party.exceptions import RasNotifyError
+from ras_party.support.metrics import PUBSUB_PUBLISH_LATENCY
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
 
+# The name each email is requested by, and the config holding the id of its gov notify template
+TEMPLATE_CONFIG_KEYS = {
+    "notify_account_locked": "NOTIFY_ACCOUNT_LOCKED_TEMPLATE",
+    "confirm_password_change": "NOTIFY_CONFIRM_PASSWORD_CHANGE_TEMPLATE",
+    "request_password_change": "NOTIFY_REQUEST_PASSWORD_CHANGE_TEMPLATE",
+    "email_verification": "NOTIFY_EMAIL_VERIFICATION_TEMPLATE",
+    "verify_account_email_change": "NOTIFY_VERIFY_ACCOUNT_EMAIL_CHANGE_TEMPLATE",
+    "confirm_change_to_account_email": "NOTIFY_CONFIRM_ACCOUNT_EMAIL_CHANGE_TEMPLATE",
+    "share_survey_access_new_account": "SHARE_SURVEY_ACCESS_NEW_ACCOUNT_TEMPLATE",
+    "share_survey_access_existing_account": "SHARE_SURVEY_ACCESS_EXISTING_ACCOUNT_TEMPLATE",
+    "share_survey_access_cancellation": "SHARE_SURVEY_ACCESS_CANCELLATION_TEMPLATE",
+    "share_survey_access_confirmation": "SHARE_SURVEY_ACCESS_CONFIRMATION_TEMPLATE",
+    "transfer_survey_access_new_account": "TRANSFER_SURVEY_ACCESS_NEW_ACCOUNT_TEMPLATE",
+    "transfer_survey_access_existing_account": "TRANSFER_SURVEY_ACCESS_EXISTING_ACCOUNT_TEMPLATE",
+    "transfer_survey_access_cancellation": "TRANSFER_SURVEY_ACCESS_CANCELLATION_TEMPLATE",
+    "transfer_survey_access_confirmation": "TRANSFER_SURVEY_ACCESS_CONFIRMATION_TEMPLATE",
+    "account_deletion_confirmation": "ACCOUNT_DELETION_CONFIRMATION_TEMPLATE",
+}
+
+
 class NotifyGateway:
-    """Client for Notify gateway"""
+    """
+    Client for Notify gateway. create_app makes one per app, as current_app.notify_gateway, and every email sent from a
+    process is published through the same pubsub publisher.
+    """
 
     def __init__(self, config):
         self.config = config
         self.notify_url = config["NOTIFY_URL"]
-        self.email_verification_template = config["NOTIFY_EMAIL_VERIFICATION_TEMPLATE"]
-        self.request_password_change_template = config["NOTIFY_REQUEST_PASSWORD_CHANGE_TEMPLATE"]
-        self.confirm_password_change_template = config["NOTIFY_CONFIRM_PASSWORD_CHANGE_TEMPLATE"]
-        self.notify_account_locked = config["NOTIFY_ACCOUNT_LOCKED_TEMPLATE"]
-        self.verify_account_email_change = config["NOTIFY_VERIFY_ACCOUNT_EMAIL_CHANGE_TEMPLATE"]
-        self.confirm_account_email_change = config["NOTIFY_CONFIRM_ACCOUNT_EMAIL_CHANGE_TEMPLATE"]
-        self.share_survey_access_new_account = config["SHARE_SURVEY_ACCESS_NEW_ACCOUNT_TEMPLATE"]
-        self.share_survey_access_existing_account = config["SHARE_SURVEY_ACCESS_EXISTING_ACCOUNT_TEMPLATE"]
-        self.share_survey_access_cancellation = config["SHARE_SURVEY_ACCESS_CANCELLATION_TEMPLATE"]
-        self.share_survey_access_confirmation = config["SHARE_SURVEY_ACCESS_CONFIRMATION_TEMPLATE"]
-        self.transfer_survey_access_new_account = config["TRANSFER_SURVEY_ACCESS_NEW_ACCOUNT_TEMPLATE"]
-        self.transfer_survey_access_existing_account = config["TRANSFER_SURVEY_ACCESS_EXISTING_ACCOUNT_TEMPLATE"]
-        self.transfer_survey_access_cancellation = config["TRANSFER_SURVEY_ACCESS_CANCELLATION_TEMPLATE"]
-        self.transfer_survey_access_confirmation = config["TRANSFER_SURVEY_ACCESS_CONFIRMATION_TEMPLATE"]
-        self.account_deletion_confirmation = config["ACCOUNT_DELETION_CONFIRMATION_TEMPLATE"]
+        self.templates = {name: config[key] for name, key in TEMPLATE_CONFIG_KEYS.items()}
         self.project_id = self.config["GOOGLE_CLOUD_PROJECT"]
         self.topic_id = self.config["PUBSUB_TOPIC"]
-        self.publisher = None
+        self._publisher = None
+        self._publisher_pid = None
+        self._publisher_lock = threading.Lock()
+
+    @property
+    def publisher(self):
+        """
+        The publisher of this process, created on first use. A process forked after it was created, as a gunicorn
+        worker is from a preloaded master, creates its own, since a client's channel and threads don't survive a fork.
+        """
+        if self._publisher_pid != os.getpid():
+            with self._publisher_lock:
+                if self._publisher_pid != os.getpid():
+                    self._publisher = pubsub_v1.PublisherClient()
+                    self._publisher_pid = os.getpid()
+                    atexit.register(self.close)
+        return self._publisher
+
+    @publisher.setter
+    def publisher(self, publisher):
+        self._publisher = publisher
+        self._publisher_pid = os.getpid()
+
+    def close(self):
+        """Publishes any messages still batched and stops the publisher of this process, if it has one"""
+        with self._publisher_lock:
+            if self._publisher is not None and self._publisher_pid == os.getpid():
+                logger.info("Stopping pubsub publisher")
+                self._publisher.stop()
+            self._publisher = None
+            self._publisher_pid = None
 
     def _send_message(self, email, template_id, personalisation):
         """Sends an email via pubsub topic
@@ -59,22 +103,24 @@ class NotifyGateway:
             payload["notify"]["personalisation"] = personalisation
 
         payload_str = json.dumps(payload)
-        if self.publisher is None:
-            self.publisher = pubsub_v1.PublisherClient()
         topic_path = self.publisher.topic_path(self.project_id, self.topic_id)
 
         bound_logger.info("About to publish to pubsub")
+        start = perf_counter()
         future = self.publisher.publish(topic_path, data=payload_str.encode())
 
         # It's okay for us to catch a broad Exception here because the documentation for future.result() says it
         # throws either a TimeoutError or an Exception.
         try:
             msg_id = future.result()
+            PUBSUB_PUBLISH_LATENCY.labels(outcome="success").observe(perf_counter() - start)
             bound_logger.info("Publish succeeded", msg_id=msg_id)
         except TimeoutError as e:
+            PUBSUB_PUBLISH_LATENCY.labels(outcome="timeout").observe(perf_counter() - start)
             bound_logger.error("Publish to pubsub timed out", exc_info=True)
             raise RasNotifyError("Publish to pubsub timed out", error=e)
         except Exception as e:  # noqa
+            PUBSUB_PUBLISH_LATENCY.labels(outcome="error").observe(perf_counter() - start)
             bound_logger.error("A non-timeout error was raised when publishing to pubsub", exc_info=True)
             raise RasNotifyError("A non-timeout error was raised when publishing to pubsub", error=e)
 
@@ -97,24 +143,7 @@ class NotifyGateway:
         self._send_message(email, template_id, personalisation)
 
     def _get_template_id(self, template_name):
-        templates = {
-            "notify_account_locked": self.notify_account_locked,
-            "confirm_password_change": self.confirm_password_change_template,
-            "request_password_change": self.request_password_change_template,
-            "email_verification": self.email_verification_template,
-            "verify_account_email_change": self.verify_account_email_change,
-            "confirm_change_to_account_email": self.confirm_account_email_change,
-            "share_survey_access_new_account": self.share_survey_access_new_account,
-            "share_survey_access_existing_account": self.share_survey_access_existing_account,
-            "share_survey_access_cancellation": self.share_survey_access_cancellation,
-            "share_survey_access_confirmation": self.share_survey_access_confirmation,
-            "transfer_survey_access_new_account": self.transfer_survey_access_new_account,
-            "transfer_survey_access_existing_account": self.transfer_survey_access_existing_account,
-            "transfer_survey_access_cancellation": self.transfer_survey_access_cancellation,
-            "transfer_survey_access_confirmation": self.transfer_survey_access_confirmation,
-            "account_deletion_confirmation": self.account_deletion_confirmation,
-        }
-        if template_name in templates:
-            return templates[template_name]
+        if template_name in self.templates:
+            return self.templates[template_name]
         else:
             raise KeyError("Template does not exist")
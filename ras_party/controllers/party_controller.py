@@ -1,4 +1,5 @@
 import logging
+import uuid
 
 import structlog
 from flask import current_app
@@ -8,9 +9,12 @@ from ras_party.controllers.queries import (
     query_business_attributes_by_sample_summary_id,
     query_business_by_party_uuid,
     query_business_by_ref,
+    query_business_version,
+    query_party_enrolments_by_survey,
     query_respondent_by_party_uuid,
+    query_respondent_version,
 )
-from ras_party.models.models import Business, Respondent
+from ras_party.models.models import Business, EnrolmentStatus, Respondent
 from ras_party.support.session_decorator import (
     with_db_session,
     with_query_only_db_session,
@@ -35,13 +39,19 @@ def parties_post(party_data, session):
         party_data["id"] = str(business.party_uuid)
         ba = query_business_attributes_by_sample_summary_id(business.party_uuid, party_data["sampleSummaryId"], session)
         if ba:
-            raise Conflict("party already exists for sample")
+            # A retry of the same party for the sample succeeds without changing anything
+            attributes = business.identical_attributes(party_data)
+            if not attributes:
+                raise Conflict("party already exists for sample")
         else:
-            business.add_versioned_attributes(party_data)
+            attributes = business.add_versioned_attributes(
+                party_data, current_app.config["ATTRIBUTES_SNAPSHOT_INTERVAL"]
+            )
         session.merge(business)
-    else:
-        business = Business.from_party_dict(party_data)
-        session.add(business)
+        return business.to_post_response_dict(attributes)
+
+    business = Business.from_party_dict(party_data)
+    session.add(business)
     return business.to_post_response_dict()
 
 
@@ -69,11 +79,12 @@ def parties_patch(party_data, session):
     business = query_business_by_ref(party_data["sampleUnitRef"], session)
     if business:
         party_data["id"] = str(business.party_uuid)
-        business.add_versioned_attributes(party_data)
+        attributes = business.add_versioned_attributes(party_data, current_app.config["ATTRIBUTES_SNAPSHOT_INTERVAL"])
         session.merge(business)
-    else:
-        business = Business.from_party_dict(party_data)
-        session.add(business)
+        return business.to_post_response_dict(attributes)
+
+    business = Business.from_party_dict(party_data)
+    session.add(business)
     return business.to_post_response_dict()
 
 
@@ -105,32 +116,72 @@ def get_party_by_id(sample_unit_type, party_id, session):
         raise BadRequest(f"{sample_unit_type} is not a valid value for sampleUnitType. Must be one of ['B', 'BI']")
 
 
-def get_party_with_enrolments_filtered_by_survey(sample_unit_type, party_id, survey_id, enrolment_status=None):
-    party = get_party_by_id(sample_unit_type, party_id)
-
-    filtered_associations = []
-    for association in party["associations"]:
-        filtered_association = {"partyId": association["partyId"]}
+@with_query_only_db_session
+def get_party_version(sample_unit_type, party_id, session):
+    """
+    Get a hash that changes whenever the party does, for use as an ETag
 
-        filtered_enrolments = filter_enrolments(association["enrolments"], survey_id, enrolment_status)
+    :return: the version or None if the party doesn't exist or the type or id isn't valid
+    """
+    try:
+        uuid.UUID(party_id)
+    except ValueError:
+        return None
+    if sample_unit_type == Business.UNIT_TYPE:
+        return query_business_version(party_id, session)
+    if sample_unit_type == Respondent.UNIT_TYPE:
+        return query_respondent_version(party_id, session)
+    return None
 
-        if filtered_enrolments:
-            filtered_association["enrolments"] = filtered_enrolments
-            filtered_associations.append(filtered_association)
 
-    party["associations"] = filtered_associations
+@with_query_only_db_session
+def get_party_with_enrolments_filtered_by_survey(sample_unit_type, party_id, survey_id, enrolment_status, session):
+    """
+    Get a party by its party_id, with only its associations that have enrolments in the survey, and only those
+    enrolments.  The enrolments are filtered by the query, so the party's other associations aren't loaded.
 
-    return party
+    :param sample_unit_type: Type of the party
+    :param party_id: uuid identifier of the party
+    :param survey_id: the survey to return the enrolments in
+    :param enrolment_status: a list of enrolment status names to return the enrolments in, or empty for any
+    :raises BadRequest: Raised if the sample_unit_type is not recognised
+    :raises NotFound: Raised if the party_id doesn't match one in the database
+    """
+    # Status names that aren't an EnrolmentStatus can't match any enrolment
+    enrolment_statuses = (
+        [EnrolmentStatus[status] for status in enrolment_status if status in EnrolmentStatus.__members__]
+        if enrolment_status
+        else None
+    )
+    if sample_unit_type == Business.UNIT_TYPE:
+        business = query_business_by_party_uuid(party_id, session)
+        if not business:
+            logger.info("Business with id does not exist", business_id=party_id, status=404)
+            raise NotFound("Business with id does not exist")
+        rows = query_party_enrolments_by_survey(party_id, None, survey_id, enrolment_statuses, session)
+        return business.to_party_dict(associations=_filtered_associations(rows, key="party_uuid"))
+    elif sample_unit_type == Respondent.UNIT_TYPE:
+        respondent = query_respondent_by_party_uuid(party_id, session)
+        if not respondent:
+            logger.info("Respondent with id does not exist", respondent_id=party_id, status=404)
+            raise NotFound("Respondent with id does not exist")
+        rows = query_party_enrolments_by_survey(None, party_id, survey_id, enrolment_statuses, session)
+        return respondent.to_party_dict(associations=_filtered_associations(rows, key="business_id"))
+    else:
+        logger.info("Invalid sample unit type", type=sample_unit_type)
+        raise BadRequest(f"{sample_unit_type} is not a valid value for sampleUnitType. Must be one of ['B', 'BI']")
 
 
-def filter_enrolments(existing_enrolments, survey_id, enrolment_status=None):
-    filtered_enrolments = []
-    for enrolment in existing_enrolments:
-        if enrolment["surveyId"] == survey_id:
-            filtered_enrolments.append(enrolment)
+def _filtered_associations(rows, key):
+    """
+    Groups rows of enrolments into associations of just the party id of the other party and its enrolments
 
-    if enrolment_status:
-        for enrolment in filtered_enrolments:
-            if enrolment["enrolmentStatus"] not in enrolment_status:
-                filtered_enrolments.remove(enrolment)
-    return filtered_enrolments
+    :param key: the column of the rows holding the id of the other party
+    """
+    associations = {}
+    for row in rows:
+        association = associations.setdefault(getattr(row, key), {"partyId": getattr(row, key), "enrolments": []})
+        association["enrolments"].append(
+            {"surveyId": row.survey_id, "enrolmentStatus": EnrolmentStatus(row.enrolment_status).name}
+        )
+    return list(associations.values())
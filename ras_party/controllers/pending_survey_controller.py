@@ -6,7 +6,7 @@ from urllib.error import HTTPError
 import structlog
 from flask import current_app
 from itsdangerous import BadData, BadSignature, SignatureExpired
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import BadRequest, Conflict, InternalServerError, NotFound
 
@@ -15,17 +15,26 @@ from ras_party.controllers.account_controller import (
     get_single_respondent_by_email,
     set_user_verified,
 )
-from ras_party.controllers.business_controller import get_business_by_id
-from ras_party.controllers.notify_gateway import NotifyGateway
+from ras_party.controllers.business_controller import get_business_names_by_ids
+from ras_party.controllers.cache_controller import (
+    business_cache_key,
+    invalidate_on_commit,
+    is_respondent_enrolled_cache_key,
+)
 from ras_party.controllers.queries import (
+    PENDING_SURVEY_DICT_COLUMNS,
     delete_pending_survey_by_batch_no,
-    query_business_by_party_uuid,
-    query_business_respondent_by_respondent_id_and_business_id,
+    insert_business_respondents,
+    insert_enrolments,
+    insert_pending_surveys,
+    query_business_ids_associated_with_respondent,
     query_enrolment_by_business_and_survey_and_status,
+    query_enrolments_by_respondent_and_businesses,
     query_pending_survey_by_batch_no,
     query_pending_survey_by_shared_by,
     query_pending_surveys_by_business_and_survey,
     query_respondent_by_party_uuid,
+    query_users_enrolled_and_pending_by_business_and_survey,
 )
 from ras_party.controllers.respondent_controller import (
     get_respondent_by_email,
@@ -34,6 +43,7 @@ from ras_party.controllers.respondent_controller import (
 from ras_party.controllers.validate import Exists, Validator
 from ras_party.models.models import (
     BusinessRespondent,
+    BusinessRespondentStatus,
     Enrolment,
     EnrolmentStatus,
     PendingSurveys,
@@ -73,6 +83,43 @@ def get_users_enrolled_and_pending_survey_against_business_and_survey(
     return total_users
 
 
+@with_query_only_db_session
+def get_users_enrolled_and_pending_survey_against_businesses_and_surveys(
+    business_surveys: list, is_transfer: bool, session
+) -> list:
+    """
+    Get total users count who are already enrolled and pending share survey for each of many business id and survey
+    id pairs, with a single query
+    :param business_surveys: list of dicts with a business_id and survey_id
+    :param is_transfer: if the request is to transfer share
+    :param session: db session
+    :return: list of dicts with the business_id, survey_id and total user count of each pair, in the order given
+    :rtype: list
+    :raises BadRequest: if any of the ids isn't a valid uuid
+    """
+    pairs = [(business_survey["business_id"], business_survey["survey_id"]) for business_survey in business_surveys]
+    logger.info("Attempting to get enrolled and pending survey users", business_surveys=pairs)
+    # The ids are compared in their canonical form, as the database returns them, so that an id given in upper case
+    # or braces still finds its users
+    normalised_pairs = []
+    for business_id, survey_id in pairs:
+        try:
+            normalised_pairs.append((str(uuid.UUID(business_id)), str(uuid.UUID(survey_id))))
+        except (AttributeError, TypeError, ValueError):
+            logger.info("Invalid business or survey id", business_id=business_id, survey_id=survey_id)
+            raise BadRequest(f"'{business_id}' and '{survey_id}' must be valid UUIDs")
+    totals = {
+        (str(business_id), survey_id): total
+        for business_id, survey_id, total in query_users_enrolled_and_pending_by_business_and_survey(
+            list(dict.fromkeys(normalised_pairs)), is_transfer, session
+        )
+    }
+    return [
+        {"business_id": business_id, "survey_id": survey_id, "count": totals.get(normalised_pair, 0)}
+        for (business_id, survey_id), normalised_pair in zip(pairs, normalised_pairs)
+    ]
+
+
 @with_db_session
 def pending_survey_deletion(batch_no: str, session):
     """
@@ -94,33 +141,53 @@ def pending_survey_deletion(batch_no: str, session):
 
 
 @with_db_session
-def pending_survey_create(
-    business_id: str, survey_id: str, email_address: str, shared_by, batch_number, is_transfer, session
-):
+def pending_surveys_create(pending_surveys: list, batch_number, is_transfer: bool, session):
     """
-    creates a new record for pending survey
-    Returns void
-    :param business_id: business party id
-    :param survey_id: survey id
-    :param email_address: email_address
-    :param shared_by: respondent_party_uuid
-    :type shared_by: uuid
-    :param session: db session
+    creates the records for a share or transfer of many surveys in a single statement. If any of them is already
+    pending then nothing is created.
+    :param pending_surveys: list of dicts with the business_id, survey_id, email_address and shared_by of each survey
+    :type pending_surveys: list
     :param batch_number: batch_number
     :type batch_number: uuid
-    :param is_transfer: True if the record is to transfer survey
+    :param is_transfer: True if the records are to transfer surveys
     :type is_transfer: bool
+    :param session: db session
+    :raises BadRequest: Raised if any of the surveys is already pending for the email address and business, or is
+                        given more than once
     :rtype: void
     """
-    pending_share = PendingSurveys(
-        business_id=business_id,
-        survey_id=survey_id,
-        email_address=email_address,
-        shared_by=shared_by,
-        batch_no=batch_number,
-        is_transfer=is_transfer,
-    )
-    session.add(pending_share)
+    rows = [
+        {
+            "business_id": pending_survey["business_id"],
+            "survey_id": pending_survey["survey_id"],
+            "email_address": pending_survey["email_address"],
+            "shared_by": pending_survey["shared_by"],
+            "batch_no": batch_number,
+            "is_transfer": is_transfer,
+        }
+        for pending_survey in pending_surveys
+    ]
+    # A survey given twice would be skipped by the insert like one that's already pending, and then found among the
+    # inserted rows, so it's rejected before anything is inserted
+    keys = [_pending_survey_key(row["email_address"], row["business_id"], row["survey_id"]) for row in rows]
+    if len(set(keys)) < len(keys):
+        logger.info("Pending surveys given more than once", batch_no=str(batch_number))
+        raise BadRequest("This pending survey is already in progress")
+
+    inserted = {_pending_survey_key(*row) for row in insert_pending_surveys(rows, session)}
+    conflicts = [
+        {"business_id": row["business_id"], "survey_id": row["survey_id"]}
+        for row, key in zip(rows, keys)
+        if key not in inserted
+    ]
+    if conflicts:
+        logger.info("Pending surveys already in progress", batch_no=str(batch_number), conflicts=conflicts)
+        raise BadRequest("This pending survey is already in progress")
+
+
+def _pending_survey_key(email_address, business_id, survey_id):
+    """The pending shares unique constraint, with the business id in the form the database returns it"""
+    return email_address, str(uuid.UUID(str(business_id))), survey_id
 
 
 @with_db_session
@@ -144,14 +211,13 @@ def get_unique_pending_surveys(is_transfer, session):
     :param session A db session
     """
     _expired_hrs = datetime.now(UTC) - timedelta(seconds=float(current_app.config["EMAIL_TOKEN_EXPIRY"]))
-    pending_shares_ready_for_deletion = (
-        session.query(PendingSurveys)
-        .filter(PendingSurveys.time_shared < _expired_hrs)
-        .filter(PendingSurveys.is_transfer == is_transfer)
+    unique_batch_records = session.execute(
+        select(*PENDING_SURVEY_DICT_COLUMNS)
+        .where(PendingSurveys.time_shared < _expired_hrs)
+        .where(PendingSurveys.is_transfer == is_transfer)
         .distinct(PendingSurveys.batch_no)
     )
-    unique_batch_record = pending_shares_ready_for_deletion.distinct(PendingSurveys.batch_no)
-    return [unique_batch_record.to_pending_surveys_dict() for unique_batch_record in unique_batch_record]
+    return [PendingSurveys.pending_surveys_dict(unique_batch_record) for unique_batch_record in unique_batch_records]
 
 
 def validate_pending_survey_token(token):
@@ -193,6 +259,9 @@ def accept_pending_survey(session, batch_no, new_respondent=None):
     Business Respondent records
     Removes pending shares
     Removes Existing enrolment records and association for transfers
+
+    The existing associations and enrolments of the respondent are loaded up front, and any that are missing are
+    created with one insert each, however many surveys are in the batch.
     :param: batch_no
     :param: session
     """
@@ -200,53 +269,65 @@ def accept_pending_survey(session, batch_no, new_respondent=None):
     pending_surveys = query_pending_survey_by_batch_no(batch_no, session)
     if len(pending_surveys) == 0:
         raise NotFound("Batch number does not exist")
-    pending_surveys_list = [pending_survey.to_pending_surveys_dict() for pending_survey in pending_surveys]
+    pending_surveys_list = [PendingSurveys.pending_surveys_dict(pending_survey) for pending_survey in pending_surveys]
     pending_surveys_is_transfer = pending_surveys_list[0].get("is_transfer", False)
     if not new_respondent:
         respondent = get_respondent_by_email(pending_surveys_list[0]["email_address"])
         new_respondent = query_respondent_by_party_uuid(respondent["id"], session)
 
+    business_ids = list(dict.fromkeys(str(pending_survey["business_id"]) for pending_survey in pending_surveys_list))
+    associated_business_ids = query_business_ids_associated_with_respondent(new_respondent.id, business_ids, session)
+    existing_enrolments = query_enrolments_by_respondent_and_businesses(new_respondent.id, business_ids, session)
+
+    # Associate respondent with new businesses
+    business_respondents = [
+        {"business_id": business_id, "respondent_id": new_respondent.id, "status": BusinessRespondentStatus.ACTIVE}
+        for business_id in business_ids
+        if business_id not in associated_business_ids
+    ]
+    if business_respondents:
+        insert_business_respondents(business_respondents, session)
+
+    enrolments = []
     for pending_survey in pending_surveys_list:
-        business_id = pending_survey["business_id"]
+        business_id = str(pending_survey["business_id"])
         survey_id = pending_survey["survey_id"]
-        business_respondent = query_business_respondent_by_respondent_id_and_business_id(
-            business_id, new_respondent.id, session
-        )
-        if not business_respondent:
-            # Associate respondent with new business
-            business = query_business_by_party_uuid(business_id, session)
-            if not business:
-                logger.error("Could not find business", business_id=business_id)
-                raise InternalServerError("Could not locate business when creating business association")
-            business_respondent = BusinessRespondent(business=business, respondent=new_respondent)
-            session.add(business_respondent)
-
-        if not is_already_enrolled(survey_id, new_respondent.id, business_id, session):
-            try:
-                with session.begin_nested():
-                    enrolment = Enrolment(
-                        business_respondent=business_respondent,
-                        survey_id=pending_survey["survey_id"],
-                        status=EnrolmentStatus.ENABLED,
-                    )
-                    session.add(enrolment)
-
-            except SQLAlchemyError as e:
-                logger.exception("Unable to confirm pending survey", batch_no=batch_no)
-        else:
+        if (business_id, survey_id) in existing_enrolments:
             logger.info(
                 "Ignoring respondent as already enrolled",
                 business_id=business_id,
                 survey_id=survey_id,
                 email=pending_surveys_list[0]["email_address"],
             )
+            continue
+        enrolments.append(
+            {
+                "business_id": business_id,
+                "respondent_id": new_respondent.id,
+                "survey_id": survey_id,
+                "status": EnrolmentStatus.ENABLED,
+            }
+        )
+    if enrolments:
+        insert_enrolments(enrolments, session)
+    invalidate_on_commit(
+        session,
+        *(business_cache_key(business_id) for business_id in business_ids),
+        *(
+            is_respondent_enrolled_cache_key(
+                new_respondent.party_uuid, enrolment["business_id"], enrolment["survey_id"]
+            )
+            for enrolment in enrolments
+        ),
+    )
+
     delete_pending_survey_by_batch_no(batch_no, session)
     session.commit()
     if pending_surveys_is_transfer:
         try:
             logger.info(
                 "About to remove the originator association to the business",
-                business_id=business_id,
+                business_ids=business_ids,
                 party_uuid=pending_surveys_list[0]["shared_by"],
             )
             remove_transfer_originator_business_association(pending_surveys_list)
@@ -294,6 +375,11 @@ def remove_transfer_originator_business_association(pending_surveys_list, sessio
         )
         if existing_enrolment:
             existing_enrolment.delete()
+            invalidate_on_commit(
+                session,
+                business_cache_key(business_id),
+                is_respondent_enrolled_cache_key(party_id, business_id, survey_id),
+            )
             # check if there is existing enrolment on a different survey with the same business
             additional_enrolment_on_business = (
                 session.query(Enrolment)
@@ -314,29 +400,6 @@ def remove_transfer_originator_business_association(pending_surveys_list, sessio
                 )
 
 
-def is_already_enrolled(survey_id, respondent_pk, business_id, session):
-    """
-    returns if enrollment already exists
-    :param survey_id
-    :param respondent_pk
-    :param business_id
-    :param session
-    :return bool
-    """
-    enrolment = (
-        session.query(Enrolment)
-        .filter(
-            and_(
-                Enrolment.survey_id == survey_id,
-                Enrolment.business_id == business_id,
-                Enrolment.respondent_id == respondent_pk,
-            )
-        )
-        .first()
-    )
-    return False if not enrolment else True
-
-
 @with_query_only_db_session
 def get_pending_survey_by_batch_number(batch_number, session):
     """
@@ -351,7 +414,7 @@ def get_pending_survey_by_batch_number(batch_number, session):
     pending_surveys = query_pending_survey_by_batch_no(batch_number, session)
     if len(pending_surveys) == 0:
         raise NotFound("Batch number does not exist")
-    return [pending_surveys.to_pending_surveys_dict() for pending_surveys in pending_surveys]
+    return [PendingSurveys.pending_surveys_dict(pending_survey) for pending_survey in pending_surveys]
 
 
 @with_db_session
@@ -366,7 +429,7 @@ def get_pending_survey_by_originator_respondent_id(respondent_party_id: str, ses
     :rtype: list
     """
     pending_surveys = query_pending_survey_by_shared_by(respondent_party_id, session)
-    return [pending_surveys.to_pending_surveys_dict() for pending_surveys in pending_surveys]
+    return [PendingSurveys.pending_surveys_dict(pending_survey) for pending_survey in pending_surveys]
 
 
 # flake8: noqa: C901
@@ -508,17 +571,16 @@ def send_pending_surveys_confirmation_email(pending_surveys_list, confirmation_e
             confirmation_email_template = "transfer_survey_access_confirmation"
         else:
             confirmation_email_template = "share_survey_access_confirmation"
-        business_list = []
-        business_id_list = {pending_surveys["business_id"] for pending_surveys in pending_surveys_list}
-        for business_id in business_id_list:
-            business = get_business_by_id(str(business_id))
-            business_list.append(business["name"])
+        business_id_list = list(
+            dict.fromkeys(str(pending_survey["business_id"]) for pending_survey in pending_surveys_list)
+        )
+        business_list = list(get_business_names_by_ids(business_id_list).values())
         personalisation = {
             "NAME": respondent.first_name,
             "COLLEAGUE_EMAIL_ADDRESS": pending_surveys_list[0]["email_address"],
             "BUSINESSES": business_list,
         }
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=respondent.email_address, template_name=confirmation_email_template, personalisation=personalisation
         )
         logger.info("confirmation email for pending share send successfully", batch_no=batch_no)
@@ -1,10 +1,30 @@
+import json
 import logging
 import re
+from itertools import chain
 from uuid import UUID
 
 import structlog
 from flask import session
-from sqlalchemy import and_, distinct, func, or_
+from sqlalchemy import (
+    Text,
+    and_,
+    bindparam,
+    cast,
+    delete,
+    distinct,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql import text
 from sqlalchemy.sql.functions import count
 
@@ -16,6 +36,8 @@ from ras_party.models.models import (
     EnrolmentStatus,
     PendingSurveys,
     Respondent,
+    RespondentEnrolmentSummary,
+    RespondentStatus,
 )
 from ras_party.support.util import obfuscate_email
 
@@ -57,16 +79,155 @@ def query_pending_surveys_by_business_and_survey(business_id, survey_id, session
     )  # noqa
 
 
-def query_businesses_by_party_uuids(party_uuids, session):
+def query_users_enrolled_and_pending_by_business_and_survey(business_surveys, is_transfer, session):
+    """
+    Query to return the total of enabled or pending enrolments and pending shares (or transfers) for many business
+    and survey pairs at once
+
+    :param business_surveys: list of (business_id, survey_id) tuples
+    :param session: db session
+    :param is_transfer: boolean if the query is for transfer survey or share survey
+    :return: rows of (business_id, survey_id, total) for the pairs that have any users
+    """
+    logger.info("Querying enrolled and pending users by business and survey", business_surveys=business_surveys)
+    enrolled = select(Enrolment.business_id, Enrolment.survey_id).where(
+        tuple_(Enrolment.business_id, Enrolment.survey_id).in_(business_surveys),
+        Enrolment.status.in_([EnrolmentStatus.ENABLED, EnrolmentStatus.PENDING]),
+    )
+    pending = select(PendingSurveys.business_id, PendingSurveys.survey_id).where(
+        tuple_(PendingSurveys.business_id, PendingSurveys.survey_id).in_(business_surveys),
+        PendingSurveys.is_transfer == is_transfer,
+    )
+    users = union_all(enrolled, pending).subquery()
+    return (
+        session.query(users.c.business_id, users.c.survey_id, count())
+        .group_by(users.c.business_id, users.c.survey_id)
+        .all()
+    )
+
+
+def query_business_summaries_by_party_uuids(party_uuids, session):
+    """
+    Query to return the columns of the business summary for each business, taking the sample summary id, name and
+    trading as from its most recent active attributes, without loading the businesses or their associations
+
+    :param party_uuids: a list of party uuids
+    :param session: db session
+    :return: rows of (party_uuid, business_ref, attributes_business_id, sample_summary_id, name, trading_as), where
+             attributes_business_id is None if the business has no active attributes
+    """
+    logger.info("Querying business summaries by party_uuids", party_uuids=party_uuids)
+    latest_attributes = (
+        select(
+            BusinessAttributes.business_id,
+            BusinessAttributes.sample_summary_id,
+            BusinessAttributes.attributes["name"].astext.label("name"),
+            BusinessAttributes.attributes["trading_as"].astext.label("trading_as"),
+        )
+        .where(BusinessAttributes.business_id.in_(party_uuids))
+        .where(BusinessAttributes.collection_exercise.isnot(None))
+        .distinct(BusinessAttributes.business_id)
+        .order_by(BusinessAttributes.business_id, BusinessAttributes.created_on.desc())
+        .subquery()
+    )
+    return session.execute(
+        select(
+            Business.party_uuid,
+            Business.business_ref,
+            latest_attributes.c.business_id.label("attributes_business_id"),
+            latest_attributes.c.sample_summary_id,
+            latest_attributes.c.name,
+            latest_attributes.c.trading_as,
+        )
+        .outerjoin(latest_attributes, latest_attributes.c.business_id == Business.party_uuid)
+        .where(Business.party_uuid.in_(party_uuids))
+    ).all()
+
+
+def query_business_associations_by_party_uuids(party_uuids, session):
+    """
+    Query to return the respondents associated with each business along with their enrolments, as one row per
+    enrolment or per respondent that has none
+
+    :param party_uuids: a list of party uuids
+    :param session: db session
+    :return: rows of (business_id, party_uuid, respondent_status, survey_id, enrolment_status)
+    """
+    logger.info("Querying business associations by party_uuids", party_uuids=party_uuids)
+    return session.execute(
+        select(
+            BusinessRespondent.business_id,
+            Respondent.party_uuid,
+            Respondent.status.label("respondent_status"),
+            Enrolment.survey_id,
+            Enrolment.status.label("enrolment_status"),
+        )
+        .join(Respondent, Respondent.id == BusinessRespondent.respondent_id)
+        .outerjoin(
+            Enrolment,
+            and_(
+                Enrolment.business_id == BusinessRespondent.business_id,
+                Enrolment.respondent_id == BusinessRespondent.respondent_id,
+            ),
+        )
+        .where(BusinessRespondent.business_id.in_(party_uuids))
+    ).all()
+
+
+def query_party_enrolments_by_survey(business_id, respondent_id, survey_id, enrolment_statuses, session):
+    """
+    Query to return the enrolments in a survey of either a business or a respondent, without loading the party's
+    other associations
+
+    :param business_id: the party uuid of the business, or None
+    :param respondent_id: the party uuid of the respondent, or None
+    :param survey_id: the survey id
+    :param enrolment_statuses: a list of EnrolmentStatus to return the enrolments in, or None for any
+    :param session: db session
+    :return: rows of (business_id, party_uuid, survey_id, enrolment_status), one per enrolment, in business and then
+             respondent order so the party's associations are listed the same way on every request
+    """
+    logger.info(
+        "Querying party enrolments by survey", business_id=business_id, respondent_id=respondent_id, survey_id=survey_id
+    )
+    conditions = [Enrolment.survey_id == survey_id]
+    if business_id:
+        conditions.append(Enrolment.business_id == business_id)
+    if respondent_id:
+        conditions.append(Respondent.party_uuid == respondent_id)
+    if enrolment_statuses is not None:
+        conditions.append(Enrolment.status.in_(enrolment_statuses))
+    return session.execute(
+        select(
+            Enrolment.business_id,
+            Respondent.party_uuid,
+            Enrolment.survey_id,
+            Enrolment.status.label("enrolment_status"),
+        )
+        .join(Respondent, Respondent.id == Enrolment.respondent_id)
+        .where(*conditions)
+        .order_by(Enrolment.business_id, Respondent.party_uuid, Enrolment.survey_id)
+    ).all()
+
+
+def query_business_names_by_party_uuids(party_uuids, session):
     """
-    Query to return businesses based on party uuids
+    Query to return the name of each business from its most recent active attributes, without loading the
+    businesses or their associations
 
     :param party_uuids: a list of party uuids
     :param session: db session
-    :return: the businesses
+    :return: rows of (business_id, name)
     """
-    logger.info("Querying businesses by party_uuids", party_uuids=party_uuids)
-    return session.query(Business).filter(Business.party_uuid.in_(party_uuids))
+    logger.info("Querying business names by party_uuids", party_uuids=party_uuids)
+    return (
+        session.query(BusinessAttributes.business_id, BusinessAttributes.attributes["name"].astext.label("name"))
+        .filter(BusinessAttributes.business_id.in_(party_uuids))
+        .filter(BusinessAttributes.collection_exercise.isnot(None))
+        .distinct(BusinessAttributes.business_id)
+        .order_by(BusinessAttributes.business_id, BusinessAttributes.created_on.desc())
+        .all()
+    )
 
 
 def query_business_by_party_uuid(party_uuid, session):
@@ -82,6 +243,60 @@ def query_business_by_party_uuid(party_uuid, session):
     return session.query(Business).filter(Business.party_uuid == party_uuid).first()
 
 
+def query_business_version(party_uuid, session):
+    """
+    Query to return a hash of everything a business representation is built from, its attribute versions and their
+    collection exercise links, and its respondents and their enrolments. It changes whenever the representation does,
+    without loading the business or walking its associations
+
+    :param party_uuid: the party uuid
+    :return: the version hash or None if the business doesn't exist
+    """
+    logger.info("Querying business version", party_uuid=party_uuid)
+
+    attribute_versions = (
+        select(
+            func.string_agg(
+                func.concat(BusinessAttributes.id, ":", BusinessAttributes.collection_exercise),
+                aggregate_order_by(",", BusinessAttributes.id),
+            )
+        )
+        .where(BusinessAttributes.business_id == Business.party_uuid)
+        .scalar_subquery()
+    )
+    association_versions = (
+        select(
+            func.string_agg(
+                func.concat(
+                    BusinessRespondent.respondent_id,
+                    ":",
+                    Respondent.party_uuid,
+                    ":",
+                    cast(Respondent.status, Text),
+                    ":",
+                    Enrolment.survey_id,
+                    ":",
+                    cast(Enrolment.status, Text),
+                ),
+                aggregate_order_by(",", BusinessRespondent.respondent_id, Enrolment.survey_id),
+            )
+        )
+        .select_from(BusinessRespondent)
+        .join(Respondent, Respondent.id == BusinessRespondent.respondent_id)
+        .outerjoin(
+            Enrolment,
+            and_(
+                Enrolment.business_id == BusinessRespondent.business_id,
+                Enrolment.respondent_id == BusinessRespondent.respondent_id,
+            ),
+        )
+        .where(BusinessRespondent.business_id == Business.party_uuid)
+        .scalar_subquery()
+    )
+    version = func.json_build_array(Business.business_ref, attribute_versions, association_versions)
+    return session.scalar(select(func.md5(cast(version, Text))).where(Business.party_uuid == party_uuid))
+
+
 def query_business_by_ref(business_ref, session):
     """
     Query to return business based on business ref
@@ -94,18 +309,132 @@ def query_business_by_ref(business_ref, session):
     return session.query(Business).filter(Business.business_ref == business_ref).first()
 
 
-def query_business_attributes(business_id, session):
+def query_business_attributes(business_ids, session, collection_exercise_ids=None, attribute_keys=None):
     """
-    Query to return all business attributes records based
+    Query to return the business attributes records of many businesses that are linked to a collection exercise
 
-    :param business_id: the id of the business
+    :param business_ids: the ids of the businesses
     :param session: A database session
-    :return: A list of businessAttributes that match the id
-    :rtype: list of BusinessAttributes
+    :param collection_exercise_ids: the ids of the collection exercises to return the records of, or None for any
+    :param attribute_keys: the keys of the attributes to return, or None for all of them.  A key the record doesn't
+                           have is returned with a null value
+    :return: rows of the business attributes columns
+    """
+    logger.info(
+        "Querying business attributes by ids",
+        business_ids=len(business_ids),
+        collection_exercise_ids=collection_exercise_ids,
+        attribute_keys=attribute_keys,
+    )
+    conditions = [BusinessAttributes.business_id.in_(business_ids), BusinessAttributes.collection_exercise.isnot(None)]
+    if collection_exercise_ids:
+        conditions.append(BusinessAttributes.collection_exercise.in_(collection_exercise_ids))
+    base = aliased(BusinessAttributes)
+    return (
+        session.query(*_business_attributes_columns(base, attribute_keys))
+        .outerjoin(base, base.id == BusinessAttributes.base_id)
+        .filter(*conditions)
+        .all()
+    )
+
+
+def search_business_attributes(collection_exercise_id, attributes, page, limit, max_rec, session, attribute_keys=None):
+    """
+    Query to return a page of the business attributes records of a collection exercise whose attributes contain all
+    of the given ones, which the attributes_attributes_path_ops_idx GIN index answers, and how many there are.
+    Counting every match costs as much as reading them, so they're only counted up to max_rec, and past that the
+    planner's estimate of the number is returned instead.
+
+    :param collection_exercise_id: the id of the collection exercise
+    :param attributes: a dict of the attribute values the records must have, e.g. {"region": "WW", "cell_no": 1}
+    :param page: the page of records to return, from 1
+    :param limit: the number of records in a page
+    :param max_rec: the number of records to count exactly
+    :param session: A database session
+    :param attribute_keys: the keys of the attributes to return, or None for all of them
+    :return: the rows of the business attributes columns, the number of matching records and whether it's an estimate
+    """
+    logger.info(
+        "Searching business attributes by attribute values",
+        collection_exercise_id=collection_exercise_id,
+        attribute_keys=attribute_keys,
+    )
+    # The filter goes in as text so that the statement can be run through EXPLAIN by _estimate_row_count
+    contained = cast(literal(json.dumps(attributes), Text), JSONB)
+    base = aliased(BusinessAttributes)
+    # Only the records stored in full can be matched through the GIN index, those stored as deltas are rebuilt and
+    # matched separately, found through the attributes_delta_collection_exercise_idx partial index
+    matches = union_all(
+        select(BusinessAttributes.id).where(
+            BusinessAttributes.collection_exercise == collection_exercise_id,
+            BusinessAttributes.base_id.is_(None),
+            BusinessAttributes.attributes.contains(contained),
+        ),
+        select(BusinessAttributes.id)
+        .join(base, base.id == BusinessAttributes.base_id)
+        .where(
+            BusinessAttributes.collection_exercise == collection_exercise_id,
+            BusinessAttributes.base_id.isnot(None),
+            _full_attributes(base).contains(contained),
+        ),
+    )
+    total = session.execute(select(count()).select_from(matches.limit(max_rec + 1).subquery())).scalar()
+    estimated = total > max_rec
+    if estimated:
+        total = max(_estimate_row_count(matches, session), total)
+
+    rows = (
+        session.query(*_business_attributes_columns(base, attribute_keys))
+        .outerjoin(base, base.id == BusinessAttributes.base_id)
+        .filter(BusinessAttributes.id.in_(select(matches.subquery().c.id)))
+        .order_by(BusinessAttributes.id)
+        .limit(limit)
+        .offset((page - 1) * limit)
+        .all()
+    )
+    return rows, total, estimated
+
+
+def _business_attributes_columns(base, attribute_keys):
+    """
+    The business attributes columns, with the attributes rebuilt from the base snapshot, which must be outer joined
+    as base, and narrowed to attribute_keys when there are any.  A key the record doesn't have is returned with a null
+    value
     """
-    logger.info("Querying business attributes by id", business_id=business_id)
+    attributes = _full_attributes(base)
+    if attribute_keys:
+        attributes = func.jsonb_build_object(*chain.from_iterable((key, attributes[key]) for key in attribute_keys))
+    return (
+        BusinessAttributes.id,
+        BusinessAttributes.business_id,
+        BusinessAttributes.sample_summary_id,
+        BusinessAttributes.collection_exercise,
+        attributes.label("attributes"),
+        BusinessAttributes.created_on,
+        BusinessAttributes.name,
+        BusinessAttributes.trading_as,
+    )
+
+
+def _full_attributes(base):
+    """
+    The attributes of a business attributes record, rebuilt from base, its joined snapshot, when stored as a delta in
+    the same way as BusinessAttributes.full_attributes
+    """
+    rebuilt = base.attributes.op("-", return_type=JSONB)(BusinessAttributes.removed_attributes).op(
+        "||", return_type=JSONB
+    )(BusinessAttributes.attributes)
+    # The rebuilt attributes are null for a record stored in full, which has no snapshot
+    return func.coalesce(rebuilt, BusinessAttributes.attributes, type_=JSONB)
 
-    return session.query(BusinessAttributes).filter(BusinessAttributes.business_id == business_id).all()
+
+def _estimate_row_count(statement, session):
+    """
+    The number of rows the planner expects the statement to return, from EXPLAIN, so without running it
+    """
+    compiled = statement.compile(dialect=session.get_bind().dialect)
+    plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
 def query_business_attributes_by_sample_summary_id(business_id, sample_summary_id, session):
@@ -130,37 +459,94 @@ def query_business_attributes_by_sample_summary_id(business_id, sample_summary_i
     return session.query(BusinessAttributes).filter(and_(*conditions)).all()
 
 
-def query_business_attributes_by_collection_exercise(business_id, collection_exercise_uuids, session):
+def count_business_attributes_by_sample_summary_id(sample_summary_id, session):
     """
-    Query to return all business attributes records based.  Will not error if no matches are found.
+    Query to return the number of business attributes records for a sample summary
 
-    :param business_id: the id of the business
-    :param collection_exercise_uuids:
+    :param sample_summary_id: the id of the sample
     :param session: A database session
-    :return: A list of businessAttributes that match the query parameters
-    :rtype: list of BusinessAttributes
+    :return: Integer count of business attributes linked to the sample
     """
-    logger.info(
-        "Querying business attributes by id and collection exercise",
-        business_id=business_id,
-        collection_exercise_uuids=collection_exercise_uuids,
+    logger.info("Counting business attributes by sample summary", sample_summary_id=sample_summary_id)
+
+    return (
+        session.query(count(BusinessAttributes.id))
+        .filter(BusinessAttributes.sample_summary_id == sample_summary_id)
+        .scalar()
     )
-    conditions = [
-        BusinessAttributes.business_id == business_id,
-        BusinessAttributes.collection_exercise.in_(collection_exercise_uuids),
-    ]
-    return session.query(BusinessAttributes).filter(and_(*conditions)).all()
 
 
-def query_respondent_by_party_uuids(party_uuids, session):
+def delete_business_attributes_batch_by_sample_summary_id(sample_summary_id, batch_size, session):
     """
-    Query to return respondents based on party uuids
+    Query to delete at most batch_size business attributes records for a sample summary.  The rows to remove are
+    picked with a limited select and the number deleted is returned, so the caller can loop until nothing is left
+    without having to count the rows first.  Any records of other samples stored as deltas of the deleted ones are
+    rewritten in full.
+
+    :param sample_summary_id: the id of the sample
+    :param batch_size: maximum number of records to delete in this batch
+    :param session: A database session
+    :return: the number of records deleted
+    :rtype: int
+    """
+    batch = (
+        session.execute(
+            select(BusinessAttributes.id)
+            .where(BusinessAttributes.sample_summary_id == sample_summary_id)
+            .limit(batch_size)
+        )
+        .scalars()
+        .all()
+    )
+    if not batch:
+        return 0
+
+    # Their snapshot is going, so the deltas of other samples are rebuilt first
+    base = aliased(BusinessAttributes)
+    session.execute(
+        update(BusinessAttributes)
+        .where(BusinessAttributes.base_id == base.id, base.id.in_(batch), BusinessAttributes.id.not_in(batch))
+        .values(
+            {
+                BusinessAttributes.attributes: _full_attributes(base),
+                BusinessAttributes.base_id: None,
+                BusinessAttributes.removed_attributes: None,
+            }
+        )
+        .execution_options(synchronize_session=False)
+    )
+    deleted = session.execute(
+        delete(BusinessAttributes)
+        .where(BusinessAttributes.id.in_(batch))
+        .returning(BusinessAttributes.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    return len(deleted)
+
+
+def query_respondent_summaries_by_party_uuids(party_uuids, session):
+    """
+    Query to return just the columns of the respondent dict for each respondent, without loading the respondents
 
     :param party_uuids: the party uuids
-    :return: respondents or empty list
+    :param session: db session
+    :return: rows of the respondent dict columns or empty list
     """
-    logger.info("Querying respondents by party_uuids", party_uuids=party_uuids)
-    return session.query(Respondent).filter(Respondent.party_uuid.in_(party_uuids))
+    logger.info("Querying respondent summaries by party_uuids", party_uuids=party_uuids)
+    return session.execute(
+        select(
+            Respondent.party_uuid,
+            Respondent.pending_email_address,
+            Respondent.email_address,
+            Respondent.first_name,
+            Respondent.last_name,
+            Respondent.telephone,
+            Respondent.status,
+            Respondent.mark_for_deletion,
+            Respondent.password_verification_token,
+            Respondent.password_reset_counter,
+        ).where(Respondent.party_uuid.in_(party_uuids))
+    ).all()
 
 
 def query_respondent_by_names_and_emails(first_name, last_name, email, page, limit, session):
@@ -207,6 +593,58 @@ def query_respondent_by_party_uuid(party_uuid, session):
     return session.query(Respondent).filter(Respondent.party_uuid == party_uuid).first()
 
 
+def query_respondent_version(party_uuid, session):
+    """
+    Query to return a hash of everything a respondent representation is built from, the respondent's details and its
+    businesses and their enrolments, without loading the respondent or walking its associations
+
+    :param party_uuid: the party uuid
+    :return: the version hash or None if the respondent doesn't exist
+    """
+    logger.info("Querying respondent version", party_uuid=party_uuid)
+
+    association_versions = (
+        select(
+            func.string_agg(
+                func.concat(
+                    Business.party_uuid,
+                    ":",
+                    Business.business_ref,
+                    ":",
+                    Enrolment.survey_id,
+                    ":",
+                    cast(Enrolment.status, Text),
+                ),
+                aggregate_order_by(",", Business.party_uuid, Enrolment.survey_id),
+            )
+        )
+        .select_from(BusinessRespondent)
+        .join(Business, Business.party_uuid == BusinessRespondent.business_id)
+        .outerjoin(
+            Enrolment,
+            and_(
+                Enrolment.business_id == BusinessRespondent.business_id,
+                Enrolment.respondent_id == BusinessRespondent.respondent_id,
+            ),
+        )
+        .where(BusinessRespondent.respondent_id == Respondent.id)
+        .scalar_subquery()
+    )
+    version = func.json_build_array(
+        Respondent.status,
+        Respondent.email_address,
+        Respondent.pending_email_address,
+        Respondent.first_name,
+        Respondent.last_name,
+        Respondent.telephone,
+        Respondent.mark_for_deletion,
+        Respondent.password_verification_token,
+        Respondent.password_reset_counter,
+        association_versions,
+    )
+    return session.scalar(select(func.md5(cast(version, Text))).where(Respondent.party_uuid == party_uuid))
+
+
 def query_respondent_by_email(email, session):
     """
     Query to return respondent based on email
@@ -260,6 +698,36 @@ def query_business_respondent_by_respondent_id_and_business_id(business_id, resp
     return response
 
 
+def query_business_ids_associated_with_respondent(respondent_id, business_ids, session):
+    """
+    Query to return which of the given businesses the respondent is already associated with
+
+    :param respondent_id: the id column from the respondent (integer not uuid)
+    :param business_ids: a list of business party ids
+    :param session: db session
+    :return: set of business ids
+    """
+    logger.info("Querying business respondents", respondent_id=respondent_id, business_ids=business_ids)
+    associations = (
+        session.query(BusinessRespondent.business_id)
+        .filter(BusinessRespondent.respondent_id == respondent_id)
+        .filter(BusinessRespondent.business_id.in_(business_ids))
+    )
+    return {str(business_id) for business_id, in associations}
+
+
+def insert_business_respondents(business_respondents, session):
+    """
+    Query to associate a respondent with many businesses in a single statement.  Associations that already exist are
+    left as they are.
+
+    :param business_respondents: list of dicts with the business_id and respondent_id of each association
+    :param session: db session
+    """
+    logger.info("Inserting business respondents", count=len(business_respondents))
+    session.execute(insert(BusinessRespondent).values(business_respondents).on_conflict_do_nothing())
+
+
 def update_respondent_details(respondent_data, respondent_id, session):
     """
     Query to return respondent, respondent_data consists of the following parameters: first_name, last_name,
@@ -297,13 +765,16 @@ def get_respondent_password_verification_token(respondent_id, session):
 
     :param respondent_id: the id of the respondent
     :param session:
-    :returns: verification token
+    :returns: a row of the verification token, or None if the respondent doesn't exist
     """
 
     logger.info("Retrieving respondent verification token", respondent_id=respondent_id)
 
-    response = session.query(Respondent).filter(Respondent.party_uuid == respondent_id).first()
-    return response.password_verification_token
+    return (
+        session.query(Respondent.password_verification_token)
+        .filter(Respondent.party_uuid == respondent_id)
+        .one_or_none()
+    )
 
 
 def add_respondent_password_verification_token(respondent_id, token, session):
@@ -313,30 +784,56 @@ def add_respondent_password_verification_token(respondent_id, token, session):
     :param respondent_id: id of the respondent
     :param token: the verification token:
     :param session:
-    :return: None on success
+    :return: the id of the respondent, or None if it doesn't exist
     """
 
     logger.info("Adding respondent verification token", respondent_id=respondent_id)
 
-    session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-        {Respondent.password_verification_token: token}
-    )
+    return session.execute(
+        update(Respondent)
+        .where(Respondent.party_uuid == respondent_id)
+        .values(password_verification_token=token)
+        .returning(Respondent.id)
+    ).scalar_one_or_none()
+
+
+def query_respondent_password_fields(party_uuid, session):
+    """
+    Query to return just the password verification token and password reset counter of a respondent
+
+    :param party_uuid: the party uuid of the respondent
+    :param session: db session
+    :return: the (password_verification_token, password_reset_counter) row, or None if the respondent doesn't exist
+    """
+    logger.info("Querying respondent password fields", party_uuid=party_uuid)
+    return session.execute(
+        select(Respondent.password_verification_token, Respondent.password_reset_counter).where(
+            Respondent.party_uuid == party_uuid
+        )
+    ).one_or_none()
 
 
 def delete_respondent_password_verification_token(respondent_id, session):
     """
-    Query to update the respondent password verification tokens
+    Query to remove the respondent password verification token, if it has one
 
     :param respondent_id: id of the respondent
     :param session:
-    :return: None on success
+    :return: the id of the respondent, or None if it doesn't exist or doesn't have a token
     """
 
     logger.info("Removing respondent verification token", respondent_id=respondent_id)
 
-    session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-        {Respondent.password_verification_token: None}
-    )
+    return session.execute(
+        update(Respondent)
+        .where(
+            Respondent.party_uuid == respondent_id,
+            Respondent.password_verification_token.isnot(None),
+            Respondent.password_verification_token != "",
+        )
+        .values(password_verification_token=None)
+        .returning(Respondent.id)
+    ).scalar_one_or_none()
 
 
 def query_password_reset_counter(respondent_id, session):
@@ -345,30 +842,32 @@ def query_password_reset_counter(respondent_id, session):
 
     :param respondent_id: id of the respondent
     :param session:
-    :return: current number of password reset attempts
+    :return: a row of the current number of password reset attempts, or None if the respondent doesn't exist
     """
 
     logger.info("Querying password reset counter", respondent_id=respondent_id)
 
-    response = session.query(Respondent).filter(Respondent.party_uuid == respondent_id).first()
-    return response.password_reset_counter
+    return session.query(Respondent.password_reset_counter).filter(Respondent.party_uuid == respondent_id).one_or_none()
 
 
-def increase_password_reset_counter(respondent_id, counter, session):
+def increase_password_reset_counter(respondent_id, session):
     """
-    Query to increase the respondent's password reset counter
+    Query to increase the respondent's password reset counter by one.  The counter is incremented by the database, so
+    concurrent increases aren't lost.
 
     :param respondent_id: id of the respondent
-    :param counter: password reset counter
     :param session:
-    :return: None on success
+    :return: the increased counter, or None if the respondent doesn't exist
     """
 
     logger.info("Increasing password reset counter", respondent_id=respondent_id)
 
-    session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-        {Respondent.password_reset_counter: counter}
-    )
+    return session.execute(
+        update(Respondent)
+        .where(Respondent.party_uuid == respondent_id)
+        .values(password_reset_counter=func.coalesce(Respondent.password_reset_counter, 0) + 1)
+        .returning(Respondent.password_reset_counter)
+    ).scalar_one_or_none()
 
 
 def reset_password_reset_counter(respondent_id, session):
@@ -377,14 +876,17 @@ def reset_password_reset_counter(respondent_id, session):
 
     :param respondent_id: id of the respondent
     :param session:
-    :return: None on success
+    :return: the id of the respondent, or None if it doesn't exist
     """
 
     logger.info("Resetting password reset counter", respondent_id=respondent_id)
 
-    session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-        {Respondent.password_reset_counter: 0}
-    )
+    return session.execute(
+        update(Respondent)
+        .where(Respondent.party_uuid == respondent_id)
+        .values(password_reset_counter=0)
+        .returning(Respondent.id)
+    ).scalar_one_or_none()
 
 
 def search_business_with_ru_ref(search_query: str, page: int, limit: int, max_rec: int, session):
@@ -526,26 +1028,54 @@ def search_businesses(search_query: str, page: int, limit: int, max_rec: int, se
     return result, estimated_total_records
 
 
+PENDING_SURVEY_DICT_COLUMNS = (
+    PendingSurveys.email_address,
+    PendingSurveys.business_id,
+    PendingSurveys.survey_id,
+    PendingSurveys.shared_by,
+    PendingSurveys.batch_no,
+    PendingSurveys.is_transfer,
+    PendingSurveys.time_shared,
+)
+
+
 def query_pending_survey_by_batch_no(batch_no, session):
     """
-    Query to return pending survey by batch no.
+    Query to return just the columns of the pending survey dict for the pending surveys of a batch no.
     :param batch_no: UUID
-    :return: share surveys
+    :return: rows of the pending survey dict columns
     """
     logger.info("Querying share_surveys", batch_no=batch_no)
-    response = session.query(PendingSurveys).filter(PendingSurveys.batch_no == batch_no).all()
-    return response
+    return session.execute(select(*PENDING_SURVEY_DICT_COLUMNS).where(PendingSurveys.batch_no == batch_no)).all()
 
 
 def query_pending_survey_by_shared_by(shared_by, session):
     """
-    Query to return pending survey by shared by party id.
+    Query to return just the columns of the pending survey dict for the pending surveys shared by a party id.
     :param shared_by: UUID
-    :return: share surveys
+    :return: rows of the pending survey dict columns
     """
     logger.info("Querying share_surveys", shared_by=str(shared_by))
-    response = session.query(PendingSurveys).filter(PendingSurveys.shared_by == shared_by).all()
-    return response
+    return session.execute(select(*PENDING_SURVEY_DICT_COLUMNS).where(PendingSurveys.shared_by == shared_by)).all()
+
+
+def insert_pending_surveys(pending_surveys, session):
+    """
+    Query to insert many pending surveys in a single statement.  Rows that clash with an existing pending survey for
+    the same email address, business and survey are skipped rather than failing the whole insert.
+
+    :param pending_surveys: list of dicts of PendingSurveys column values
+    :param session: db session
+    :return: the (email_address, business_id, survey_id) of each row that was inserted
+    """
+    logger.info("Inserting pending surveys", count=len(pending_surveys))
+    inserted = session.execute(
+        insert(PendingSurveys)
+        .values(pending_surveys)
+        .on_conflict_do_nothing()
+        .returning(PendingSurveys.email_address, PendingSurveys.business_id, PendingSurveys.survey_id)
+    )
+    return [tuple(row) for row in inserted]
 
 
 def delete_pending_survey_by_batch_no(batch_no, session):
@@ -585,6 +1115,93 @@ def query_enrolment_by_survey_business_respondent(respondent_id, business_id, su
     return response
 
 
+def query_is_respondent_enrolled(party_uuid, business_id, survey_id, session):
+    """
+    Query to check whether an active respondent has an enrolment for a business and survey, selecting only the
+    boolean result rather than loading the respondent and its businesses
+
+    :param party_uuid: the party uuid of the respondent
+    :param business_id: the business id
+    :param survey_id: the survey id
+    :return: True if the respondent is active and enrolled, otherwise False
+    """
+    logger.info("Querying is respondent enrolled", party_uuid=party_uuid, business_id=business_id, survey_id=survey_id)
+    enrolled = exists().where(
+        Respondent.party_uuid == party_uuid,
+        Respondent.status == RespondentStatus.ACTIVE,
+        Enrolment.respondent_id == Respondent.id,
+        Enrolment.business_id == business_id,
+        Enrolment.survey_id == survey_id,
+    )
+    return session.scalar(select(enrolled))
+
+
+def query_respondent_party_uuids_by_ids(respondent_ids, session):
+    """
+    Query to return the party uuid of each of the respondents, without loading them
+
+    :param respondent_ids: a list of id columns from the respondent (integer not uuid)
+    :param session: db session
+    :return: dict of party uuid by respondent id
+    """
+    logger.info("Querying respondent party uuids", respondent_ids=respondent_ids)
+    return dict(
+        session.execute(select(Respondent.id, Respondent.party_uuid).where(Respondent.id.in_(respondent_ids))).all()
+    )
+
+
+def query_businesses_and_enrolments_by_respondent_ids(respondent_ids, session):
+    """
+    Query to return the businesses each of the respondents is associated with and the surveys they're enrolled on for
+    them, in a single query
+
+    :param respondent_ids: a list of id columns from the respondent (integer not uuid)
+    :param session: db session
+    :return: list of (respondent_id, business_id, survey_id), the survey_id being None for a business with no enrolments
+    """
+    logger.info("Querying businesses and enrolments of respondents", respondent_ids=respondent_ids)
+    return session.execute(
+        select(BusinessRespondent.respondent_id, BusinessRespondent.business_id, Enrolment.survey_id)
+        .outerjoin(
+            Enrolment,
+            and_(
+                Enrolment.respondent_id == BusinessRespondent.respondent_id,
+                Enrolment.business_id == BusinessRespondent.business_id,
+            ),
+        )
+        .where(BusinessRespondent.respondent_id.in_(respondent_ids))
+    ).all()
+
+
+def query_enrolments_by_respondent_and_businesses(respondent_id, business_ids, session):
+    """
+    Query to return the surveys the respondent is already enrolled on for any of the given businesses
+
+    :param respondent_id: the id column from the respondent (integer not uuid)
+    :param business_ids: a list of business party ids
+    :param session: db session
+    :return: set of (business_id, survey_id)
+    """
+    logger.info("Querying enrolments", respondent_id=respondent_id, business_ids=business_ids)
+    enrolments = (
+        session.query(Enrolment.business_id, Enrolment.survey_id)
+        .filter(Enrolment.respondent_id == respondent_id)
+        .filter(Enrolment.business_id.in_(business_ids))
+    )
+    return {(str(business_id), survey_id) for business_id, survey_id in enrolments}
+
+
+def insert_enrolments(enrolments, session):
+    """
+    Query to create many enrolments in a single statement.  Enrolments that already exist are left as they are.
+
+    :param enrolments: list of dicts of Enrolment column values
+    :param session: db session
+    """
+    logger.info("Inserting enrolments", count=len(enrolments))
+    session.execute(insert(Enrolment).values(enrolments).on_conflict_do_nothing())
+
+
 def query_respondents_and_status_by_survey_and_business_id(
     survey_id: UUID, business_id: UUID, session: session
 ) -> list:
@@ -623,6 +1240,67 @@ def query_all_non_disabled_enrolments_respondent(respondent_id, session):
     return response
 
 
+def disable_all_enrolments_respondent(respondent_id, session):
+    """
+    Query to disable all the non disabled enrolments of a respondent in one update
+
+    :param respondent_id:  the id column from the respondent (integer not uuid)
+    :return: rows of (business_id, survey_id) for the enrolments that were disabled
+    """
+    logger.info("Disabling all enrolments for respondent", respondent_id=respondent_id)
+    return session.execute(
+        update(Enrolment)
+        .where(Enrolment.respondent_id == respondent_id, Enrolment.status != EnrolmentStatus.DISABLED)
+        .values(status=EnrolmentStatus.DISABLED)
+        .returning(Enrolment.business_id, Enrolment.survey_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def update_enrolment_statuses(enrolments, status, session):
+    """
+    Query to set the status of many enrolments in one update
+
+    :param enrolments: list of (respondent party_uuid, business_id, survey_id) tuples
+    :param status: the EnrolmentStatus to set
+    :param session: db session
+    :return: rows of (party_uuid, business_id, survey_id) for the enrolments that exist and were updated
+    """
+    logger.info("Updating enrolment statuses", enrolments=len(enrolments), status=status.name)
+    # Updates the table rather than the model, as the ORM can't return the respondent's columns from an UPDATE FROM.
+    # The status is set by column as the respondent has one too
+    enrolment = Enrolment.__table__
+    return session.execute(
+        update(enrolment)
+        .where(
+            enrolment.c.respondent_id == Respondent.id,
+            tuple_(Respondent.party_uuid, enrolment.c.business_id, enrolment.c.survey_id).in_(enrolments),
+        )
+        .values({enrolment.c.status: status})
+        .returning(Respondent.party_uuid, enrolment.c.business_id, enrolment.c.survey_id)
+    ).all()
+
+
+def count_enrolments_by_business_surveys(business_surveys, session):
+    """
+    Query to return the count of enabled enrolments for many business and survey pairs at once
+
+    :param business_surveys: list of (business_id, survey_id) tuples
+    :param session: db session
+    :return: rows of (business_id, survey_id, total) for the pairs that have any enabled enrolments
+    """
+    logger.info("Querying enrolments by business and survey", business_surveys=len(business_surveys))
+    return (
+        session.query(Enrolment.business_id, Enrolment.survey_id, count())
+        .filter(
+            tuple_(Enrolment.business_id, Enrolment.survey_id).in_(business_surveys),
+            Enrolment.status == EnrolmentStatus.ENABLED,
+        )
+        .group_by(Enrolment.business_id, Enrolment.survey_id)
+        .all()
+    )
+
+
 def count_enrolment_by_survey_business(business_id, survey_id, session):
     """
     Query to return count of enrolments for given business id and survey
@@ -647,30 +1325,73 @@ def count_enrolment_by_survey_business(business_id, survey_id, session):
 
 
 def query_respondent_enrolments(
-    session: session, respondent_id: int, business_id: UUID = None, survey_id: UUID = None, status: int = None
-) -> list[Enrolment]:
+    session: session, respondent_id: int, business_id: UUID = None, survey_id: UUID = None, status: str = None
+) -> list[RespondentEnrolmentSummary]:
     """
-    Query to return a list of respondent Enrolments and business attributes.
-    Business_id, survey_id and status can also be added as conditions
+    Query to return a list of respondent enrolments with the details of their business, read from the enrolment
+    summary.  Business_id, survey_id and status can also be added as conditions
     """
-    where_clause = f"WHERE respondent_id = {respondent_id}"
+    conditions = [RespondentEnrolmentSummary.respondent_id == respondent_id]
 
     if business_id:
-        where_clause += f" and partysvc.enrolment.business_id='{business_id}'"
+        conditions.append(RespondentEnrolmentSummary.business_id == business_id)
     if survey_id:
-        where_clause += f" and partysvc.enrolment.survey_id='{survey_id}'"
+        conditions.append(RespondentEnrolmentSummary.survey_id == survey_id)
     if status:
-        where_clause += f" and partysvc.enrolment.status='{status}'"
+        # Cast in the database so an unknown status is a DataError, like any other malformed search parameter
+        conditions.append(
+            RespondentEnrolmentSummary.status
+            == cast(bindparam("status", status, type_=Text), RespondentEnrolmentSummary.status.type)
+        )
 
-    return session.execute(
-        text(
-            f"SELECT business_id, status, survey_id, business_ref, attributes from partysvc.enrolment "
-            f"inner join partysvc.business on partysvc.business.party_uuid = partysvc.enrolment.business_id, "
-            f"LATERAL (SELECT attributes FROM partysvc.business_attributes "
-            f"WHERE partysvc.enrolment.business_id = partysvc.business_attributes.business_id "
-            f"ORDER BY partysvc.business_attributes.created_on DESC limit 1) ba {where_clause}"
+    return session.query(RespondentEnrolmentSummary).filter(and_(*conditions)).all()
+
+
+def rebuild_respondent_enrolment_summary(session) -> int:
+    """
+    Query to replace the contents of the enrolment summary with the current enrolments and the details of their
+    business from the most recent business attributes
+
+    :param session: db session
+    :return: the number of enrolments in the rebuilt summary
+    """
+    logger.info("Rebuilding respondent enrolment summary")
+    latest_attributes = (
+        select(BusinessAttributes.attributes)
+        .where(BusinessAttributes.business_id == Business.party_uuid)
+        .order_by(BusinessAttributes.created_on.desc())
+        .limit(1)
+        .lateral()
+    )
+    enrolments = (
+        select(
+            Enrolment.respondent_id,
+            Enrolment.business_id,
+            Enrolment.survey_id,
+            Enrolment.status,
+            Business.business_ref,
+            latest_attributes.c.attributes["name"].astext,
+            latest_attributes.c.attributes["trading_as"].astext,
+        )
+        .join(Business, Business.party_uuid == Enrolment.business_id)
+        .outerjoin(latest_attributes, true())
+    )
+    session.query(RespondentEnrolmentSummary).delete()
+    rebuilt = session.execute(
+        insert(RespondentEnrolmentSummary).from_select(
+            [
+                RespondentEnrolmentSummary.respondent_id,
+                RespondentEnrolmentSummary.business_id,
+                RespondentEnrolmentSummary.survey_id,
+                RespondentEnrolmentSummary.status,
+                RespondentEnrolmentSummary.business_ref,
+                RespondentEnrolmentSummary.business_name,
+                RespondentEnrolmentSummary.trading_as,
+            ],
+            enrolments,
         )
     )
+    return rebuilt.rowcount
 
 
 def query_latest_business_details(session: session, party_uuids: list):
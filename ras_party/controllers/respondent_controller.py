@@ -11,12 +11,18 @@ from ras_party.controllers.account_controller import (
     change_respondent,
     get_single_respondent_by_email,
 )
-from ras_party.controllers.notify_gateway import NotifyGateway
+from ras_party.controllers.cache_controller import (
+    business_cache_key,
+    invalidate_on_commit,
+    respondent_cache_key,
+)
 from ras_party.controllers.queries import (
     query_respondent_by_email,
     query_respondent_by_names_and_emails,
     query_respondent_by_party_uuid,
-    query_respondent_by_party_uuids,
+    query_respondent_password_fields,
+    query_respondent_summaries_by_party_uuids,
+    query_respondent_version,
     query_respondents_and_status_by_survey_and_business_id,
     update_respondent_details,
 )
@@ -26,6 +32,7 @@ from ras_party.models.models import (
     PendingEnrolment,
     Respondent,
 )
+from ras_party.support.metrics import record_cache_lookup
 from ras_party.support.session_decorator import (
     with_db_session,
     with_query_only_db_session,
@@ -34,6 +41,10 @@ from ras_party.support.util import obfuscate_email
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
+# Read from the database on every lookup rather than cached with the rest of the respondent, so that a password
+# reset link or attempt is never checked against an old value
+UNCACHED_RESPONDENT_FIELDS = ("password_verification_token", "password_reset_counter")
+
 
 @with_query_only_db_session
 def get_respondent_by_ids(ids, session):
@@ -45,8 +56,8 @@ def get_respondent_by_ids(ids, session):
     :type ids: str
     :rtype: Respondent
     """
-    respondents = query_respondent_by_party_uuids(ids, session)
-    return [respondent.to_respondent_dict() for respondent in respondents]
+    respondents = query_respondent_summaries_by_party_uuids(ids, session)
+    return [Respondent.respondent_dict(respondent) for respondent in respondents]
 
 
 @with_query_only_db_session
@@ -74,6 +85,61 @@ def get_respondent_by_party_id(party_id: UUID, session: session) -> Respondent:
     return query_respondent_by_party_uuid(party_id, session)
 
 
+def get_respondent_dict_by_party_id(party_id: UUID, version: str | None = None) -> dict | None:
+    """
+    Cache-aside read of a respondent's details by party id, used for the respondent lookups made on most frontstage
+    requests. The respondent is cached with the version it was read at, and given a version a copy cached at another
+    is read again, so that it matches the ETag.
+
+    :param version: the version from get_respondent_version the details are for
+    :return: the respondent dict or None if the respondent doesn't exist
+    """
+    key = respondent_cache_key(party_id)
+    cached = current_app.cache.get(key)
+    hit = cached is not None and (version is None or cached["version"] == version)
+    record_cache_lookup(key, hit=hit)
+    if not hit:
+        respondent = _get_respondent_dict(party_id)
+        if respondent is not None:
+            current_app.cache.set(
+                key,
+                {
+                    "version": version,
+                    "value": {
+                        field: value for field, value in respondent.items() if field not in UNCACHED_RESPONDENT_FIELDS
+                    },
+                },
+                current_app.config["CACHE_TTL"],
+            )
+        return respondent
+
+    respondent = cached["value"]
+    password_fields = _get_respondent_password_fields(party_id)
+    if password_fields is None:
+        return None
+    return {**respondent, **dict(zip(UNCACHED_RESPONDENT_FIELDS, password_fields))}
+
+
+@with_query_only_db_session
+def get_respondent_version(party_id: UUID, session: session) -> str | None:
+    """
+    Get a hash that changes whenever any representation of the respondent does, for use as an ETag
+
+    :return: the version or None if the respondent doesn't exist
+    """
+    return query_respondent_version(party_id, session)
+
+
+def _get_respondent_dict(party_id: UUID) -> dict | None:
+    respondent = get_respondent_by_party_id(party_id)
+    return respondent.to_respondent_dict() if respondent else None
+
+
+@with_query_only_db_session
+def _get_respondent_password_fields(party_id: UUID, session: session):
+    return query_respondent_password_fields(party_id, session)
+
+
 @with_query_only_db_session
 def get_respondent_by_id(respondent_id, session):
     """
@@ -114,6 +180,7 @@ def update_respondent_mark_for_deletion(email: str, session):
             session.query(Respondent).filter(Respondent.party_uuid == respondent.party_uuid).update(
                 {Respondent.mark_for_deletion: True}
             )
+            invalidate_on_commit(session, respondent_cache_key(respondent.party_uuid))
             return "respondent successfully marked for deletion", 202
         except (SQLAlchemyError, Exception) as error:
             logger.error("error with update respondent mark for deletion", error)
@@ -169,6 +236,7 @@ def delete_respondents_marked_for_deletion(session):
 
 
 def _delete_respondent_records(respondent, session):
+    _invalidate_respondent(respondent, session)
     session.query(Enrolment).filter(Enrolment.respondent_id == respondent.id).delete()
     session.query(BusinessRespondent).filter(BusinessRespondent.respondent_id == respondent.id).delete()
     session.query(PendingEnrolment).filter(PendingEnrolment.respondent_id == respondent.id).delete()
@@ -176,6 +244,14 @@ def _delete_respondent_records(respondent, session):
     session.commit()
 
 
+def _invalidate_respondent(respondent, session):
+    invalidate_on_commit(
+        session,
+        respondent_cache_key(respondent.party_uuid),
+        *(business_cache_key(business_respondent.business_id) for business_respondent in respondent.businesses),
+    )
+
+
 def send_account_deletion_confirmation_email(email_address: str, name: str):
     """
     Sends email notification for account deletion confirmation.
@@ -184,7 +260,7 @@ def send_account_deletion_confirmation_email(email_address: str, name: str):
     bound_logger.info("sending account deletion confirmation email")
     try:
         personalisation = {"name": name}
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email_address, template_name="account_deletion_confirmation", personalisation=personalisation
         )
         bound_logger.info("account deletion confirmation email sent successfully")
@@ -208,6 +284,7 @@ def delete_respondent_by_email(email: str, session):
     # We need to get the respondent to make sure they exist, but also because the id (not the party_uuid...for
     # some reason) of the respondent is needed for the later deletion steps.
     respondent = get_single_respondent_by_email(email, session)
+    _invalidate_respondent(respondent, session)
 
     session.query(Enrolment).filter(Enrolment.respondent_id == respondent.id).delete()
     session.query(BusinessRespondent).filter(BusinessRespondent.respondent_id == respondent.id).delete()
@@ -258,6 +335,7 @@ def change_respondent_details(respondent_data, respondent_id, session):
 
     # This function updates the name and number of a respondent
     update_respondent_details(respondent_data, respondent_id, session)
+    invalidate_on_commit(session, respondent_cache_key(respondent_id))
 
     if "new_email_address" in respondent_data:
         # This function only changes the respondents email address
@@ -5,17 +5,29 @@ import structlog
 from flask import current_app
 from requests.exceptions import ConnectionError, HTTPError, Timeout
 
+from ras_party.controllers.cache_controller import SURVEYS_CACHE_KEY
 from ras_party.exceptions import ServiceUnavailableException
+from ras_party.support.metrics import downstream_request_timer
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
 
 def get_surveys_details() -> dict:
+    """
+    Gets the survey catalogue, keyed by survey id, caching it for SURVEYS_CACHE_TTL seconds
+    """
+    return current_app.cache.get_or_set(
+        SURVEYS_CACHE_KEY, _get_surveys_details, current_app.config["SURVEYS_CACHE_TTL"]
+    )
+
+
+def _get_surveys_details() -> dict:
     url = f'{current_app.config["SURVEY_URL"]}/surveys'
     try:
-        response = requests.get(
-            url, auth=(current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
-        )
+        with downstream_request_timer("survey"):
+            response = requests.get(
+                url, auth=(current_app.config["SECURITY_USER_NAME"], current_app.config["SECURITY_USER_PASSWORD"])
+            )
         response.raise_for_status()
     except HTTPError:
         logger.error("Survey returned a HTTPError")
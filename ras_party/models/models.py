@@ -1,4 +1,6 @@
 import enum
+import hashlib
+import json
 import logging
 import uuid
 
@@ -14,9 +16,11 @@ from sqlalchemy import (
     Integer,
     Text,
     UniqueConstraint,
+    event,
+    text,
 )
-from sqlalchemy.dialects.postgresql import JSONB, UUID
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.orm import declarative_base, relationship, validates
 from sqlalchemy.sql import func
 from sqlalchemy.types import Enum
 from werkzeug.exceptions import BadRequest
@@ -26,6 +30,16 @@ from ras_party.support.util import filter_falsey_values, partition_dict
 Base = declarative_base()
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 
+# Kept in every attributes delta, so that the queries and triggers that only read these can use any version as it is
+DELTA_CARRIED_ATTRIBUTES = ("name", "trading_as")
+
+
+def hash_attributes(attributes):
+    """
+    The sha256 of the attributes as canonical JSON, so the same whatever order their keys are in
+    """
+    return hashlib.sha256(json.dumps(attributes, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
 
 class Business(Base):
     __tablename__ = "business"
@@ -73,20 +87,86 @@ class Business(Base):
     @staticmethod
     def from_party_dict(party):
         b = Business(party_uuid=party.get("id", uuid.uuid4()), business_ref=party["sampleUnitRef"])
-        ba = BusinessAttributes(business_id=b.party_uuid, sample_summary_id=party["sampleSummaryId"])
-        ba.attributes = party.get("attributes")
-        Business._populate_name_and_trading_as(ba)
+        ba = Business._new_attributes(b.party_uuid, party)
 
         b.attributes.append(ba)
         b.valid = True
         return b
 
-    def add_versioned_attributes(self, party):
-        ba = BusinessAttributes(business_id=self.party_uuid, sample_summary_id=party["sampleSummaryId"])
-        ba.attributes = party.get("attributes")
-        self._populate_name_and_trading_as(ba)
+    def add_versioned_attributes(self, party, snapshot_interval=0):
+        """
+        Adds a version of the business's attributes, unless the latest version for the sample has the same content,
+        such as when a sample is reloaded or a request retried
 
+        :param snapshot_interval: 0 to store the attributes in full, otherwise the number of versions from one full
+                                  snapshot to the next, with the versions in between stored as their differences from
+                                  the snapshot
+        :return: the version added, or the existing one with the same content
+        """
+        ba = self._new_attributes(self.party_uuid, party)
+        identical = self._identical_attributes(ba)
+        if identical:
+            logger.info("Attributes unchanged for sample", business_id=self.party_uuid, sample=ba.sample_summary_id)
+            return identical
+
+        if snapshot_interval and self.attributes:
+            # The versions are loaded newest first
+            latest = self.attributes[0]
+            ba.store_as_delta(latest.base or latest, self.attributes, snapshot_interval)
         self.attributes.append(ba)
+        return ba
+
+    def identical_attributes(self, party):
+        """
+        :return: the business's latest version of the attributes for the sample, if it has the same content as the
+                 party's
+        """
+        return self._identical_attributes(self._new_attributes(self.party_uuid, party))
+
+    def _identical_attributes(self, ba):
+        # Only the latest version counts, as an earlier one with the same content has since been superseded
+        latest = self._latest_attributes(ba.sample_summary_id)
+        # Versions from before the hashes were stored are hashed as they're compared
+        if latest and (latest.attributes_hash or hash_attributes(latest.full_attributes)) == ba.attributes_hash:
+            return latest
+        return None
+
+    def _latest_attributes(self, sample_summary_id):
+        versions = [attributes for attributes in self.attributes if attributes.sample_summary_id == sample_summary_id]
+        # Versions not yet stored are newer than those that are, and don't have a created_on until they're stored
+        unstored = [attributes for attributes in versions if attributes.created_on is None]
+        if unstored:
+            return unstored[-1]
+        # The versions stored in one transaction have the same created_on
+        return max(versions, key=lambda attributes: (attributes.created_on, attributes.id), default=None)
+
+    def compress_attributes(self, snapshot_interval):
+        """
+        Rewrites the business's versions as add_versioned_attributes would have stored them with snapshot_interval,
+        or all in full if it's 0
+
+        :return: the number of versions stored as deltas
+        """
+        versions = sorted(self.attributes, key=lambda version: (version.created_on, version.id))
+        full_attributes = [version.full_attributes for version in versions]
+        for version, attributes in zip(versions, full_attributes):
+            version.attributes, version.removed_attributes, version.base = attributes, None, None
+            version.attributes_hash = hash_attributes(attributes)
+
+        deltas = 0
+        if snapshot_interval:
+            for i, version in enumerate(versions[1:], 1):
+                latest = versions[i - 1]
+                deltas += version.store_as_delta(latest.base or latest, versions[:i], snapshot_interval)
+        return deltas
+
+    @staticmethod
+    def _new_attributes(business_id, party):
+        ba = BusinessAttributes(business_id=business_id, sample_summary_id=party["sampleSummaryId"])
+        ba.attributes = party.get("attributes")
+        Business._populate_name_and_trading_as(ba)
+        ba.attributes_hash = hash_attributes(ba.attributes)
+        return ba
 
     @staticmethod
     def _populate_name_and_trading_as(ba):
@@ -127,43 +207,90 @@ class Business(Base):
         """
         d = self.to_business_summary_dict()
         attributes = self._get_attributes_for_collection_exercise(collection_exercise_id)
-        return dict(d, **attributes.attributes)
+        return dict(d, **attributes.full_attributes)
 
     def to_business_summary_dict(self, collection_exercise_id=None):
         attributes = self._get_attributes_for_collection_exercise(collection_exercise_id)
-        d = {
-            "id": self.party_uuid,
-            "sampleUnitRef": self.business_ref,
-            "sampleUnitType": self.UNIT_TYPE,
-            "sampleSummaryId": attributes.sample_summary_id,
-            "name": attributes.attributes.get("name"),
-            "trading_as": attributes.attributes.get("trading_as"),
-            "associations": self._get_respondents_associations(self.respondents),
+        return self.business_summary_dict(
+            self.party_uuid,
+            self.business_ref,
+            attributes.sample_summary_id,
+            attributes.attributes.get("name"),
+            attributes.attributes.get("trading_as"),
+            self._get_respondents_associations(self.respondents),
+        )
+
+    @staticmethod
+    def business_summary_dict(party_uuid, business_ref, sample_summary_id, name, trading_as, associations):
+        return {
+            "id": party_uuid,
+            "sampleUnitRef": business_ref,
+            "sampleUnitType": Business.UNIT_TYPE,
+            "sampleSummaryId": sample_summary_id,
+            "name": name,
+            "trading_as": trading_as,
+            "associations": associations,
         }
-        return d
 
-    def to_party_dict(self):
+    @staticmethod
+    def associations_from_rows(rows):
+        """
+        Groups rows of (business_id, party_uuid, respondent_status, survey_id, enrolment_status), one per enrolment
+        or per respondent without one, into the associations of each business in the same shape as
+        _get_respondents_associations
+
+        :return: a dict of business id to its list of associations
+        """
+        associations = {}
+        respondents = {}
+        for row in rows:
+            respondent_dict = respondents.get((row.business_id, row.party_uuid))
+            if respondent_dict is None:
+                respondent_dict = {
+                    "partyId": row.party_uuid,
+                    "businessRespondentStatus": row.respondent_status.name,
+                    "enrolments": [],
+                }
+                respondents[(row.business_id, row.party_uuid)] = respondent_dict
+                associations.setdefault(row.business_id, []).append(respondent_dict)
+            if row.survey_id is not None:
+                respondent_dict["enrolments"].append(
+                    {"surveyId": row.survey_id, "enrolmentStatus": EnrolmentStatus(row.enrolment_status).name}
+                )
+        return associations
+
+    def to_party_dict(self, associations=None):
+        """
+        :param associations: the associations to include, instead of loading all of the business's respondents and
+                             their enrolments
+        """
         attributes = self._get_attributes_for_collection_exercise()
         return {
             "id": self.party_uuid,
             "sampleUnitRef": self.business_ref,
             "sampleUnitType": self.UNIT_TYPE,
             "sampleSummaryId": attributes.sample_summary_id,
-            "attributes": attributes.attributes,
+            "attributes": attributes.full_attributes,
             "name": attributes.attributes.get("name"),
             "trading_as": attributes.attributes.get("trading_as"),
-            "associations": self._get_respondents_associations(self.respondents),
+            "associations": (
+                associations if associations is not None else self._get_respondents_associations(self.respondents)
+            ),
         }
 
-    def to_post_response_dict(self):
+    def to_post_response_dict(self, attributes=None):
+        """
+        :param attributes: the version of the attributes to include, otherwise the one last added
+        """
+        attributes = attributes or self.attributes[-1]
         return {
             "id": self.party_uuid,
             "sampleUnitRef": self.business_ref,
             "sampleUnitType": self.UNIT_TYPE,
-            "sampleSummaryId": self.attributes[-1].sample_summary_id,
-            "attributes": self.attributes[-1].attributes,
-            "name": self.attributes[-1].name,
-            "trading_as": self.attributes[-1].trading_as,
+            "sampleSummaryId": attributes.sample_summary_id,
+            "attributes": attributes.full_attributes,
+            "name": attributes.name,
+            "trading_as": attributes.trading_as,
             "associations": self._get_respondents_associations(self.respondents),
         }
 
@@ -191,6 +318,15 @@ class BusinessAttributes(Base):
     created_on = Column(DateTime, default=func.now())
     name = Column(Text)  # New columns placed at end of list in case code uses positional rather than named references
     trading_as = Column(Text)
+    # Set when the attributes are stored as a delta, holding only the attributes that differ from those of the base
+    # snapshot, and removed_attributes the keys of the snapshot's that this version doesn't have
+    base_id = Column(Integer, ForeignKey("business_attributes.id"))
+    removed_attributes = Column(ARRAY(Text))
+    # Loaded for all of the versions in one query, rather than one per delta as they're rebuilt. join_depth lets it
+    # load from a query of business attributes, as eager loaders otherwise stop at a relationship back to their mapper
+    base = relationship("BusinessAttributes", remote_side=[id], lazy="selectin", join_depth=1)
+    # Of the full attributes, so that a version can be compared with another without rebuilding either
+    attributes_hash = Column(Text)
     Index("attributes_name_idx", name)
     Index("attributes_trading_as_idx", trading_as)
     Index("attributes_business_idx", business_id)
@@ -198,6 +334,17 @@ class BusinessAttributes(Base):
     Index("attributes_business_sample_idx", business_id, sample_summary_id)
     Index("attributes_collection_exercise_idx", collection_exercise)
     Index("attributes_created_on_idx", created_on)
+    # jsonb_path_ops only supports @>, but is smaller and faster for it than the default jsonb_ops. Deltas hold only
+    # the changed attributes so can't be matched by it, and are left out
+    Index(
+        "attributes_attributes_path_ops_idx",
+        attributes,
+        postgresql_using="gin",
+        postgresql_ops={"attributes": "jsonb_path_ops"},
+        postgresql_where=base_id.is_(None),
+    )
+    Index("attributes_delta_base_idx", base_id, postgresql_where=base_id.isnot(None))
+    Index("attributes_delta_collection_exercise_idx", collection_exercise, postgresql_where=base_id.isnot(None))
 
     def to_dict(self):
         """
@@ -207,15 +354,57 @@ class BusinessAttributes(Base):
 
         :return: A dict with all the columns and their values
         """
+        return dict(self.attributes_dict(self), attributes=self.full_attributes)
+
+    @property
+    def full_attributes(self):
+        """
+        The attributes of this version, rebuilt from its base snapshot if they're stored as a delta
+        """
+        if self.base is None:
+            return self.attributes
+        attributes = {key: value for key, value in self.base.attributes.items() if key not in self.removed_attributes}
+        attributes.update(self.attributes)
+        return attributes
+
+    def store_as_delta(self, snapshot, versions, snapshot_interval):
+        """
+        Replaces the full attributes of this new version with those that differ from the snapshot's, unless it's time
+        for a new snapshot or the delta wouldn't be much smaller than the attributes
+
+        :param snapshot: the full snapshot that the latest of the versions is, or is based on
+        :param versions: the business's existing versions
+        :param snapshot_interval: the number of versions from one full snapshot to the next
+        :return: True if the attributes are now stored as a delta
+        """
+        if 2 + sum(1 for version in versions if version.base is snapshot) > snapshot_interval:
+            return False
+        changed = {
+            key: value
+            for key, value in self.attributes.items()
+            if key in DELTA_CARRIED_ATTRIBUTES or key not in snapshot.attributes or snapshot.attributes[key] != value
+        }
+        removed = [key for key in snapshot.attributes if key not in self.attributes]
+        if 2 * (len(changed) + len(removed)) > len(self.attributes):
+            return False
+        self.attributes, self.removed_attributes, self.base = changed, removed, snapshot
+        return True
+
+    @staticmethod
+    def attributes_dict(attributes):
+        """
+        Builds the dict from a BusinessAttributes or from a Row of the same columns, so that the attributes can be
+        selected without loading BusinessAttributes instances
+        """
         return {
-            "id": self.id,
-            "business_id": str(self.business_id),
-            "sample_summary_id": self.sample_summary_id,
-            "collection_exercise": self.collection_exercise,
-            "attributes": self.attributes,
-            "created_on": self.created_on.strftime("%Y-%m-%d %H:%M:%S"),
-            "name": self.name,
-            "trading_as": self.trading_as,
+            "id": attributes.id,
+            "business_id": str(attributes.business_id),
+            "sample_summary_id": attributes.sample_summary_id,
+            "collection_exercise": attributes.collection_exercise,
+            "attributes": attributes.attributes,
+            "created_on": attributes.created_on.strftime("%Y-%m-%d %H:%M:%S"),
+            "name": attributes.name,
+            "trading_as": attributes.trading_as,
         }
 
 
@@ -286,6 +475,13 @@ class Respondent(Base):
     Index("respondent_first_name_idx", first_name)
     Index("respondent_last_name_idx", last_name)
     Index("respondent_email_idx", email_address)
+    # Emails are looked up case-insensitively, see query_respondent_by_email
+    Index("respondent_email_lower_idx", func.lower(email_address))
+    Index("respondent_pending_email_lower_idx", func.lower(pending_email_address))
+
+    @validates("email_address", "pending_email_address")
+    def _normalise_email_address(self, key, email_address):
+        return email_address.lower() if email_address else email_address
 
     @staticmethod
     def _get_business_associations(businesses):
@@ -308,18 +504,26 @@ class Respondent(Base):
         return associations
 
     def to_respondent_dict(self):
+        return self.respondent_dict(self)
+
+    @staticmethod
+    def respondent_dict(respondent):
+        """
+        Builds the respondent dict from a Respondent or from a Row of the same columns, so that list endpoints can
+        select just those columns rather than loading Respondent instances
+        """
         return {
-            "id": self.party_uuid,
-            "sampleUnitType": self.UNIT_TYPE,
-            "pendingEmailAddress": self.pending_email_address,
-            "emailAddress": self.email_address,
-            "firstName": self.first_name,
-            "lastName": self.last_name,
-            "telephone": self.telephone,
-            "status": RespondentStatus(self.status).name,
-            "markForDeletion": self.mark_for_deletion,
-            "password_verification_token": self.password_verification_token,
-            "password_reset_counter": self.password_reset_counter,
+            "id": respondent.party_uuid,
+            "sampleUnitType": Respondent.UNIT_TYPE,
+            "pendingEmailAddress": respondent.pending_email_address,
+            "emailAddress": respondent.email_address,
+            "firstName": respondent.first_name,
+            "lastName": respondent.last_name,
+            "telephone": respondent.telephone,
+            "status": RespondentStatus(respondent.status).name,
+            "markForDeletion": respondent.mark_for_deletion,
+            "password_verification_token": respondent.password_verification_token,
+            "password_reset_counter": respondent.password_reset_counter,
         }
 
     def to_respondent_with_associations_dict(self):
@@ -327,7 +531,11 @@ class Respondent(Base):
         respondent_dict["associations"] = self._get_business_associations(self.businesses)
         return filter_falsey_values(respondent_dict)
 
-    def to_party_dict(self):
+    def to_party_dict(self, associations=None):
+        """
+        :param associations: the associations to include, instead of loading all of the respondent's businesses and
+                             their enrolments
+        """
         d = {
             "id": self.party_uuid,
             "sampleUnitType": self.UNIT_TYPE,
@@ -340,7 +548,9 @@ class Respondent(Base):
                     "telephone": self.telephone,
                 }
             ),
-            "associations": self._get_business_associations(self.businesses),
+            "associations": (
+                associations if associations is not None else self._get_business_associations(self.businesses)
+            ),
         }
 
         return d
@@ -403,14 +613,163 @@ class PendingSurveys(Base):
     )
 
     def to_pending_surveys_dict(self):
+        return self.pending_surveys_dict(self)
+
+    @staticmethod
+    def pending_surveys_dict(pending_survey):
+        """
+        Builds the pending survey dict from a PendingSurveys or from a Row of the same columns, so that list
+        endpoints can select just those columns rather than loading PendingSurveys instances
+        """
         d = {
-            "email_address": self.email_address,
-            "business_id": self.business_id,
-            "survey_id": self.survey_id,
-            "shared_by": self.shared_by,
-            "batch_no": self.batch_no,
-            "is_transfer": self.is_transfer,
-            "time_shared": self.time_shared.strftime("%Y-%m-%d %H:%M:%S"),
+            "email_address": pending_survey.email_address,
+            "business_id": pending_survey.business_id,
+            "survey_id": pending_survey.survey_id,
+            "shared_by": pending_survey.shared_by,
+            "batch_no": pending_survey.batch_no,
+            "is_transfer": pending_survey.is_transfer,
+            "time_shared": pending_survey.time_shared.strftime("%Y-%m-%d %H:%M:%S"),
         }
 
         return filter_falsey_values(d)
+
+
+class RespondentEnrolmentSummary(Base):
+    """
+    A denormalised copy of each enrolment together with the details of its business (taken from the most recent
+    business attributes), so that a respondent's enrolments can be read with a single indexed lookup.  It is kept up
+    to date by database triggers on the enrolment, business_attributes and business tables (see
+    ENROLMENT_SUMMARY_TRIGGERS) and shouldn't be written to directly, other than to rebuild it.
+    """
+
+    __tablename__ = "respondent_enrolment_summary"
+
+    respondent_id = Column(Integer, primary_key=True)
+    business_id = Column(UUID, primary_key=True)
+    survey_id = Column(Text, primary_key=True)
+    status = Column("status", Enum(EnrolmentStatus))
+    business_ref = Column(Text)
+    business_name = Column(Text)
+    trading_as = Column(Text)
+    Index("enrolment_summary_business_idx", business_id)
+
+
+ENROLMENT_SUMMARY_TRIGGERS = """
+CREATE OR REPLACE FUNCTION {schema}.refresh_enrolment_summary_businesses(summary_business_ids uuid[]) RETURNS void AS $$
+BEGIN
+    UPDATE {schema}.respondent_enrolment_summary summary
+    SET business_ref = b.business_ref,
+        business_name = ba.attributes ->> 'name',
+        trading_as = ba.attributes ->> 'trading_as'
+    FROM {schema}.business b
+    LEFT JOIN LATERAL (
+        SELECT attributes FROM {schema}.business_attributes
+        WHERE business_attributes.business_id = b.party_uuid
+        ORDER BY business_attributes.created_on DESC LIMIT 1
+    ) ba ON true
+    WHERE summary.business_id = ANY(summary_business_ids) AND b.party_uuid = summary.business_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION {schema}.refresh_enrolment_summary_business(summary_business_id uuid) RETURNS void AS $$
+BEGIN
+    PERFORM {schema}.refresh_enrolment_summary_businesses(ARRAY[summary_business_id]);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION {schema}.maintain_enrolment_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.respondent_id = OLD.respondent_id AND NEW.business_id = OLD.business_id
+            AND NEW.survey_id = OLD.survey_id THEN
+        UPDATE {schema}.respondent_enrolment_summary SET status = NEW.status
+        WHERE respondent_id = NEW.respondent_id AND business_id = NEW.business_id AND survey_id = NEW.survey_id;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {schema}.respondent_enrolment_summary
+        WHERE respondent_id = OLD.respondent_id AND business_id = OLD.business_id AND survey_id = OLD.survey_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {schema}.respondent_enrolment_summary
+            (respondent_id, business_id, survey_id, status, business_ref, business_name, trading_as)
+        SELECT NEW.respondent_id, NEW.business_id, NEW.survey_id, NEW.status, b.business_ref,
+            ba.attributes ->> 'name', ba.attributes ->> 'trading_as'
+        FROM {schema}.business b
+        LEFT JOIN LATERAL (
+            SELECT attributes FROM {schema}.business_attributes
+            WHERE business_attributes.business_id = b.party_uuid
+            ORDER BY business_attributes.created_on DESC LIMIT 1
+        ) ba ON true
+        WHERE b.party_uuid = NEW.business_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION {schema}.maintain_enrolment_summary_business() RETURNS trigger AS $$
+BEGIN
+    PERFORM {schema}.refresh_enrolment_summary_business(NEW.party_uuid);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Run once per statement with the rows it changed, so that a sample load or a batched delete of attributes is a
+-- single update of the summary, which only has rows for the businesses with enrolments
+CREATE OR REPLACE FUNCTION {schema}.maintain_enrolment_summary_attributes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM {schema}.refresh_enrolment_summary_businesses(ARRAY(SELECT DISTINCT business_id FROM new_attributes));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM {schema}.refresh_enrolment_summary_businesses(ARRAY(SELECT DISTINCT business_id FROM old_attributes));
+    ELSE
+        PERFORM {schema}.refresh_enrolment_summary_businesses(ARRAY(
+            SELECT DISTINCT changed.business_id
+            FROM old_attributes
+            INNER JOIN new_attributes ON new_attributes.id = old_attributes.id
+            CROSS JOIN LATERAL (VALUES (old_attributes.business_id), (new_attributes.business_id)) changed(business_id)
+            WHERE (new_attributes.business_id, new_attributes.attributes, new_attributes.created_on)
+                IS DISTINCT FROM (old_attributes.business_id, old_attributes.attributes, old_attributes.created_on)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS enrolment_summary_trigger ON {schema}.enrolment;
+CREATE TRIGGER enrolment_summary_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON {schema}.enrolment
+    FOR EACH ROW EXECUTE FUNCTION {schema}.maintain_enrolment_summary();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_trigger ON {schema}.business_attributes;
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_insert_trigger ON {schema}.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_insert_trigger
+    AFTER INSERT ON {schema}.business_attributes
+    REFERENCING NEW TABLE AS new_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION {schema}.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_update_trigger ON {schema}.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_update_trigger
+    AFTER UPDATE ON {schema}.business_attributes
+    REFERENCING OLD TABLE AS old_attributes NEW TABLE AS new_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION {schema}.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_delete_trigger ON {schema}.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_delete_trigger
+    AFTER DELETE ON {schema}.business_attributes
+    REFERENCING OLD TABLE AS old_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION {schema}.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_business_trigger ON {schema}.business;
+CREATE TRIGGER enrolment_summary_business_trigger
+    AFTER UPDATE OF business_ref ON {schema}.business
+    FOR EACH ROW WHEN (NEW.business_ref IS DISTINCT FROM OLD.business_ref)
+    EXECUTE FUNCTION {schema}.maintain_enrolment_summary_business();
+"""
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_enrolment_summary_triggers(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    schema = RespondentEnrolmentSummary.__table__.schema or "public"
+    connection.execute(text(ENROLMENT_SUMMARY_TRIGGERS.format(schema=schema)))
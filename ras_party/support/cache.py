@@ -0,0 +1,231 @@
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import structlog
+
+from ras_party.support.metrics import record_cache_lookup
+
+logger = structlog.wrap_logger(logging.getLogger(__name__))
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend:
+    """
+    The interface shared by the cache backends. Keys are strings and values anything json serialisable. A ttl of 0
+    or less means the value is not stored.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_or_set(self, key, loader, ttl):
+        """
+        Cache-aside read: returns the cached value for key, or calls loader and caches what it returns. A loader
+        returning None is not cached, so a missing record is looked up again on the next call
+        """
+        value = self.get(key)
+        record_cache_lookup(key, hit=value is not None)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+
+class MemoryCache(CacheBackend):
+    """
+    A thread safe in-process cache which evicts the least recently used entry once max_size entries are held.
+    Entries are private to the worker process that set them.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    A cache shared by every worker and pod, held in any server speaking the Redis protocol. Values are stored as json
+    with a key prefix so that clear only removes this service's entries. If the server can't be reached the cache
+    falls back to a local MemoryCache and tries the server again after retry_interval seconds.
+    """
+
+    def __init__(self, url, prefix="ras-party:", timeout=0.5, retry_interval=30, fallback=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.fallback = fallback if fallback is not None else MemoryCache()
+        self._socket = None
+        self._reader = None
+        self._unavailable_until = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            value = self._execute("GET", self.prefix + key)
+        except CacheError:
+            return self.fallback.get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        try:
+            self._execute("SET", self.prefix + key, json.dumps(value, default=str), "EX", int(ttl))
+        except CacheError:
+            self.fallback.set(key, value, ttl)
+
+    def delete(self, *keys):
+        # Also removed locally as entries may have been set in the fallback during an outage
+        self.fallback.delete(*keys)
+        if keys:
+            try:
+                self._execute("DEL", *(self.prefix + key for key in keys))
+            except CacheError:
+                pass
+
+    def clear(self):
+        self.fallback.clear()
+        try:
+            cursor = "0"
+            while True:
+                cursor, keys = self._execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 1000)
+                if keys:
+                    self._execute("DEL", *keys)
+                if cursor in ("0", b"0"):
+                    break
+        except CacheError:
+            pass
+
+    def _execute(self, *args):
+        with self._lock:
+            if time.monotonic() < self._unavailable_until:
+                raise CacheError("Cache server unavailable")
+            try:
+                if self._socket is None:
+                    self._connect()
+                self._socket.sendall(self._encode(args))
+                return self._read_reply()
+            except (OSError, CacheError) as exc:
+                logger.warning("Cache server unavailable, using local cache", host=self.host, error=str(exc))
+                self._disconnect()
+                self._unavailable_until = time.monotonic() + self.retry_interval
+                raise CacheError(str(exc))
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.password:
+            self._socket.sendall(self._encode(("AUTH", self.password)))
+            self._read_reply()
+        if self.db:
+            self._socket.sendall(self._encode(("SELECT", self.db)))
+            self._read_reply()
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._reader.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise CacheError("Connection closed by cache server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise CacheError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if prefix == b"*":
+            length = int(body)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise CacheError(f"Unexpected reply from cache server {line!r}")
+
+
+def create_cache(config):
+    """
+    Creates the cache backend for the app, a RedisCache if CACHE_REDIS_URL is set otherwise a MemoryCache
+    """
+    memory_cache = MemoryCache(config["CACHE_MAX_SIZE"])
+    if config.get("CACHE_REDIS_URL"):
+        return RedisCache(config["CACHE_REDIS_URL"], fallback=memory_cache)
+    return memory_cache
@@ -0,0 +1,25 @@
+import hashlib
+
+from flask import make_response, request
+
+
+def conditional_response(version, build_response):
+    """
+    Returns a 304 if the request's If-None-Match holds the ETag for version, otherwise the response from
+    build_response with that ETag set. The ETag is a strong one taken from the version and the request path and query
+    string, so every representation of a party has its own. A build_response that reads from a cache has to use the
+    copy cached for this version, otherwise it could serve an older body under the newer ETag.
+
+    :param version: a hash of the rows the response is built from, or None if they don't exist
+    :param build_response: called with no arguments to build the full response
+    """
+    if version is None:
+        return build_response()
+
+    etag = hashlib.md5(f"{version}|{request.full_path}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(build_response())
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,48 @@
+from enum import Enum
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PartyJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that serialises with orjson when it is installed, falling back to Flask's stdlib json provider when
+    it isn't. orjson handles UUIDs, dataclasses and Enums natively and writes responses straight to bytes. Dates are
+    passed back to Flask's default so both paths produce the same HTTP date strings, and Enums are written as their
+    values by both.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Enum):
+            return o.value
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj, pretty=False).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._orjson_dumps(obj, pretty) + b"\n", mimetype=self.mimetype)
+
+    def _orjson_dumps(self, obj, pretty):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
@@ -0,0 +1,125 @@
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+# Under gunicorn PROMETHEUS_MULTIPROC_DIR is set, and every worker writes its samples to files there so that whichever
+# worker handles a scrape can report the totals for all of them. Gauges are summed over the workers that are alive.
+
+REQUEST_LATENCY = Histogram(
+    "ras_party_request_duration_seconds",
+    "Time taken to handle a request",
+    ["method", "blueprint", "route", "status"],
+)
+DOWNSTREAM_REQUEST_LATENCY = Histogram(
+    "ras_party_downstream_request_duration_seconds",
+    "Time taken by a request to another service",
+    ["service"],
+)
+PUBSUB_PUBLISH_LATENCY = Histogram(
+    "ras_party_pubsub_publish_duration_seconds",
+    "Time taken to publish a message to pubsub and have it acknowledged",
+    ["outcome"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "ras_party_db_pool_connections",
+    "Database connections held open by the connection pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT_CONNECTIONS = Gauge(
+    "ras_party_db_pool_checked_out_connections",
+    "Database connections checked out of the connection pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_LATENCY = Histogram(
+    "ras_party_db_pool_checkout_duration_seconds",
+    "Time taken to check a connection out of the connection pool",
+)
+CACHE_LOOKUPS = Counter(
+    "ras_party_cache_lookups_total",
+    "Cache-aside reads, by the type of value read and whether it was cached",
+    ["cache", "result"],
+)
+
+
+def metrics_response_body():
+    """Returns the metrics of every worker in the Prometheus text format, along with its content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def register_request_metrics(app):
+    """Records the latency of every request to the app against its blueprint and url rule"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = perf_counter()
+
+    @app.after_request
+    def observe_request_latency(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            REQUEST_LATENCY.labels(
+                method=request.method,
+                blueprint=request.blueprint or "",
+                route=request.url_rule.rule if request.url_rule else "unmatched",
+                status=response.status_code,
+            ).observe(perf_counter() - start)
+        return response
+
+
+def register_db_pool_metrics():
+    """Keeps the connection pool gauges up to date from the events of every pool"""
+    if not event.contains(Pool, "connect", _pool_connect):
+        event.listen(Pool, "connect", _pool_connect)
+        event.listen(Pool, "close", _pool_close)
+        event.listen(Pool, "detach", _pool_close)
+        event.listen(Pool, "checkout", _pool_checkout)
+        event.listen(Pool, "checkin", _pool_checkin)
+
+
+@contextmanager
+def downstream_request_timer(service):
+    """Records the time taken by the request to service made within the block"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        DOWNSTREAM_REQUEST_LATENCY.labels(service=service).observe(perf_counter() - start)
+
+
+def record_cache_lookup(key, hit):
+    CACHE_LOOKUPS.labels(cache=key.split(":", 1)[0], result="hit" if hit else "miss").inc()
+
+
+def _pool_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.inc()
+
+
+def _pool_close(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.dec()
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT_CONNECTIONS.inc()
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT_CONNECTIONS.dec()
@@ -0,0 +1,153 @@
+import logging
+import random
+import re
+from time import perf_counter
+
+import structlog
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from ras_party.support.metrics import DB_POOL_CHECKOUT_LATENCY
+
+logger = structlog.wrap_logger(logging.getLogger(__name__))
+
+SLOWEST_STATEMENT_MAX_LENGTH = 500
+
+
+class SQLStatistics:
+    """The SQL statements run and the time spent in the database while handling a single request"""
+
+    def __init__(self):
+        self.statement_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.connection_wait = 0.0
+
+    def record_statement(self, statement, duration):
+        self.statement_count += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def record_connection_wait(self, duration):
+        self.connection_wait += duration
+
+    def server_timing(self):
+        return (
+            f'db;dur={_ms(self.db_time)};desc="{self.statement_count} statements", '
+            f"db-slowest;dur={_ms(self.slowest_time)}, "
+            f"db-wait;dur={_ms(self.connection_wait)}"
+        )
+
+    def log_fields(self):
+        slowest_statement = self.slowest_statement
+        if slowest_statement:
+            slowest_statement = re.sub(r"\s+", " ", slowest_statement).strip()[:SLOWEST_STATEMENT_MAX_LENGTH]
+        return {
+            "sql_statement_count": self.statement_count,
+            "sql_time_ms": _ms(self.db_time),
+            "sql_slowest_ms": _ms(self.slowest_time),
+            "sql_slowest_statement": slowest_statement,
+            "sql_connection_wait_ms": _ms(self.connection_wait),
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection, in the pool checkout metric and against
+    the sampled request if there is one
+    """
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            duration = perf_counter() - start
+            DB_POOL_CHECKOUT_LATENCY.observe(duration)
+            statistics = current_sql_statistics()
+            if statistics is not None:
+                statistics.record_connection_wait(duration)
+
+
+def current_sql_statistics():
+    """Returns the SQLStatistics of the request being handled if it was sampled, otherwise None"""
+    if not has_app_context():
+        return None
+    return g.get("sql_statistics")
+
+
+def register_sql_instrumentation():
+    """
+    Listens for every statement run through any engine so that the time of each is recorded against the sampled
+    request running it. Outside a sampled request the listeners do nothing beyond a lookup on flask.g.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def register_request_instrumentation(app):
+    """
+    Samples SQL_INSTRUMENTATION_SAMPLE_RATE of the requests to the app, and adds the SQL statistics of each sampled
+    request to its log line and its Server-Timing header
+    """
+    sample_rate = float(app.config["SQL_INSTRUMENTATION_SAMPLE_RATE"])
+    if sample_rate <= 0:
+        return
+
+    @app.before_request
+    def start_sql_statistics():
+        if random.random() < sample_rate:
+            g.sql_statistics = SQLStatistics()
+
+    @app.after_request
+    def report_sql_statistics(response):
+        statistics = g.pop("sql_statistics", None)
+        if statistics is None:
+            return response
+
+        server_timing = statistics.server_timing()
+        if "Server-Timing" in response.headers:
+            server_timing = f"{response.headers['Server-Timing']}, {server_timing}"
+        response.headers["Server-Timing"] = server_timing
+        logger.info(
+            "Request SQL statistics",
+            method=request.method,
+            endpoint=request.endpoint,
+            path=request.path,
+            status=response.status_code,
+            **statistics.log_fields(),
+        )
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_sql_statistics() is not None:
+        conn.info.setdefault("sql_statement_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statistics = current_sql_statistics()
+    starts = conn.info.get("sql_statement_start")
+    if statistics is not None and starts:
+        statistics.record_statement(statement, perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    starts = connection.info.get("sql_statement_start") if connection is not None else None
+    if starts:
+        duration = perf_counter() - starts.pop()
+        statistics = current_sql_statistics()
+        if statistics is not None:
+            statistics.record_statement(exception_context.statement, duration)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
@@ -7,6 +7,8 @@ from werkzeug.exceptions import BadRequest
 
 from ras_party.controllers import account_controller, pending_survey_controller
 from ras_party.controllers.validate import Exists, Validator
+from ras_party.models.models import EnrolmentStatus
+from ras_party.uuid_helper import is_valid_uuid4
 
 account_view = Blueprint("account_view", __name__)
 
@@ -126,6 +128,36 @@ def change_respondent_enrolment_status():
     return make_response(jsonify("OK"), 200)
 
 
+@account_view.route("/respondents/change_enrolment_statuses", methods=["PUT"])
+def change_respondent_enrolment_statuses():
+    """
+    Change the enrolment status of many respondents at once, returning the result of each change
+    accepted payload example:
+    {
+        "changes": [
+            {"respondent_id": "respondent_id", "business_id": "business_id", "survey_id": "survey_id",
+             "change_flag": "SUSPENDED"}
+        ]
+    }
+    """
+    payload = request.get_json() or {}
+    changes = payload.get("changes")
+    if not changes:
+        raise BadRequest("Payload Invalid - changes list is empty")
+    for change in changes:
+        v = Validator(Exists("respondent_id", "business_id", "survey_id", "change_flag"))
+        if not v.validate(change):
+            logger.debug(v.errors, url=request.url)
+            raise BadRequest(v.errors)
+        if not (is_valid_uuid4(change["respondent_id"]) and is_valid_uuid4(change["business_id"])):
+            raise BadRequest("respondent_id and business_id must be UUIDs")
+        if change["change_flag"] not in EnrolmentStatus.__members__:
+            raise BadRequest(f"'{change['change_flag']}' is not a valid enrolment status")
+
+    response = account_controller.change_respondent_enrolment_statuses(changes)
+    return make_response(jsonify(response), 200)
+
+
 @account_view.route("/respondents/disable-user-enrolments", methods=["PATCH"])
 def disable_user_enrolments():
     """Disable all enrolments for a specific respondent email address"""
@@ -6,6 +6,7 @@ from flask_httpauth import HTTPBasicAuth
 from werkzeug.exceptions import BadRequest
 
 from ras_party.controllers import business_controller
+from ras_party.support.etag import conditional_response
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
 business_view = Blueprint("business_view", __name__)
@@ -52,23 +53,108 @@ def get_business_by_id(business_id):
     verbose = request.args.get("verbose", "")
     verbose = True if verbose and verbose.lower() == "true" else False
 
-    response = business_controller.get_business_by_id(
-        business_id, verbose=verbose, collection_exercise_id=request.args.get("collection_exercise_id")
+    version = business_controller.get_business_version(business_id)
+    return conditional_response(
+        version,
+        lambda: jsonify(
+            business_controller.get_business_by_id(
+                business_id,
+                verbose=verbose,
+                collection_exercise_id=request.args.get("collection_exercise_id"),
+                version=version,
+            )
+        ),
     )
-    return jsonify(response)
 
 
 @business_view.route("/businesses/id/<business_id>/attributes", methods=["GET"])
 def get_business_attributes_by_id(business_id):
     collection_exercise_ids = request.args.getlist("collection_exercise_id")
-    response = business_controller.get_business_attributes(business_id, collection_exercise_ids=collection_exercise_ids)
+    attribute_keys = request.args.getlist("attribute_key")
+    response = business_controller.get_business_attributes(
+        business_id, collection_exercise_ids=collection_exercise_ids, attribute_keys=attribute_keys
+    )
     logger.debug("Parsed result", response=response)
     return jsonify(response)
 
 
+@business_view.route("/businesses/attributes", methods=["POST"])
+def get_businesses_attributes():
+    """
+    Get the attributes of many businesses, keyed by business id and then collection exercise id
+    accepted payload example:
+    {
+        "business_ids": ["business_id", "business_id"],
+        "collection_exercise_ids": ["collection_exercise_id"],
+        "attribute_keys": ["ruref", "froempment"]
+    }
+    collection_exercise_ids and attribute_keys are optional
+    """
+    payload = request.get_json() or {}
+    business_ids = _optional_list_of_strings(payload, "business_ids")
+    if not business_ids:
+        raise BadRequest("Payload Invalid - business_ids list is empty")
+    response = business_controller.get_businesses_attributes(
+        business_ids,
+        collection_exercise_ids=_optional_list_of_strings(payload, "collection_exercise_ids"),
+        attribute_keys=_optional_list_of_strings(payload, "attribute_keys"),
+    )
+    return jsonify(response)
+
+
+@business_view.route("/businesses/attributes/search", methods=["POST"])
+def search_businesses_by_attributes():
+    """
+    Find the attributes records of a collection exercise's businesses that have all the given attribute values
+    accepted payload example:
+    {
+        "collection_exercise_id": "collection_exercise_id",
+        "attributes": {"region": "WW", "cell_no": 1},
+        "attribute_keys": ["ruref", "name"],
+        "page": 1,
+        "limit": 100,
+        "max_rec": 10000
+    }
+    attribute_keys, page, limit and max_rec are optional
+    """
+    payload = request.get_json() or {}
+    try:
+        page = int(payload.get("page", 1))
+        limit = int(payload.get("limit", 100))
+        max_rec = int(payload.get("max_rec", 10000))
+    except (TypeError, ValueError):
+        raise BadRequest("page, limit and max_rec must be integers")
+    response = business_controller.search_businesses_by_attributes(
+        payload.get("collection_exercise_id"),
+        payload.get("attributes"),
+        page,
+        limit,
+        max_rec,
+        attribute_keys=_optional_list_of_strings(payload, "attribute_keys"),
+    )
+    return jsonify(response)
+
+
+def _optional_list_of_strings(payload, key):
+    """
+    :return: the payload's value for key, if it's a list of strings, or None if it isn't given
+    :raises BadRequest: Raised if the value is anything else, such as a single string which would be used a character
+                        at a time
+    """
+    value = payload.get(key)
+    if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+        raise BadRequest(f"{key} must be a list of strings")
+    return value
+
+
 @business_view.route("/businesses/attributes/sample-summary/<sample_summary_id>", methods=["DELETE"])
 def delete_business_attributes_by_sample_summary_id(sample_summary_id):
-    business_controller.delete_attributes_by_sample_summary_id(sample_summary_id)
+    dry_run = request.args.get("dry_run", "")
+    dry_run = True if dry_run and dry_run.lower() == "true" else False
+
+    records = business_controller.delete_attributes_by_sample_summary_id(sample_summary_id, dry_run=dry_run)
+    if dry_run:
+        return jsonify({"sampleSummaryId": sample_summary_id, "records": records})
     return "", 204
 
 
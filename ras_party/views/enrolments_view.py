@@ -10,6 +10,7 @@ from werkzeug.exceptions import BadRequest, NotFound
 
 from ras_party.controllers.enrolments_controller import (
     is_respondent_enrolled,
+    rebuild_enrolment_summary,
     respondent_enrolments,
 )
 from ras_party.uuid_helper import is_valid_uuid4
@@ -75,3 +76,9 @@ def get_is_respondent_enrolled(party_uuid: UUID, business_id: UUID, survey_id: U
     if enrolled_status:
         return make_response({"enrolled": True}, 200)
     return make_response({"enrolled": False}, 200)
+
+
+@enrolments_view.route("/summary/rebuild", methods=["POST"])
+def post_rebuild_enrolment_summary() -> Response:
+    records = rebuild_enrolment_summary()
+    return make_response({"records": records}, 200)
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, make_response
 
 from ras_party.controllers import info_controller
+from ras_party.support.metrics import metrics_response_body
 
 info_view = Blueprint("info_view", __name__)
 
@@ -9,3 +10,9 @@ info_view = Blueprint("info_view", __name__)
 def get_info():
     response = info_controller.get_info()
     return make_response(jsonify(response), 200)
+
+
+@info_view.route("/metrics", methods=["GET"])
+def get_metrics():
+    body, content_type = metrics_response_body()
+    return make_response(body, 200, {"Content-Type": content_type})
@@ -2,6 +2,7 @@ from flask import Blueprint, current_app, jsonify, request
 from flask_httpauth import HTTPBasicAuth
 
 from ras_party.controllers import party_controller
+from ras_party.support.etag import conditional_response
 
 party_view = Blueprint("party_view", __name__)
 auth = HTTPBasicAuth()
@@ -40,11 +41,13 @@ def get_party_by_id(sample_unit_type, id):
     survey_id = request.args.get("survey_id")
     enrolment_status = request.args.getlist("enrolment_status")
 
-    if survey_id:
-        response = party_controller.get_party_with_enrolments_filtered_by_survey(
-            sample_unit_type, id, survey_id, enrolment_status
-        )
-    else:
-        response = party_controller.get_party_by_id(sample_unit_type, id)
+    def build_response():
+        if survey_id:
+            response = party_controller.get_party_with_enrolments_filtered_by_survey(
+                sample_unit_type, id, survey_id, enrolment_status
+            )
+        else:
+            response = party_controller.get_party_by_id(sample_unit_type, id)
+        return jsonify(response)
 
-    return jsonify(response)
+    return conditional_response(party_controller.get_party_version(sample_unit_type, id), build_response)
@@ -7,8 +7,10 @@ from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import BadRequest, NotFound
 
 from ras_party.controllers import pending_survey_controller
-from ras_party.controllers.business_controller import get_business_by_id
-from ras_party.controllers.notify_gateway import NotifyGateway
+from ras_party.controllers.business_controller import (
+    get_business_by_id,
+    get_business_names_by_ids,
+)
 from ras_party.controllers.pending_survey_controller import (
     confirm_pending_survey,
     get_pending_survey_by_batch_number,
@@ -61,6 +63,39 @@ def pending_survey_users():
         raise BadRequest("Business id and Survey id is required for this request.")
 
 
+@pending_survey_view.route("/pending-survey-users-count", methods=["POST"])
+def pending_survey_users_batch():
+    """
+    Get total users count who are already enrolled and pending share/transfer survey for many business id and
+    survey id pairs
+    accepted payload example:
+    {
+        "is_transfer": false,
+        "business_surveys": [
+            {"business_id": "business_id", "survey_id": "survey_id"},
+            {"business_id": "business_id", "survey_id": "survey_id"}
+        ]
+    }
+    """
+    payload = request.get_json() or {}
+    business_surveys = payload.get("business_surveys")
+    if not business_surveys:
+        raise BadRequest("Payload Invalid - business_surveys list is empty")
+    for business_survey in business_surveys:
+        v = Validator(Exists("business_id", "survey_id"))
+        if not v.validate(business_survey):
+            logger.debug(v.errors)
+            raise BadRequest(v.errors)
+    # this is just to validate that the business ids exist
+    get_business_names_by_ids(
+        list(dict.fromkeys(business_survey["business_id"] for business_survey in business_surveys))
+    )
+    response = pending_survey_controller.get_users_enrolled_and_pending_survey_against_businesses_and_surveys(
+        business_surveys=business_surveys, is_transfer=payload.get("is_transfer", False) is True
+    )
+    return make_response(jsonify(response), 200)
+
+
 @pending_survey_view.route("/pending-surveys", methods=["POST"])
 def post_pending_surveys():
     """
@@ -109,7 +144,6 @@ def post_pending_surveys():
         existing_user_email_template = "transfer_survey_access_existing_account"
         new_user_email_template = "transfer_survey_access_new_account"
 
-    business_list = []
     if len(pending_surveys) == 0:
         raise BadRequest("Payload Invalid - pending_surveys list is empty")
     for survey in pending_surveys:
@@ -129,20 +163,12 @@ def post_pending_surveys():
         raise BadRequest("Originator unknown")
     batch_number = uuid.uuid4()
     # logic to extract business list
-    business_id_list = {pending_surveys["business_id"] for pending_surveys in pending_surveys}
-    for business_id in business_id_list:
-        business = get_business_by_id(business_id)
-        business_list.append(business["name"])
+    business_id_list = list(dict.fromkeys(pending_survey["business_id"] for pending_survey in pending_surveys))
+    business_list = list(get_business_names_by_ids(business_id_list).values())
     try:
-        for pending_survey in pending_surveys:
-            pending_survey_controller.pending_survey_create(
-                business_id=pending_survey["business_id"],
-                survey_id=pending_survey["survey_id"],
-                email_address=pending_survey["email_address"],
-                shared_by=pending_survey["shared_by"],
-                batch_number=batch_number,
-                is_transfer=is_transfer,
-            )
+        pending_survey_controller.pending_surveys_create(
+            pending_surveys=pending_surveys, batch_number=batch_number, is_transfer=is_transfer
+        )
     except SQLAlchemyError:
         raise BadRequest("This pending survey is already in progress")
     # logic to send email
@@ -169,7 +195,7 @@ def send_pending_survey_email(personalisation: dict, template: str, email: str,
     """
     try:
         logger.info("sending email for share/transfer share", batch_id=str(batch_id))
-        NotifyGateway(current_app.config).request_to_notify(
+        current_app.notify_gateway.request_to_notify(
             email=email, template_name=template, personalisation=personalisation
         )
         logger.info("email for share/transfer survey sent", batch_id=str(batch_id))
@@ -270,12 +296,9 @@ def resend_pending_surveys_email():
         email_template = existing_user_email_template
     except NotFound:
         email_template = new_user_email_template
-    business_list = []
     logger.info("retrieving list of business against batch number", batch_number=batch_number)
-    business_id_list = {pending_survey["business_id"] for pending_survey in pending_surveys}
-    for business_id in business_id_list:
-        business = get_business_by_id(str(business_id))
-        business_list.append(business["name"])
+    business_id_list = list(dict.fromkeys(str(pending_survey["business_id"]) for pending_survey in pending_surveys))
+    business_list = list(get_business_names_by_ids(business_id_list).values())
     personalisation = {
         "CONFIRM_EMAIL_URL": verification_url,
         "ORIGINATOR_EMAIL_ADDRESS": originator.email_address,
@@ -8,6 +8,7 @@ from werkzeug.exceptions import BadRequest
 
 from ras_party.controllers import respondent_controller
 from ras_party.controllers.enrolments_controller import is_respondent_enrolled
+from ras_party.support.etag import conditional_response
 from ras_party.uuid_helper import is_valid_uuid4
 
 logger = structlog.wrap_logger(logging.getLogger(__name__))
@@ -83,11 +84,15 @@ def get_respondent_by_party_id(party_id: UUID) -> Response:
     if not is_valid_uuid4(party_id):
         return make_response("party_id is not UUID", 400)
 
-    respondent = respondent_controller.get_respondent_by_party_id(party_id)
-    if respondent:
-        return make_response(respondent.to_respondent_dict(), 200)
+    version = respondent_controller.get_respondent_version(party_id)
 
-    return make_response(f"respondent not found for party_id {party_id}", 404)
+    def build_response():
+        respondent = respondent_controller.get_respondent_dict_by_party_id(party_id, version=version)
+        if respondent:
+            return make_response(respondent, 200)
+        return make_response(f"respondent not found for party_id {party_id}", 404)
+
+    return conditional_response(version, build_response)
 
 
 @respondent_view.route("/respondents/id/<respondent_id>", methods=["GET"])
@@ -26,6 +26,11 @@ def create_app(config=None):
 
     # register view blueprints
     from ras_party import error_handlers
+    from ras_party.controllers.notify_gateway import NotifyGateway
+    from ras_party.support.cache import create_cache
+    from ras_party.support.json_provider import PartyJSONProvider
+    from ras_party.support.metrics import register_request_metrics
+    from ras_party.support.sql_instrumentation import register_request_instrumentation
     from ras_party.views.account_view import account_view
     from ras_party.views.batch_request import batch_request
     from ras_party.views.business_view import business_view
@@ -45,26 +50,49 @@ def create_app(config=None):
     app.register_blueprint(info_view)
     app.register_blueprint(error_handlers.blueprint)
 
+    app.json = PartyJSONProvider(app)
+    app.cache = create_cache(app.config)
+    app.notify_gateway = NotifyGateway(app.config)
+    register_request_instrumentation(app)
+    register_request_metrics(app)
+
     CORS(app)
     return app
 
 
-def create_database(db_connection, db_schema):
+def create_database(db_connection, db_schema, check_schema=True):
+    from ras_party.controllers.cache_controller import register_cache_invalidation
     from ras_party.models import models
-
-    engine = create_engine(db_connection)
-    session = scoped_session(sessionmaker())
+    from ras_party.support.metrics import register_db_pool_metrics
+    from ras_party.support.sql_instrumentation import (
+        TimedQueuePool,
+        register_sql_instrumentation,
+    )
+
+    register_sql_instrumentation()
+    register_db_pool_metrics()
+    # QueuePool is already the default for postgres, the subclass only adds the connection wait timing
+    engine_options = {"poolclass": TimedQueuePool} if db_connection.startswith("postgres") else {}
+    engine = create_engine(db_connection, **engine_options)
+    session_factory = sessionmaker()
+    register_cache_invalidation(session_factory)
+    session = scoped_session(session_factory)
     session.configure(bind=engine, autoflush=False, expire_on_commit=False)
     engine.session = session
     models.Base.query = session.query_property()
 
-    logger.info("Creating database")
-
     if db_connection.startswith("postgres"):
         # fix-up the postgres schema:
         for t in models.Base.metadata.sorted_tables:
             t.schema = db_schema
 
+    if not check_schema:
+        logger.info("Skipping the database schema check", schema=db_schema)
+        return engine
+
+    logger.info("Creating database")
+
+    if db_connection.startswith("postgres"):
         q = exists(
             select(column("schema_name"))
             .select_from(text("information_schema.schemata"))
@@ -85,6 +113,9 @@ def create_database(db_connection, db_schema):
         logger.info("Creating database tables.")
         models.Base.metadata.create_all(engine)
 
+    # The check's transaction would otherwise hold its connection open, and with preload_app the workers forked from
+    # this process would all share it
+    session.remove()
     logger.info("Ok, database tables have been created.")
     return engine
 
@@ -97,7 +128,9 @@ def retry_if_database_error(exception):
 @retry(retry_on_exception=retry_if_database_error, wait_fixed=2000, stop_max_delay=30000, wrap_exception=True)
 def initialise_db(app):
     # TODO: this isn't entirely safe, use a get_db() lazy initializer instead...
-    app.db = create_database(app.config["DATABASE_URI"], app.config["DATABASE_SCHEMA"])
+    app.db = create_database(
+        app.config["DATABASE_URI"], app.config["DATABASE_SCHEMA"], app.config["DATABASE_SCHEMA_CHECK"]
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+"""Times serialising a large business list response with the orjson and stdlib paths of PartyJSONProvider"""
+
+import os
+import sys
+
+parent_dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(parent_dir_path)
+
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+from ras_party.models.models import EnrolmentStatus, RespondentStatus
+from ras_party.support import json_provider
+from run import create_app
+
+
+def business_list(count):
+    """Builds a list shaped like the GET /businesses response, each business with two enrolled respondents"""
+    return [
+        {
+            "id": uuid.uuid4(),
+            "sampleUnitRef": f"{49900000000 + i}",
+            "sampleUnitType": "B",
+            "sampleSummaryId": str(uuid.uuid4()),
+            "name": f"Business {i} Ltd",
+            "trading_as": f"Business {i}",
+            "created_on": datetime.now(),
+            "associations": [
+                {
+                    "partyId": uuid.uuid4(),
+                    "businessRespondentStatus": RespondentStatus.ACTIVE.name,
+                    "enrolments": [
+                        {"surveyId": str(uuid.uuid4()), "enrolmentStatus": EnrolmentStatus.ENABLED} for _ in range(3)
+                    ],
+                }
+                for _ in range(2)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--businesses", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if json_provider.orjson is None:
+        sys.exit("orjson is not installed, install it to compare against the stdlib fallback")
+
+    app = create_app("TestingConfig")
+    app.debug = False
+    payload = business_list(args.businesses)
+
+    with app.app_context():
+        orjson_seconds = timeit.timeit(lambda: app.json.response(payload), number=args.repeat)
+        with patch.object(json_provider, "orjson", None):
+            stdlib_seconds = timeit.timeit(lambda: app.json.response(payload), number=args.repeat)
+
+    results = {
+        "businesses": args.businesses,
+        "repeat": args.repeat,
+        "stdlib_ms_per_response": round(stdlib_seconds / args.repeat * 1000, 3),
+        "orjson_ms_per_response": round(orjson_seconds / args.repeat * 1000, 3),
+        "speedup": round(stdlib_seconds / orjson_seconds, 2),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
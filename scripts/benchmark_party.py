@@ -0,0 +1,567 @@
+"""
+Seeds a synthetic party dataset at production-like volumes into a local Postgres and times the main read and batch
+paths of the party service against it, writing the timings as JSON so that runs on different commits can be compared.
+
+The dataset is generated in the database from the seed, so the same seed and scale always produce the same rows.
+Party ids are md5 hashes of the seed and the row number, which lets the scenarios pick parties without querying for
+them. A dataset is kept in its schema between runs and reused when it was seeded with the same settings; pass
+--recreate to reseed it. The share and transfer scenarios add enrolments for the respondents they pick, and the
+cleanup scenarios only delete rows they insert themselves, so a reused dataset stays comparable.
+
+Examples:
+    python scripts/benchmark_party.py --scale 0.01 --output results.json
+    python scripts/benchmark_party.py --output new.json --compare baseline.json --threshold 20
+"""
+
+import os
+import sys
+
+parent_dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(parent_dir_path)
+
+import argparse
+import hashlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import UTC, datetime
+
+from sqlalchemy import create_engine, text
+
+from logger_config import logger_initial_config
+from ras_party.controllers import (
+    business_controller,
+    enrolments_controller,
+    party_controller,
+    pending_survey_controller,
+)
+from ras_party.controllers.cache_controller import SURVEYS_CACHE_KEY
+from ras_party.controllers.queries import rebuild_respondent_enrolment_summary
+from ras_party.models.models import Enrolment, Respondent
+from run import create_app, create_database
+
+SURVEY_COUNT = 30
+BUSINESS_REF_START = 49900000000
+WORDS = [
+    "Acme",
+    "Albion",
+    "Anchor",
+    "Apex",
+    "Beacon",
+    "Birch",
+    "Bridge",
+    "Bright",
+    "Castle",
+    "Cedar",
+    "Central",
+    "Chapel",
+    "Coastal",
+    "Crown",
+    "Delta",
+    "Eagle",
+    "Elm",
+    "Falcon",
+    "Forge",
+    "Fountain",
+    "Garden",
+    "Globe",
+    "Granite",
+    "Harbour",
+    "Heath",
+    "Highland",
+    "Horizon",
+    "Iron",
+    "Kestrel",
+    "Lakeside",
+    "Lion",
+    "Maple",
+    "Meadow",
+    "Mill",
+    "Northern",
+    "Oak",
+    "Orchard",
+    "Pennine",
+    "Phoenix",
+    "Pioneer",
+    "Quarry",
+    "Regent",
+    "River",
+    "Royal",
+    "Severn",
+    "Silver",
+    "Southern",
+    "Spring",
+    "Star",
+    "Summit",
+    "Thames",
+    "Union",
+    "Valley",
+    "Vale",
+    "Victoria",
+    "Western",
+    "Willow",
+    "Windsor",
+    "York",
+    "Zenith",
+]
+SUFFIXES = ["Ltd", "Limited", "PLC", "Holdings", "Trading", "Services", "Group", "& Sons"]
+FIRST_NAMES = ["Alex", "Sam", "Jo", "Chris", "Pat", "Robin", "Charlie", "Jamie", "Morgan", "Taylor", "Ali", "Kim"]
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Evans", "Thomas", "Roberts", "Khan"]
+
+
+def party_uuid(seed, kind, number):
+    """The id the seeding SQL gives the number'th row of kind, md5(seed:kind:number) read as a uuid"""
+    return str(uuid.UUID(hashlib.md5(f"{seed}:{kind}:{number}".encode()).hexdigest()))
+
+
+def dataset_settings(args):
+    return {
+        "seed": args.seed,
+        "businesses": max(1, int(args.businesses * args.scale)),
+        "attribute_versions": args.attribute_versions,
+        "respondents": max(1, int(args.respondents * args.scale)),
+        "associations_per_respondent": args.associations_per_respondent,
+        "enrolments_per_association": args.enrolments_per_association,
+    }
+
+
+def seed_dataset(app, schema, settings):
+    """Creates the schema and fills it with the dataset described by settings, unless it already holds that dataset"""
+    engine = app.db
+    with engine.begin() as connection:
+        comment = connection.execute(
+            text("SELECT obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname = :schema"),
+            {"schema": schema},
+        ).scalar()
+    if comment and json.loads(comment) == settings:
+        print(f"Reusing the dataset in schema {schema}", file=sys.stderr)
+        return
+
+    tables = ["enrolment", "business_respondent", "pending_surveys", "business_attributes", "respondent", "business"]
+    business_count = settings["businesses"]
+    seed = str(settings["seed"])
+    enrolment_status = Enrolment.__table__.c.status.type.compile(dialect=engine.dialect)
+    respondent_status = Respondent.__table__.c.status.type.compile(dialect=engine.dialect)
+    parameters = {
+        "seed": seed,
+        "businesses": business_count,
+        "versions": settings["attribute_versions"],
+        "respondents": settings["respondents"],
+        "associations": settings["associations_per_respondent"],
+        "enrolments": settings["enrolments_per_association"],
+        "surveys": SURVEY_COUNT,
+        "ref_start": BUSINESS_REF_START,
+        "words": WORDS,
+        "suffixes": SUFFIXES,
+        "first_names": FIRST_NAMES,
+        "last_names": LAST_NAMES,
+    }
+
+    steps = [
+        ("Emptying tables", f"TRUNCATE {', '.join(f'{schema}.{table}' for table in tables)} CASCADE"),
+        (
+            "Disabling enrolment summary triggers",
+            f"ALTER TABLE {schema}.enrolment DISABLE TRIGGER enrolment_summary_trigger;"
+            f"ALTER TABLE {schema}.business_attributes DISABLE TRIGGER enrolment_summary_attributes_trigger",
+        ),
+        (
+            f"Seeding {business_count} businesses",
+            f"""
+            INSERT INTO {schema}.business (party_uuid, business_ref, created_on)
+            SELECT md5(:seed || ':business:' || i)::uuid, (:ref_start + i)::text,
+                   timestamp '2020-01-01' + i * interval '1 second'
+            FROM generate_series(1, :businesses) i
+            """,
+        ),
+        (
+            f"Seeding {business_count * settings['attribute_versions']} business attribute versions",
+            f"""
+            INSERT INTO {schema}.business_attributes
+                (business_id, sample_summary_id, collection_exercise, attributes, created_on, name, trading_as)
+            SELECT md5(:seed || ':business:' || i)::uuid, md5(:seed || ':sample:' || v)::uuid::text,
+                   md5(:seed || ':collection_exercise:' || v)::uuid::text,
+                   jsonb_build_object(
+                       'sampleUnitRef', (:ref_start + i)::text, 'sampleUnitType', 'B', 'name', n.name,
+                       'trading_as', n.trading_as, 'runame1', n.name, 'tradstyle1', n.trading_as,
+                       'region', 'GB', 'cell_no', i % 10, 'entref', (9900000000 + i)::text, 'froempment', i % 500
+                   ),
+                   timestamp '2021-01-01' + v * interval '30 days' + i * interval '1 millisecond', n.name, n.trading_as
+            FROM generate_series(1, :businesses) i
+            CROSS JOIN generate_series(1, :versions) v
+            CROSS JOIN LATERAL (
+                SELECT (:words)[1 + i % cardinality(:words)] || ' '
+                           || (:words)[1 + (i / cardinality(:words)) % cardinality(:words)] || ' '
+                           || (:suffixes)[1 + (i + v) % cardinality(:suffixes)] AS name,
+                       (:words)[1 + (i * 7) % cardinality(:words)] || ' '
+                           || (:words)[1 + (i * 13) % cardinality(:words)] AS trading_as
+            ) n
+            """,
+        ),
+        (
+            f"Seeding {settings['respondents']} respondents",
+            f"""
+            INSERT INTO {schema}.respondent
+                (id, party_uuid, status, email_address, first_name, last_name, telephone, mark_for_deletion,
+                 created_on, password_reset_counter)
+            SELECT j, md5(:seed || ':respondent:' || j)::uuid,
+                   (CASE WHEN j % 10 = 0 THEN 'CREATED' WHEN j % 50 = 1 THEN 'SUSPENDED' ELSE 'ACTIVE' END)::{respondent_status},
+                   'respondent' || j || '@example.com', (:first_names)[1 + j % cardinality(:first_names)],
+                   (:last_names)[1 + (j / 7) % cardinality(:last_names)], '07' || lpad(j::text, 9, '0'), false,
+                   timestamp '2021-01-01' + j * interval '1 second', 0
+            FROM generate_series(1, :respondents) j;
+            SELECT setval(pg_get_serial_sequence('{schema}.respondent', 'id'), :respondents)
+            """,
+        ),
+        (
+            f"Seeding {settings['respondents'] * settings['associations_per_respondent']} business associations",
+            f"""
+            INSERT INTO {schema}.business_respondent (business_id, respondent_id, status, effective_from, created_on)
+            SELECT DISTINCT ON (1, 2)
+                   md5(:seed || ':business:' || (((j - 1) * :associations + k - 1) % :businesses + 1))::uuid, j,
+                   'ACTIVE', timestamp '2021-06-01', timestamp '2021-06-01'
+            FROM generate_series(1, :respondents) j
+            CROSS JOIN generate_series(1, :associations) k
+            """,
+        ),
+        (
+            "Seeding enrolments",
+            f"""
+            INSERT INTO {schema}.enrolment (business_id, respondent_id, survey_id, status, created_on)
+            SELECT br.business_id, br.respondent_id, md5(:seed || ':survey:' || ((br.respondent_id + e) % :surveys))::uuid::text,
+                   (CASE WHEN (br.respondent_id + e) % 20 = 0 THEN 'DISABLED'
+                         WHEN (br.respondent_id + e) % 10 = 0 THEN 'PENDING'
+                         ELSE 'ENABLED' END)::{enrolment_status},
+                   timestamp '2021-06-01'
+            FROM {schema}.business_respondent br
+            CROSS JOIN generate_series(1, :enrolments) e
+            """,
+        ),
+        (
+            "Enabling enrolment summary triggers",
+            f"ALTER TABLE {schema}.enrolment ENABLE TRIGGER enrolment_summary_trigger;"
+            f"ALTER TABLE {schema}.business_attributes ENABLE TRIGGER enrolment_summary_attributes_trigger",
+        ),
+    ]
+
+    for description, statements in steps:
+        print(f"{description}...", file=sys.stderr)
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            for statement in statements.split(";\n"):
+                if statement.strip():
+                    connection.execute(text(statement), parameters)
+        print(f"  took {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    # Without fresh statistics the planner treats the just seeded tables as empty, and the rebuild's lookup of the
+    # latest attributes of each business becomes a scan of every attribute version per enrolment
+    analyse = f"ANALYZE {', '.join(f'{schema}.{table}' for table in tables)}"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        print("Analysing tables...", file=sys.stderr)
+        connection.execute(text(analyse))
+
+    print("Rebuilding the respondent enrolment summary...", file=sys.stderr)
+    start = time.perf_counter()
+    with app.app_context():
+        session = app.db.session()
+        rebuild_respondent_enrolment_summary(session)
+        session.commit()
+        app.db.session.remove()
+    print(f"  took {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(analyse))
+        connection.execute(text(f"COMMENT ON SCHEMA {schema} IS '{json.dumps(settings)}'"))
+
+
+class Scenarios:
+    """Each scenario method takes the repetition number, does any untimed setup and returns the call to time"""
+
+    def __init__(self, app, schema, settings, rng):
+        self.app = app
+        self.schema = schema
+        self.settings = settings
+        self.seed = settings["seed"]
+        self.rng = rng
+        self._used_respondents = set()
+
+    def business_number(self):
+        return self.rng.randint(1, self.settings["businesses"])
+
+    def active_respondent_number(self):
+        """A respondent not yet picked by a share or transfer, that the seed made ACTIVE"""
+        while True:
+            number = self.rng.randint(1, self.settings["respondents"])
+            if number % 10 != 0 and number % 50 != 1 and number not in self._used_respondents:
+                self._used_respondents.add(number)
+                return number
+
+    def search_by_ru_ref(self, repetition):
+        ru_ref_prefix = str(BUSINESS_REF_START + self.business_number())[:9]
+        return lambda: business_controller.get_businesses_by_search_query(ru_ref_prefix, 1, 25, 10000)
+
+    def search_by_name(self, repetition):
+        name = self.rng.choice(WORDS)
+        return lambda: business_controller.get_businesses_by_search_query(name, 1, 25, 10000)
+
+    def enrolments_dashboard(self, repetition):
+        respondent_id = party_uuid(self.seed, "respondent", self.active_respondent_number())
+        return lambda: enrolments_controller.respondent_enrolments(party_uuid=respondent_id)
+
+    def get_business(self, repetition):
+        business_id = party_uuid(self.seed, "business", self.business_number())
+        self.app.cache.clear()
+        return lambda: business_controller.get_business_by_id(business_id, verbose=True)
+
+    def get_business_party(self, repetition):
+        business_id = party_uuid(self.seed, "business", self.business_number())
+        return lambda: party_controller.get_party_by_id("B", business_id)
+
+    def get_respondent_party(self, repetition):
+        respondent_id = party_uuid(self.seed, "respondent", self.rng.randint(1, self.settings["respondents"]))
+        return lambda: party_controller.get_party_by_id("BI", respondent_id)
+
+    def get_businesses_by_ids(self, repetition):
+        business_ids = [party_uuid(self.seed, "business", self.business_number()) for _ in range(50)]
+        return lambda: business_controller.get_businesses_by_ids(business_ids)
+
+    def share_accept(self, repetition):
+        batch_no = self._pending_surveys_from_originator(is_transfer=False)
+        return lambda: pending_survey_controller.confirm_pending_survey(batch_no)
+
+    def transfer_accept(self, repetition):
+        batch_no = self._pending_surveys_from_originator(is_transfer=True)
+        return lambda: pending_survey_controller.confirm_pending_survey(batch_no)
+
+    def batch_cleanup_pending_surveys(self, repetition):
+        """The expired pending surveys job behind DELETE /batch/pending-surveys, without the emails"""
+        self._execute(
+            f"""
+            INSERT INTO {self.schema}.pending_surveys
+                (email_address, business_id, survey_id, time_shared, shared_by, batch_no, is_transfer)
+            SELECT 'expired' || n || '@example.com', md5(:seed || ':business:' || (n % :businesses + 1))::uuid,
+                   md5(:seed || ':survey:' || (n % :surveys))::uuid::text, now() - interval '30 days',
+                   md5(:seed || ':respondent:' || (n % :respondents + 1))::uuid,
+                   md5(:seed || ':expired_batch:' || :repetition || ':' || n / 5)::uuid, n % 4 = 0
+            FROM generate_series(1, :count) n
+            """,
+            repetition=repetition,
+            count=max(100, self.settings["businesses"] // 20),
+        )
+
+        def cleanup():
+            pending_survey_controller.get_unique_pending_surveys(False)
+            pending_survey_controller.get_unique_pending_surveys(True)
+            pending_survey_controller.delete_pending_surveys()
+
+        return cleanup
+
+    def batch_cleanup_attributes(self, repetition):
+        """Deleting the attributes of a sample, as for DELETE /businesses/attributes/sample-summary/<id>"""
+        sample_summary_id = str(uuid.uuid4())
+        self._execute(
+            f"""
+            INSERT INTO {self.schema}.business_attributes (business_id, sample_summary_id, attributes, created_on)
+            SELECT md5(:seed || ':business:' || i)::uuid, :sample_summary_id, '{{}}'::jsonb, timestamp '2019-01-01'
+            FROM generate_series(1, :count) i
+            """,
+            sample_summary_id=sample_summary_id,
+            count=max(100, self.settings["businesses"] // 20),
+        )
+        return lambda: business_controller.delete_attributes_by_sample_summary_id(sample_summary_id)
+
+    def _pending_surveys_from_originator(self, is_transfer):
+        """Shares (or transfers) every enrolment of one respondent with another, returning the batch number"""
+        originator = self.active_respondent_number()
+        recipient = self.active_respondent_number()
+        batch_no = str(uuid.uuid4())
+        self._execute(
+            f"""
+            INSERT INTO {self.schema}.pending_surveys
+                (email_address, business_id, survey_id, time_shared, shared_by, batch_no, is_transfer)
+            SELECT 'respondent' || :recipient || '@example.com', e.business_id, e.survey_id, now(), r.party_uuid,
+                   :batch_no, :is_transfer
+            FROM {self.schema}.enrolment e
+            JOIN {self.schema}.respondent r ON r.id = e.respondent_id
+            WHERE e.respondent_id = :originator
+            """,
+            recipient=recipient,
+            originator=originator,
+            batch_no=batch_no,
+            is_transfer=is_transfer,
+        )
+        return batch_no
+
+    def _execute(self, statement, **parameters):
+        parameters = dict(
+            seed=str(self.seed),
+            businesses=self.settings["businesses"],
+            respondents=self.settings["respondents"],
+            surveys=SURVEY_COUNT,
+            **parameters,
+        )
+        with self.app.db.begin() as connection:
+            connection.execute(text(statement), parameters)
+
+
+SCENARIOS = [
+    "search_by_ru_ref",
+    "search_by_name",
+    "enrolments_dashboard",
+    "get_business",
+    "get_business_party",
+    "get_respondent_party",
+    "get_businesses_by_ids",
+    "share_accept",
+    "transfer_accept",
+    "batch_cleanup_pending_surveys",
+    "batch_cleanup_attributes",
+]
+
+
+def run_scenario(app, scenario, warmup, repeat):
+    timings = []
+    for repetition in range(warmup + repeat):
+        call = scenario(repetition)
+        with app.app_context():
+            start = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - start
+        if repetition >= warmup:
+            timings.append(elapsed * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Prints the change in median of every scenario against baseline, returning the scenarios that regressed"""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        baseline_result = baseline.get("scenarios", {}).get(name)
+        if not baseline_result:
+            print(f"{name:32} {result['median_ms']:>10.3f}ms  (not in baseline)")
+            continue
+        change = (result["median_ms"] - baseline_result["median_ms"]) / baseline_result["median_ms"] * 100
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:32} {baseline_result['median_ms']:>10.3f}ms -> {result['median_ms']:>10.3f}ms "
+            f"({change:+.1f}%){'  REGRESSION' if regressed else ''}"
+        )
+    if baseline.get("dataset") != results["dataset"]:
+        print("Warning: the baseline was run against a different dataset", file=sys.stderr)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=parent_dir_path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_dataset_arguments(parser):
+    """Adds the options that choose, and if needed seed, the dataset. Shared with the load test."""
+    parser.add_argument("--database-uri", default=None, help="defaults to the DATABASE_URI of the app config")
+    parser.add_argument("--schema", default="partysvc_benchmark", help="schema to seed, kept apart from partysvc")
+    parser.add_argument("--recreate", action="store_true", help="drop and reseed the schema even if it matches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the business and respondent counts")
+    parser.add_argument("--businesses", type=int, default=1_000_000)
+    parser.add_argument("--attribute-versions", type=int, default=5, help="attribute versions per business")
+    parser.add_argument("--respondents", type=int, default=500_000)
+    parser.add_argument("--associations-per-respondent", type=int, default=2)
+    parser.add_argument("--enrolments-per-association", type=int, default=2)
+
+
+def open_dataset(args):
+    """Returns an app connected to the dataset chosen by args, seeding it first if needed, and its settings"""
+    if args.enrolments_per_association > SURVEY_COUNT:
+        sys.exit(f"--enrolments-per-association can't be more than the {SURVEY_COUNT} surveys")
+
+    app = create_app()
+    app.config["SEND_EMAIL_TO_GOV_NOTIFY"] = False
+    logger_initial_config(log_level="WARNING")
+    database_uri = args.database_uri or app.config["DATABASE_URI"]
+    app.config["DATABASE_URI"] = database_uri
+    app.config["DATABASE_SCHEMA"] = args.schema
+
+    if args.recreate:
+        engine = create_engine(database_uri)
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        engine.dispose()
+    app.db = create_database(database_uri, args.schema)
+
+    settings = dataset_settings(args)
+    seed_dataset(app, args.schema, settings)
+    return app, settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these, may be repeated")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", help="file to write the JSON results to, otherwise they are printed")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare the medians against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="percent slower that counts as a regression")
+    args = parser.parse_args()
+
+    app, settings = open_dataset(args)
+    surveys = {
+        party_uuid(args.seed, "survey", number): {
+            "short_name": f"SRV{number}",
+            "long_name": f"Benchmark Survey {number}",
+            "ref": f"{100 + number}",
+        }
+        for number in range(SURVEY_COUNT)
+    }
+    scenarios = Scenarios(app, args.schema, settings, random.Random(args.seed))
+    results = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "git_commit": git_commit(),
+        "version": app.config["VERSION"],
+        "python": platform.python_version(),
+        "dataset": settings,
+        "scenarios": {},
+    }
+    with app.db.connect() as connection:
+        results["postgres"] = connection.execute(text("SHOW server_version")).scalar()
+
+    for name in args.scenario or SCENARIOS:
+        # Stops the survey service being called, as it isn't part of what is being timed
+        app.cache.set(SURVEYS_CACHE_KEY, surveys, 24 * 60 * 60)
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = run_scenario(app, getattr(scenarios, name), args.warmup, args.repeat)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as io:
+            io.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as io:
+            regressions = compare(results, json.load(io), args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} scenario(s) regressed by more than {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+-- Columns for storing business attributes versions as deltas of a full snapshot (ATTRIBUTES_SNAPSHOT_INTERVAL), and
+-- the partial indexes for finding the deltas, which stay empty while every version is stored in full.
+-- Run the ALTER first, then each CREATE INDEX on its own, as CONCURRENTLY can't be run in a transaction. If an index
+-- fails it leaves an invalid index behind, drop it and run the statement again.
+ALTER TABLE partysvc.business_attributes
+    ADD COLUMN IF NOT EXISTS base_id integer REFERENCES partysvc.business_attributes (id),
+    ADD COLUMN IF NOT EXISTS removed_attributes text[];
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS attributes_delta_base_idx ON partysvc.business_attributes USING btree (base_id) WHERE base_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS attributes_delta_collection_exercise_idx ON partysvc.business_attributes USING btree (collection_exercise) WHERE base_id IS NOT NULL;
@@ -0,0 +1,4 @@
+-- Content hash of each version of a business's attributes, for recognising a sample reload or retry that would add a
+-- version identical to one the business already has. Versions from before the column are hashed when they're
+-- compared, and given their hash when scripts/compress_business_attributes.py rewrites them.
+ALTER TABLE partysvc.business_attributes ADD COLUMN IF NOT EXISTS attributes_hash text;
@@ -0,0 +1,10 @@
+-- GIN index for the attribute containment searches of search_business_attributes (POST /businesses/attributes/search),
+-- which otherwise read every business attributes record of the collection exercise.
+-- Only the records stored in full are matched through it, those stored as deltas (base_id set) hold just the changed
+-- attributes and are matched through attributes_delta_collection_exercise_idx, so they're left out of the index.
+-- Run business_attributes_deltas.sql first, which adds base_id.
+-- CONCURRENTLY doesn't block writes to business_attributes while the index builds, but can't be run in a transaction,
+-- so run each statement on its own. The drop replaces a full index made by an earlier version of this script.
+-- If the create fails it leaves an invalid index behind, drop it and run the statement again.
+DROP INDEX CONCURRENTLY IF EXISTS partysvc.attributes_attributes_path_ops_idx;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS attributes_attributes_path_ops_idx ON partysvc.business_attributes USING gin (attributes jsonb_path_ops) WHERE base_id IS NULL;
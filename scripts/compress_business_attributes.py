@@ -0,0 +1,103 @@
+"""
+Rewrites the stored versions of each business's attributes as a full snapshot every --snapshot-interval versions with
+deltas of the snapshot in between, as the service stores new versions when ATTRIBUTES_SNAPSHOT_INTERVAL is set, and
+reports the space saved. --snapshot-interval 0 rewrites them all in full again, for turning the setting back off.
+With --dry-run nothing is kept and the space that would be saved is reported.
+
+Run scripts/business_attributes_deltas.sql first. The businesses are rewritten --batch-size at a time, each batch in
+its own transaction. The sizes reported are of the stored attributes, the table itself only gets smaller on disk once
+it's rewritten by VACUUM FULL or pg_repack, though a plain VACUUM lets later inserts reuse the space freed.
+
+Examples:
+    python scripts/compress_business_attributes.py --snapshot-interval 10 --dry-run
+    python scripts/compress_business_attributes.py --snapshot-interval 10
+"""
+
+import os
+import sys
+
+parent_dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(parent_dir_path)
+
+import argparse
+import logging
+
+import structlog
+from sqlalchemy import func, select
+
+import config
+from logger_config import logger_initial_config
+from ras_party.models.models import Business, BusinessAttributes
+from run import create_database
+
+logger = structlog.wrap_logger(logging.getLogger(__name__))
+
+
+def attributes_size(party_uuids, session):
+    """The bytes taken by the stored attributes of the businesses, as postgres stores them, compressed or not"""
+    size = func.pg_column_size(BusinessAttributes.attributes) + func.coalesce(
+        func.pg_column_size(BusinessAttributes.removed_attributes), 0
+    )
+    return session.execute(
+        select(func.coalesce(func.sum(size), 0)).where(BusinessAttributes.business_id.in_(party_uuids))
+    ).scalar()
+
+
+def next_batch(after, batch_size, session):
+    """The ids of the next batch_size businesses, in id order from after"""
+    query = select(Business.party_uuid).order_by(Business.party_uuid).limit(batch_size)
+    if after is not None:
+        query = query.where(Business.party_uuid > after)
+    return session.execute(query).scalars().all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot-interval", type=int, required=True, help="versions per full snapshot, 0 for none")
+    parser.add_argument("--batch-size", type=int, default=1000, help="businesses rewritten in each transaction")
+    parser.add_argument("--dry-run", action="store_true", help="report the space that would be saved, changing nothing")
+    args = parser.parse_args()
+    if args.snapshot_interval < 0 or args.batch_size < 1:
+        sys.exit("--snapshot-interval can't be negative and --batch-size must be positive")
+
+    settings = getattr(config, os.getenv("APP_SETTINGS", "Config"))
+    logger_initial_config(log_level=settings.LOGGING_LEVEL)
+    engine = create_database(settings.DATABASE_URI, settings.DATABASE_SCHEMA, check_schema=False)
+    session = engine.session()
+
+    businesses = deltas = size_before = size_after = 0
+    party_uuids = next_batch(None, args.batch_size, session)
+    while party_uuids:
+        size_before += attributes_size(party_uuids, session)
+        for business in session.query(Business).filter(Business.party_uuid.in_(party_uuids)):
+            deltas += business.compress_attributes(args.snapshot_interval)
+        session.flush()
+        size_after += attributes_size(party_uuids, session)
+        businesses += len(party_uuids)
+
+        if args.dry_run:
+            session.rollback()
+        else:
+            session.commit()
+        # Nothing is expired on commit, so the batch's businesses would otherwise stay in the session
+        session.expunge_all()
+        logger.info("Rewrote batch of businesses", businesses=businesses, deltas=deltas)
+        party_uuids = next_batch(party_uuids[-1], args.batch_size, session)
+
+    engine.session.remove()
+    engine.dispose()
+    saved = size_before - size_after
+    logger.info(
+        "Would have rewritten business attributes" if args.dry_run else "Rewrote business attributes",
+        snapshot_interval=args.snapshot_interval,
+        businesses=businesses,
+        deltas=deltas,
+        bytes_before=size_before,
+        bytes_after=size_after,
+        bytes_saved=saved,
+        percent_saved=round(100 * saved / size_before, 1) if size_before else 0,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Creates the party schema and its tables if they don't exist yet. Run it once per deployment, as a job before the
+service rolls out, so that the service itself can start with DATABASE_SCHEMA_CHECK=false and its workers don't each
+query the database to check the schema.
+"""
+
+import os
+import sys
+
+parent_dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(parent_dir_path)
+
+import logging
+from time import perf_counter
+
+import structlog
+
+import config
+from logger_config import logger_initial_config
+from run import create_database
+
+logger = structlog.wrap_logger(logging.getLogger(__name__))
+
+
+def main():
+    settings = getattr(config, os.getenv("APP_SETTINGS", "Config"))
+    logger_initial_config(log_level=settings.LOGGING_LEVEL)
+
+    start = perf_counter()
+    engine = create_database(settings.DATABASE_URI, settings.DATABASE_SCHEMA)
+    engine.dispose()
+    logger.info(
+        "Database schema is in place",
+        schema=settings.DATABASE_SCHEMA,
+        duration_ms=round((perf_counter() - start) * 1000, 1),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+"""
+Load tests the party service over HTTP. The real app (app:app, built by create_app) is served by gunicorn with each
+worker class in turn, the services it calls are replaced by local stubs that answer after a configurable latency, and
+concurrent clients drive a weighted mix of endpoints against it. The throughput and the p50/p95/p99 latency of each
+endpoint under each worker class are written as JSON, so worker and pool settings can be tried before deploying them.
+
+Every worker class gets its own gunicorn process, as the gevent worker has to patch the standard library before the
+app is imported, and gunicorn reads gunicorn.conf.py as it does in the container. The case, IAC, collection exercise,
+survey and auth services are stubbed with HTTP servers, and Pub/Sub with a gRPC server the publisher is pointed at
+through PUBSUB_EMULATOR_HOST, all in this process.
+
+The dataset is the one scripts/benchmark_party.py seeds, chosen (and seeded if missing) with the same options, so the
+two share it. Respondents registered during a run are deleted at the end of it.
+
+Examples:
+    python scripts/load_test.py --scale 0.05 --concurrency 50 --duration 60 --output results.json
+    python scripts/load_test.py --scale 0.05 --worker-class gevent --workers 6 --service-latency auth=0.3
+"""
+
+import os
+import sys
+
+parent_dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(parent_dir_path)
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import platform
+import random
+import re
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import grpc
+import requests
+from benchmark_party import (
+    SURVEY_COUNT,
+    WORDS,
+    add_dataset_arguments,
+    git_commit,
+    open_dataset,
+    party_uuid,
+)
+from google.pubsub_v1.types import PublishRequest, PublishResponse
+from sqlalchemy import text
+
+from config import Config
+
+WORKER_CLASSES = ["sync", "gevent"]
+DOWNSTREAM_SERVICES = ["case", "iac", "collection_exercise", "survey", "auth", "pubsub"]
+REGISTERED_EMAIL_PREFIX = "loadtest-"
+
+
+class StubService(ThreadingHTTPServer):
+    """HTTP server that answers the requests the party service makes to one downstream service after latency seconds"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, name, routes, latency):
+        super().__init__(("127.0.0.1", 0), StubRequestHandler)
+        self.name = name
+        self.routes = routes
+        self.latency = latency
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_PUT(self):
+        self._respond("PUT")
+
+    def _respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.server.latency)
+
+        path = urlsplit(self.path).path
+        for route_method, pattern, handler in self.server.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                status, body = handler(*match.groups())
+                break
+        else:
+            status, body = 404, {"error": f"{method} {path} is not stubbed by the {self.server.name} stub"}
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PubSubStub:
+    """gRPC server implementing the Publish call of the Pub/Sub publisher API, acknowledging after latency seconds"""
+
+    def __init__(self, latency, max_workers):
+        self.latency = latency
+        self._message_ids = itertools.count(1)
+        self.server = grpc.server(ThreadPoolExecutor(max_workers=max_workers))
+        publisher = grpc.method_handlers_generic_handler(
+            "google.pubsub.v1.Publisher",
+            {
+                "Publish": grpc.unary_unary_rpc_method_handler(
+                    self.publish,
+                    request_deserializer=PublishRequest.deserialize,
+                    response_serializer=PublishResponse.serialize,
+                )
+            },
+        )
+        self.server.add_generic_rpc_handlers((publisher,))
+        self.port = self.server.add_insecure_port("127.0.0.1:0")
+
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.port}"
+
+    def publish(self, request, context):
+        time.sleep(self.latency)
+        return PublishResponse(message_ids=[str(next(self._message_ids)) for _ in request.messages])
+
+
+def stub_routes(settings):
+    """
+    The routes of each stubbed HTTP service. Enrolment codes are made up by the clients, and each one is mapped onto a
+    seeded business and survey, so registering with it creates a real association.
+    """
+    seed = settings["seed"]
+
+    def code_number(code, modulo):
+        return int(hashlib.md5(code.encode()).hexdigest(), 16) % modulo
+
+    def case_for_iac(code):
+        return 200, {
+            "id": str(uuid.uuid4()),
+            "partyId": party_uuid(seed, "business", 1 + code_number(code, settings["businesses"])),
+            "caseGroup": {"collectionExerciseId": party_uuid(seed, "collection_exercise", code)},
+        }
+
+    def collection_exercise(collection_exercise_id):
+        survey_number = code_number(collection_exercise_id, SURVEY_COUNT)
+        return 200, {"id": collection_exercise_id, "surveyId": party_uuid(seed, "survey", survey_number)}
+
+    surveys = [
+        {
+            "id": party_uuid(seed, "survey", number),
+            "shortName": f"SRV{number}",
+            "longName": f"Load Test Survey {number}",
+            "surveyRef": f"{100 + number}",
+        }
+        for number in range(SURVEY_COUNT)
+    ]
+    return {
+        "case": [
+            ("GET", r"/cases/iac/([^/]+)", case_for_iac),
+            ("POST", r"/cases/([^/]+)/events", lambda case_id: (201, {"caseId": case_id})),
+        ],
+        "iac": [
+            ("GET", r"/iacs/([^/]+)", lambda code: (200, {"iac": code, "active": True})),
+            ("PUT", r"/iacs/([^/]+)", lambda code: (200, {"iac": code, "active": False})),
+        ],
+        "collection_exercise": [("GET", r"/collectionexercises/([^/]+)", collection_exercise)],
+        "survey": [("GET", r"/surveys", lambda: (200, surveys))],
+        "auth": [
+            ("POST", r"/api/account/create", lambda: (201, {})),
+            ("PUT", r"/api/account/create", lambda: (201, {})),
+        ],
+    }
+
+
+@contextmanager
+def downstream_stubs(settings, latencies, max_workers):
+    """Starts the stubs of every downstream service, yielding the environment that points the app at them"""
+    routes = stub_routes(settings)
+    services = {name: StubService(name, routes[name], latencies[name]) for name in routes}
+    pubsub = PubSubStub(latencies["pubsub"], max_workers)
+    threads = [threading.Thread(target=service.serve_forever, daemon=True) for service in services.values()]
+    for thread in threads:
+        thread.start()
+    pubsub.server.start()
+    try:
+        yield {
+            "CASE_URL": services["case"].url,
+            "IAC_URL": services["iac"].url,
+            "COLLECTION_EXERCISE_URL": services["collection_exercise"].url,
+            "SURVEY_URL": services["survey"].url,
+            "AUTH_URL": services["auth"].url,
+            "PUBSUB_EMULATOR_HOST": pubsub.host,
+        }
+    finally:
+        pubsub.server.stop(grace=None)
+        for service in services.values():
+            service.shutdown()
+            service.server_close()
+
+
+class Endpoints:
+    """Each method returns the method, path and JSON body of a request to its endpoint for a randomly chosen party"""
+
+    def __init__(self, settings, rng):
+        self.settings = settings
+        self.seed = settings["seed"]
+        self.rng = rng
+
+    def get_business(self):
+        business_id = party_uuid(self.seed, "business", self.rng.randint(1, self.settings["businesses"]))
+        return "GET", f"/party-api/v1/businesses/id/{business_id}", None
+
+    def search_businesses(self):
+        return "GET", f"/party-api/v1/businesses/search?query={self.rng.choice(WORDS)}&limit=25", None
+
+    def get_respondent(self):
+        return "GET", f"/party-api/v1/respondents/id/{self._respondent_id()}", None
+
+    def respondent_enrolments(self):
+        return "GET", f"/party-api/v1/enrolments/respondent/{self._respondent_id()}", {}
+
+    def request_password_change(self):
+        email_address = f"respondent{self.rng.randint(1, self.settings['respondents'])}@example.com"
+        return "POST", "/party-api/v1/respondents/request_password_change", {"email_address": email_address}
+
+    def register_respondent(self):
+        registration = uuid.UUID(int=self.rng.getrandbits(128), version=4).hex
+        return (
+            "POST",
+            "/party-api/v1/respondents",
+            {
+                "emailAddress": f"{REGISTERED_EMAIL_PREFIX}{registration}@example.com",
+                "firstName": "Load",
+                "lastName": "Test",
+                "password": "Password1!",
+                "telephone": "07000000000",
+                "enrolmentCode": registration[:12],
+            },
+        )
+
+    def _respondent_id(self):
+        return party_uuid(self.seed, "respondent", self.rng.randint(1, self.settings["respondents"]))
+
+
+ENDPOINTS = [
+    "get_business",
+    "search_businesses",
+    "get_respondent",
+    "respondent_enrolments",
+    "request_password_change",
+    "register_respondent",
+]
+DEFAULT_MIX = {
+    "get_business": 30,
+    "search_businesses": 10,
+    "get_respondent": 20,
+    "respondent_enrolments": 25,
+    "request_password_change": 10,
+    "register_respondent": 5,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve_party(worker_class, args, environment, log):
+    """Serves the app with gunicorn and the given worker class, yielding its base url once it answers /info"""
+    port = free_port()
+    # Set through the environment rather than the command line, as gunicorn.conf.py needs the worker class to know
+    # whether to patch for gevent before preloading the app
+    environment = {
+        **environment,
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_WORKER_CLASS": worker_class,
+        "GUNICORN_WORKER_CONNECTIONS": str(args.worker_connections),
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_PRELOAD_APP": str(not args.no_preload),
+    }
+    command = [sys.executable, "-m", "gunicorn", "app:app"]
+
+    with tempfile.TemporaryDirectory(prefix="prometheus_multiproc") as metrics_dir:
+        process = subprocess.Popen(
+            command,
+            cwd=parent_dir_path,
+            env={**environment, "PROMETHEUS_MULTIPROC_DIR": metrics_dir},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_serving(f"{base_url}/info", process, args.startup_timeout)
+            yield base_url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def wait_until_serving(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode} before serving")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"gunicorn didn't serve {url} within {timeout}s")
+
+
+def drive(base_url, settings, mix, args):
+    """
+    Runs concurrency clients, each sending its next request as soon as the last is answered, for warmup then duration
+    seconds. Only requests sent during duration are counted.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    names, weights = zip(*mix.items())
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+
+    def client(number):
+        rng = random.Random(f"{settings['seed']}:{number}")
+        endpoints = Endpoints(settings, rng)
+        with requests.Session() as session:
+            session.auth = (Config.SECURITY_USER_NAME, Config.SECURITY_USER_PASSWORD)
+            while True:
+                name = rng.choices(names, weights)[0]
+                method, path, body = getattr(endpoints, name)()
+                sent = time.perf_counter()
+                if sent >= stop_at:
+                    return
+                try:
+                    response = session.request(method, base_url + path, json=body, timeout=args.request_timeout)
+                    failed = response.status_code >= 400
+                except requests.RequestException:
+                    failed = True
+                latency = time.perf_counter() - sent
+                if sent >= measure_from:
+                    with lock:
+                        latencies[name].append(latency)
+                        errors[name] += failed
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    endpoints = {name: summarise(latencies[name], errors[name], args.duration) for name in names}
+    all_latencies = [latency for name in names for latency in latencies[name]]
+    return {
+        "total": summarise(all_latencies, sum(errors.values()), args.duration),
+        "endpoints": endpoints,
+    }
+
+
+def summarise(latencies, errors, duration):
+    ordered = sorted(latencies)
+    summary = {"requests": len(ordered), "errors": errors, "throughput_rps": round(len(ordered) / duration, 2)}
+    if ordered:
+        summary.update(
+            mean_ms=round(sum(ordered) / len(ordered) * 1000, 2),
+            p50_ms=percentile(ordered, 50),
+            p95_ms=percentile(ordered, 95),
+            p99_ms=percentile(ordered, 99),
+            max_ms=round(ordered[-1] * 1000, 2),
+        )
+    return summary
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of the sorted latencies, in ms"""
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return round(ordered[rank - 1] * 1000, 2)
+
+
+def delete_registered_respondents(app, schema):
+    """Removes the respondents that register_respondent created, along with their associations and enrolments"""
+    registered = f"SELECT id FROM {schema}.respondent WHERE email_address LIKE '{REGISTERED_EMAIL_PREFIX}%'"
+    with app.db.begin() as connection:
+        for table in ["pending_enrolment", "enrolment", "business_respondent"]:
+            connection.execute(text(f"DELETE FROM {schema}.{table} WHERE respondent_id IN ({registered})"))
+        return connection.execute(text(f"DELETE FROM {schema}.respondent WHERE id IN ({registered})")).rowcount
+
+
+def print_report(worker_class, result):
+    print(f"\n{worker_class} workers", file=sys.stderr)
+    print(
+        f"  {'endpoint':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+        file=sys.stderr,
+    )
+    for name, summary in [*result["endpoints"].items(), ("total", result["total"])]:
+        print(
+            f"  {name:<26}{summary['requests']:>9}{summary['errors']:>8}{summary['throughput_rps']:>9}"
+            f"{summary.get('p50_ms', '-'):>10}{summary.get('p95_ms', '-'):>10}{summary.get('p99_ms', '-'):>10}",
+            file=sys.stderr,
+        )
+
+
+def parse_assignments(values, names, option, convert):
+    assignments = {}
+    for value in values:
+        name, _, setting = value.partition("=")
+        if name not in names or not setting:
+            sys.exit(f"{option} takes NAME=VALUE with NAME one of {', '.join(names)}, not {value}")
+        assignments[name] = convert(setting)
+    return assignments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--worker-class", action="append", choices=WORKER_CLASSES, help="defaults to both")
+    parser.add_argument("--workers", type=int, default=6, help="gunicorn workers, 6 as in the container")
+    parser.add_argument("--worker-connections", type=int, default=1000, help="connections per gevent worker")
+    parser.add_argument("--threads", type=int, default=1, help="threads per sync worker, over 1 makes them gthread")
+    parser.add_argument("--no-preload", action="store_true", help="have every worker build the app itself")
+    parser.add_argument("--concurrency", type=int, default=50, help="clients sending requests at once")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds of load before measuring")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load measured")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds every stubbed service takes to answer")
+    parser.add_argument(
+        "--service-latency",
+        action="append",
+        default=[],
+        metavar="SERVICE=SECONDS",
+        help=f"latency of one of {', '.join(DOWNSTREAM_SERVICES)}, may be repeated",
+    )
+    parser.add_argument(
+        "--mix",
+        action="append",
+        default=[],
+        metavar="ENDPOINT=WEIGHT",
+        help=f"relative weight of one of {', '.join(ENDPOINTS)}, 0 to leave it out, may be repeated",
+    )
+    parser.add_argument("--log-level", default="INFO", help="LOGGING_LEVEL of the app")
+    parser.add_argument("--output", help="file to write the JSON results to, otherwise they are printed")
+    args = parser.parse_args()
+
+    latencies = dict.fromkeys(DOWNSTREAM_SERVICES, args.latency)
+    latencies.update(parse_assignments(args.service_latency, DOWNSTREAM_SERVICES, "--service-latency", float))
+    mix = {**DEFAULT_MIX, **parse_assignments(args.mix, ENDPOINTS, "--mix", float)}
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        sys.exit("--mix leaves no endpoints to call")
+
+    app, settings = open_dataset(args)
+    removed = delete_registered_respondents(app, args.schema)
+    if removed:
+        print(f"Removed {removed} respondents left by an earlier run", file=sys.stderr)
+
+    results = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "git_commit": git_commit(),
+        "version": app.config["VERSION"],
+        "python": platform.python_version(),
+        "dataset": settings,
+        "load": {
+            "concurrency": args.concurrency,
+            "warmup_seconds": args.warmup,
+            "duration_seconds": args.duration,
+            "mix": mix,
+            "downstream_latency_seconds": latencies,
+        },
+        "runs": {},
+    }
+
+    log = tempfile.NamedTemporaryFile(prefix="load_test_server_", suffix=".log", delete=False)
+    print(f"Writing the party service logs to {log.name}", file=sys.stderr)
+    with log, downstream_stubs(settings, latencies, max_workers=args.concurrency) as downstream:
+        environment = {
+            **os.environ,
+            **downstream,
+            "APP_SETTINGS": "Config",
+            "DATABASE_URI": app.config["DATABASE_URI"],
+            "DATABASE_SCHEMA": args.schema,
+            "LOGGING_LEVEL": args.log_level,
+            "FRONTSTAGE_URL": "http://frontstage.invalid",
+            "SEND_EMAIL_TO_GOV_NOTIFY": "True",
+        }
+        for worker_class in args.worker_class or WORKER_CLASSES:
+            workers = {"workers": args.workers, "preload_app": not args.no_preload}
+            if worker_class == "gevent":
+                workers["worker_connections"] = args.worker_connections
+            else:
+                workers["threads"] = args.threads
+            print(f"Load testing {worker_class} workers {workers}...", file=sys.stderr)
+            with serve_party(worker_class, args, environment, log) as base_url:
+                result = drive(base_url, settings, mix, args)
+            results["runs"][worker_class] = {"gunicorn": workers, **result}
+            print_report(worker_class, result)
+            delete_registered_respondents(app, args.schema)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as io:
+            io.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
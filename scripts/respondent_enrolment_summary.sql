@@ -0,0 +1,135 @@
+CREATE TABLE IF NOT EXISTS partysvc.respondent_enrolment_summary (
+    respondent_id integer NOT NULL,
+    business_id uuid NOT NULL,
+    survey_id text NOT NULL,
+    status enrolmentstatus,
+    business_ref text,
+    business_name text,
+    trading_as text,
+    PRIMARY KEY (respondent_id, business_id, survey_id)
+);
+
+CREATE INDEX IF NOT EXISTS enrolment_summary_business_idx ON partysvc.respondent_enrolment_summary USING btree (business_id) TABLESPACE pg_default;
+CREATE OR REPLACE FUNCTION partysvc.refresh_enrolment_summary_businesses(summary_business_ids uuid[]) RETURNS void AS $$
+BEGIN
+    UPDATE partysvc.respondent_enrolment_summary summary
+    SET business_ref = b.business_ref,
+        business_name = ba.attributes ->> 'name',
+        trading_as = ba.attributes ->> 'trading_as'
+    FROM partysvc.business b
+    LEFT JOIN LATERAL (
+        SELECT attributes FROM partysvc.business_attributes
+        WHERE business_attributes.business_id = b.party_uuid
+        ORDER BY business_attributes.created_on DESC LIMIT 1
+    ) ba ON true
+    WHERE summary.business_id = ANY(summary_business_ids) AND b.party_uuid = summary.business_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION partysvc.refresh_enrolment_summary_business(summary_business_id uuid) RETURNS void AS $$
+BEGIN
+    PERFORM partysvc.refresh_enrolment_summary_businesses(ARRAY[summary_business_id]);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION partysvc.maintain_enrolment_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.respondent_id = OLD.respondent_id AND NEW.business_id = OLD.business_id
+            AND NEW.survey_id = OLD.survey_id THEN
+        UPDATE partysvc.respondent_enrolment_summary SET status = NEW.status
+        WHERE respondent_id = NEW.respondent_id AND business_id = NEW.business_id AND survey_id = NEW.survey_id;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM partysvc.respondent_enrolment_summary
+        WHERE respondent_id = OLD.respondent_id AND business_id = OLD.business_id AND survey_id = OLD.survey_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO partysvc.respondent_enrolment_summary
+            (respondent_id, business_id, survey_id, status, business_ref, business_name, trading_as)
+        SELECT NEW.respondent_id, NEW.business_id, NEW.survey_id, NEW.status, b.business_ref,
+            ba.attributes ->> 'name', ba.attributes ->> 'trading_as'
+        FROM partysvc.business b
+        LEFT JOIN LATERAL (
+            SELECT attributes FROM partysvc.business_attributes
+            WHERE business_attributes.business_id = b.party_uuid
+            ORDER BY business_attributes.created_on DESC LIMIT 1
+        ) ba ON true
+        WHERE b.party_uuid = NEW.business_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION partysvc.maintain_enrolment_summary_business() RETURNS trigger AS $$
+BEGIN
+    PERFORM partysvc.refresh_enrolment_summary_business(NEW.party_uuid);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Run once per statement with the rows it changed, so that a sample load or a batched delete of attributes is a
+-- single update of the summary, which only has rows for the businesses with enrolments
+CREATE OR REPLACE FUNCTION partysvc.maintain_enrolment_summary_attributes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM partysvc.refresh_enrolment_summary_businesses(ARRAY(SELECT DISTINCT business_id FROM new_attributes));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM partysvc.refresh_enrolment_summary_businesses(ARRAY(SELECT DISTINCT business_id FROM old_attributes));
+    ELSE
+        PERFORM partysvc.refresh_enrolment_summary_businesses(ARRAY(
+            SELECT DISTINCT changed.business_id
+            FROM old_attributes
+            INNER JOIN new_attributes ON new_attributes.id = old_attributes.id
+            CROSS JOIN LATERAL (VALUES (old_attributes.business_id), (new_attributes.business_id)) changed(business_id)
+            WHERE (new_attributes.business_id, new_attributes.attributes, new_attributes.created_on)
+                IS DISTINCT FROM (old_attributes.business_id, old_attributes.attributes, old_attributes.created_on)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS enrolment_summary_trigger ON partysvc.enrolment;
+CREATE TRIGGER enrolment_summary_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON partysvc.enrolment
+    FOR EACH ROW EXECUTE FUNCTION partysvc.maintain_enrolment_summary();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_trigger ON partysvc.business_attributes;
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_insert_trigger ON partysvc.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_insert_trigger
+    AFTER INSERT ON partysvc.business_attributes
+    REFERENCING NEW TABLE AS new_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION partysvc.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_update_trigger ON partysvc.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_update_trigger
+    AFTER UPDATE ON partysvc.business_attributes
+    REFERENCING OLD TABLE AS old_attributes NEW TABLE AS new_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION partysvc.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_attributes_delete_trigger ON partysvc.business_attributes;
+CREATE TRIGGER enrolment_summary_attributes_delete_trigger
+    AFTER DELETE ON partysvc.business_attributes
+    REFERENCING OLD TABLE AS old_attributes
+    FOR EACH STATEMENT EXECUTE FUNCTION partysvc.maintain_enrolment_summary_attributes();
+
+DROP TRIGGER IF EXISTS enrolment_summary_business_trigger ON partysvc.business;
+CREATE TRIGGER enrolment_summary_business_trigger
+    AFTER UPDATE OF business_ref ON partysvc.business
+    FOR EACH ROW WHEN (NEW.business_ref IS DISTINCT FROM OLD.business_ref)
+    EXECUTE FUNCTION partysvc.maintain_enrolment_summary_business();
+
+-- Populate the summary from the existing enrolments.  This is the same as POST /party-api/v1/enrolments/summary/rebuild
+TRUNCATE partysvc.respondent_enrolment_summary;
+INSERT INTO partysvc.respondent_enrolment_summary
+    (respondent_id, business_id, survey_id, status, business_ref, business_name, trading_as)
+SELECT e.respondent_id, e.business_id, e.survey_id, e.status, b.business_ref,
+    ba.attributes ->> 'name', ba.attributes ->> 'trading_as'
+FROM partysvc.enrolment e
+INNER JOIN partysvc.business b ON b.party_uuid = e.business_id
+LEFT JOIN LATERAL (
+    SELECT attributes FROM partysvc.business_attributes
+    WHERE business_attributes.business_id = b.party_uuid
+    ORDER BY business_attributes.created_on DESC LIMIT 1
+) ba ON true;
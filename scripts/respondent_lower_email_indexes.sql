@@ -0,0 +1,7 @@
+-- Indexes for the case-insensitive email lookups of query_respondent_by_email, query_single_respondent_by_email and
+-- query_respondent_by_pending_email, which otherwise scan the whole respondent table.
+-- CONCURRENTLY doesn't block writes to respondent while the indexes build, but can't be run in a transaction, so run
+-- each statement on its own. If one fails it leaves an invalid index behind, drop it and run the statement again.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS respondent_email_lower_idx ON partysvc.respondent USING btree (lower(email_address));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS respondent_pending_email_lower_idx ON partysvc.respondent USING btree (lower(pending_email_address));
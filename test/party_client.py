@@ -10,7 +10,13 @@ from flask_testing import TestCase
 from sqlalchemy import text
 
 from logger_config import logger_initial_config
-from ras_party.models.models import Business, BusinessRespondent, Enrolment, Respondent
+from ras_party.models.models import (
+    Business,
+    BusinessAttributes,
+    BusinessRespondent,
+    Enrolment,
+    Respondent,
+)
 from ras_party.support.session_decorator import with_db_session
 from run import create_app, create_database
 
@@ -20,6 +26,11 @@ def businesses(session):
     return session.query(Business).all()
 
 
+@with_db_session
+def business_attributes(session):
+    return session.query(BusinessAttributes).order_by(BusinessAttributes.id).all()
+
+
 @with_db_session
 def respondents(session):
     return session.query(Respondent).all()
@@ -100,6 +111,15 @@ class PartyTestClient(TestCase):
         self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
         return json.loads(response.get_data(as_text=True))
 
+    def delete_business_attributes_by_sample_summary_id(self, sample_id, expected_status=204, query_string=None):
+        response = self.client.delete(
+            f"/party-api/v1/businesses/attributes/sample-summary/{sample_id}",
+            query_string=query_string,
+            headers=self.auth_headers,
+        )
+        self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
+        return response
+
     def post_to_respondents(self, payload, expected_status):
         response = self.client.post(
             "/party-api/v1/respondents",
@@ -298,6 +318,16 @@ class PartyTestClient(TestCase):
         self.assertStatus(response, expected_status)
         return json.loads(response.get_data(as_text=True))
 
+    def put_enrolment_statuses(self, changes, expected_status=200):
+        response = self.client.put(
+            "/party-api/v1/respondents/change_enrolment_statuses",
+            headers=self.auth_headers,
+            data=json.dumps({"changes": changes}),
+            content_type="application/vnd.ons.business+json",
+        )
+        self.assertStatus(response, expected_status)
+        return json.loads(response.get_data(as_text=True))
+
     def patch_disable_all_respondent_enrolments(self, email_address, expected_status=200):
         response = self.client.patch(
             "/party-api/v1/respondents/disable-user-enrolments",
@@ -328,13 +358,40 @@ class PartyTestClient(TestCase):
         self.assertStatus(response, expected_status)
         return response.get_data(as_text=True)
 
+    def get_business_attributes(self, business_id, expected_status=200, **params):
+        response = self.client.get(
+            f"/party-api/v1/businesses/id/{business_id}/attributes?{urlencode(params, doseq=True)}",
+            headers=self.auth_headers,
+        )
+        self.assertStatus(response, expected_status)
+        return json.loads(response.get_data(as_text=True))
+
+    def post_businesses_attributes(self, payload, expected_status=200):
+        response = self.client.post(
+            "/party-api/v1/businesses/attributes",
+            headers=self.auth_headers,
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+        self.assertStatus(response, expected_status)
+        return json.loads(response.get_data(as_text=True))
+
+    def search_businesses_by_attributes(self, payload, expected_status=200):
+        response = self.client.post(
+            "/party-api/v1/businesses/attributes/search",
+            headers=self.auth_headers,
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+        self.assertStatus(response, expected_status)
+        return json.loads(response.get_data(as_text=True))
+
     def get_party_by_id_filtered_by_survey_and_enrolment(
         self, party_type, id, survey_id, enrolment_statuses, expected_status=200
     ):
+        query = urlencode({"survey_id": survey_id, "enrolment_status": enrolment_statuses}, doseq=True)
         response = self.client.get(
-            f"/party-api/v1/parties/type/{party_type}/id/{id}?"
-            f"survey_id={survey_id}&enrolment_status={enrolment_statuses}",
-            headers=self.auth_headers,
+            f"/party-api/v1/parties/type/{party_type}/id/{id}?{query}", headers=self.auth_headers
         )
         self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
         return json.loads(response.get_data(as_text=True))
@@ -389,6 +446,11 @@ class PartyTestClient(TestCase):
         self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
         return json.loads(response.get_data(as_text=True))
 
+    def post_pending_survey_users(self, payload, expected_status=200):
+        response = self.client.post("/party-api/v1/pending-survey-users-count", json=payload, headers=self.auth_headers)
+        self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
+        return json.loads(response.get_data(as_text=True))
+
     def post_pending_surveys(self, payload, expected_status=201):
         response = self.client.post("/party-api/v1/pending-surveys", json=payload, headers=self.auth_headers)
         self.assertStatus(response, expected_status, "Response body is : " + response.get_data(as_text=True))
@@ -0,0 +1,162 @@
+import socketserver
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from ras_party.support.cache import MemoryCache, RedisCache, create_cache
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Handles the subset of the Redis protocol used by RedisCache"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            self.wfile.write(self.server.execute(*args))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+
+    def execute(self, command, *args):
+        command = command.upper()
+        if command == "GET":
+            value = self.data.get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value.encode())
+        if command == "SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if command == "DEL":
+            deleted = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % deleted
+        if command == "SCAN":
+            prefix = args[2].rstrip("*")
+            keys = [key.encode() for key in self.data if key.startswith(prefix)]
+            reply = b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys)
+            return reply + b"".join(b"$%d\r\n%s\r\n" % (len(key), key) for key in keys)
+        return b"-ERR unknown command\r\n"
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_get_returns_value_until_expired(self):
+        cache = MemoryCache()
+        with patch("ras_party.support.cache.time.monotonic", return_value=100):
+            cache.set("key", {"a": 1}, 10)
+            self.assertEqual(cache.get("key"), {"a": 1})
+        with patch("ras_party.support.cache.time.monotonic", return_value=110):
+            self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = MemoryCache(max_size=2)
+        cache.set("a", 1, 10)
+        cache.set("b", 2, 10)
+        cache.get("a")
+        cache.set("c", 3, 10)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_zero_ttl_is_not_cached(self):
+        cache = MemoryCache()
+        cache.set("key", True, 0)
+        self.assertIsNone(cache.get("key"))
+
+    def test_get_or_set(self):
+        cache = MemoryCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return False
+
+        self.assertFalse(cache.get_or_set("key", loader, 10))
+        self.assertFalse(cache.get_or_set("key", loader, 10))
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_set_does_not_cache_none(self):
+        cache = MemoryCache()
+        cache.get_or_set("key", lambda: None, 10)
+        self.assertEqual(len(cache), 0)
+
+
+class TestRedisCache(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.cache = RedisCache(f"redis://{host}:{port}/0")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_values_are_shared_through_the_server(self):
+        self.cache.set("business:1", {"name": "Business 1", "enrolled": True}, 30)
+
+        host, port = self.server.server_address
+        other_worker = RedisCache(f"redis://{host}:{port}/0")
+        self.assertEqual(other_worker.get("business:1"), {"name": "Business 1", "enrolled": True})
+        self.assertIn("ras-party:business:1", self.server.data)
+        self.assertEqual(len(self.cache.fallback), 0)
+
+    def test_delete_invalidates_every_worker(self):
+        host, port = self.server.server_address
+        other_worker = RedisCache(f"redis://{host}:{port}/0")
+        self.cache.set("respondent:1", {"firstName": "first"}, 30)
+        self.assertIsNotNone(other_worker.get("respondent:1"))
+
+        self.cache.delete("respondent:1")
+
+        self.assertIsNone(other_worker.get("respondent:1"))
+
+    def test_clear_only_removes_prefixed_keys(self):
+        self.server.data["other-service:key"] = "1"
+        self.cache.set("a", 1, 30)
+        self.cache.set("b", 2, 30)
+
+        self.cache.clear()
+
+        self.assertEqual(self.server.data, {"other-service:key": "1"})
+
+    def test_falls_back_to_local_cache_when_server_unavailable(self):
+        cache = RedisCache("redis://127.0.0.1:1/0")
+        cache.set("key", "value", 30)
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(len(cache.fallback), 1)
+
+        cache.delete("key")
+        self.assertIsNone(cache.get("key"))
+
+    def test_server_is_retried_after_retry_interval(self):
+        self.cache.retry_interval = 0.01
+        self.server.data["ras-party:key"] = '"shared"'
+        self.cache._unavailable_until = time.monotonic() + 0.01
+        self.assertIsNone(self.cache.get("key"))
+
+        time.sleep(0.02)
+
+        self.assertEqual(self.cache.get("key"), "shared")
+
+
+class TestCreateCache(unittest.TestCase):
+    def test_memory_cache_by_default(self):
+        cache = create_cache({"CACHE_MAX_SIZE": 10, "CACHE_REDIS_URL": None})
+        self.assertIsInstance(cache, MemoryCache)
+
+    def test_redis_cache_when_url_set(self):
+        cache = create_cache({"CACHE_MAX_SIZE": 10, "CACHE_REDIS_URL": "redis://cache:6380/1"})
+        self.assertIsInstance(cache, RedisCache)
+        self.assertEqual((cache.host, cache.port, cache.db), ("cache", 6380, 1))
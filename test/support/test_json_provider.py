@@ -0,0 +1,70 @@
+import json
+import unittest
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from unittest.mock import patch
+
+from flask import current_app, jsonify
+from flask_testing import TestCase
+
+from ras_party.models.models import EnrolmentStatus
+from ras_party.support import json_provider
+from run import create_app
+
+
+class Colour(Enum):
+    RED = "red"
+
+
+PARTY = {
+    "id": uuid.UUID("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85"),
+    "created_on": datetime(2024, 1, 2, 3, 4, 5),
+    "status": EnrolmentStatus.ENABLED,
+    "colour": Colour.RED,
+    "turnover": Decimal("1.50"),
+    "name": "Bügel Ltd",
+    "associations": [{"partyId": uuid.UUID("5718649e-30bf-4c25-a2c0-aaa733e54ed6"), "enrolments": []}],
+}
+
+EXPECTED = {
+    "id": "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+    "created_on": "Tue, 02 Jan 2024 03:04:05 GMT",
+    "status": 1,
+    "colour": "red",
+    "turnover": "1.50",
+    "name": "Bügel Ltd",
+    "associations": [{"partyId": "5718649e-30bf-4c25-a2c0-aaa733e54ed6", "enrolments": []}],
+}
+
+
+class TestPartyJSONProvider(TestCase):
+    @staticmethod
+    def create_app():
+        return create_app("TestingConfig")
+
+    def test_app_uses_party_json_provider(self):
+        self.assertIsInstance(current_app.json, json_provider.PartyJSONProvider)
+
+    @unittest.skipIf(json_provider.orjson is None, "orjson is not installed")
+    def test_orjson_response(self):
+        response = jsonify(PARTY)
+
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertTrue(response.get_data().endswith(b"\n"))
+        self.assertEqual(json.loads(response.get_data()), EXPECTED)
+
+    def test_stdlib_fallback_response(self):
+        with patch("ras_party.support.json_provider.orjson", None):
+            response = jsonify(PARTY)
+
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(json.loads(response.get_data()), EXPECTED)
+
+    def test_both_paths_produce_the_same_document(self):
+        with patch("ras_party.support.json_provider.orjson", None):
+            stdlib = current_app.json.dumps(PARTY)
+
+        self.assertEqual(json.loads(current_app.json.dumps(PARTY)), json.loads(stdlib))
+        self.assertEqual(current_app.json.loads(current_app.json.dumps(PARTY)), EXPECTED)
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+
+from ras_party.support.cache import MemoryCache
+from ras_party.support.metrics import downstream_request_timer
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(TestCase):
+    def test_downstream_request_timer_observes_even_if_the_request_fails(self):
+        before = sample_value("ras_party_downstream_request_duration_seconds_count", service="iac")
+
+        with self.assertRaises(ConnectionError):
+            with downstream_request_timer("iac"):
+                raise ConnectionError
+
+        self.assertEqual(sample_value("ras_party_downstream_request_duration_seconds_count", service="iac"), before + 1)
+
+    def test_cache_lookups_are_counted_by_cache_and_result(self):
+        cache = MemoryCache()
+        hits = sample_value("ras_party_cache_lookups_total", cache="respondent", result="hit")
+        misses = sample_value("ras_party_cache_lookups_total", cache="respondent", result="miss")
+        loader = MagicMock(return_value={"id": "1"})
+
+        cache.get_or_set("respondent:1", loader, 30)
+        cache.get_or_set("respondent:1", loader, 30)
+        cache.get_or_set("respondent:1", loader, 30)
+
+        loader.assert_called_once()
+        self.assertEqual(sample_value("ras_party_cache_lookups_total", cache="respondent", result="hit"), hits + 2)
+        self.assertEqual(sample_value("ras_party_cache_lookups_total", cache="respondent", result="miss"), misses + 1)
@@ -0,0 +1,35 @@
+from functools import partial
+from threading import Barrier
+from unittest import TestCase
+
+from flask import Flask, current_app
+
+from ras_party.support.parallel import call_in_parallel
+
+
+class TestParallel(TestCase):
+    def test_call_in_parallel_returns_results_in_order(self):
+        # Each call waits for the others, so this only completes if they run at the same time
+        barrier = Barrier(3, timeout=5)
+
+        def call(value):
+            barrier.wait()
+            return value
+
+        self.assertEqual(call_in_parallel(partial(call, value) for value in [1, 2, 3]), [1, 2, 3])
+
+    def test_call_in_parallel_runs_calls_in_the_app_context(self):
+        app = Flask("test")
+        with app.app_context():
+            names = call_in_parallel([lambda: current_app.name, lambda: current_app.name])
+        self.assertEqual(names, ["test", "test"])
+
+    def test_call_in_parallel_raises_the_first_failure(self):
+        def fail():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            call_in_parallel([lambda: 1, fail])
+
+    def test_call_in_parallel_with_no_calls(self):
+        self.assertEqual(call_in_parallel([]), [])
@@ -0,0 +1,71 @@
+import re
+from test.party_client import PartyTestClient
+from test.test_data.mock_business import MockBusiness
+from unittest import TestCase
+from unittest.mock import patch
+
+from config import TestingConfig
+from ras_party.support.sql_instrumentation import SQLStatistics
+
+
+class TestSQLStatistics(TestCase):
+    def test_records_count_time_and_slowest_statement(self):
+        statistics = SQLStatistics()
+        statistics.record_statement("SELECT 1", 0.002)
+        statistics.record_statement("SELECT\n    slow", 0.005)
+        statistics.record_statement("SELECT 3", 0.001)
+        statistics.record_connection_wait(0.0005)
+
+        self.assertEqual(
+            statistics.server_timing(),
+            'db;dur=8.0;desc="3 statements", db-slowest;dur=5.0, db-wait;dur=0.5',
+        )
+        self.assertEqual(
+            statistics.log_fields(),
+            {
+                "sql_statement_count": 3,
+                "sql_time_ms": 8.0,
+                "sql_slowest_ms": 5.0,
+                "sql_slowest_statement": "SELECT slow",
+                "sql_connection_wait_ms": 0.5,
+            },
+        )
+
+
+class TestSampledRequests(PartyTestClient):
+    @staticmethod
+    def create_app():
+        with patch.object(TestingConfig, "SQL_INSTRUMENTATION_SAMPLE_RATE", 1):
+            return PartyTestClient.create_app()
+
+    def test_sampled_request_reports_its_sql_statistics(self):
+        mock_business = MockBusiness().as_business()
+        party_id = self.post_to_businesses(mock_business, 200)["id"]
+        self.put_to_businesses_sample_link(mock_business["sampleSummaryId"], {"collectionExerciseId": "test_id"}, 200)
+
+        with patch("ras_party.support.sql_instrumentation.logger") as logger:
+            response = self.client.get(f"/party-api/v1/businesses/id/{party_id}", headers=self.auth_headers)
+
+        self.assertStatus(response, 200)
+        server_timing = response.headers["Server-Timing"]
+        statement_count = int(re.search(r'db;dur=[\d.]+;desc="(\d+) statements"', server_timing).group(1))
+        self.assertGreater(statement_count, 0)
+        self.assertIn("db-slowest;dur=", server_timing)
+        self.assertIn("db-wait;dur=", server_timing)
+
+        logger.info.assert_called_once()
+        fields = logger.info.call_args.kwargs
+        self.assertEqual(fields["endpoint"], "business_view.get_business_by_id")
+        self.assertEqual(fields["status"], 200)
+        self.assertEqual(fields["sql_statement_count"], statement_count)
+        self.assertTrue(fields["sql_slowest_statement"].startswith("SELECT"))
+
+
+class TestUnsampledRequests(PartyTestClient):
+    def test_requests_are_not_instrumented_by_default(self):
+        mock_business = MockBusiness().as_business()
+        party_id = self.post_to_businesses(mock_business, 200)["id"]
+
+        response = self.client.get(f"/party-api/v1/businesses/id/{party_id}", headers=self.auth_headers)
+
+        self.assertNotIn("Server-Timing", response.headers)
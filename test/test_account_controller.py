@@ -3,6 +3,7 @@ import datetime
 import json
 import os
 import uuid
+from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import MagicMock
 
@@ -197,80 +198,74 @@ class TestAccountController(TestCase):
     def test_add_verification_token(self):
         with self.app.app_context():
             session = MagicMock()
-            email = "ons@fake.ons"
             respondent_id = self.valid_business_party_id
-            token = generate_email_token(email)
-            session.query(Respondent).filter(Respondent.party_uuid == respondent_id).first().return_value = [
-                self.get_respondent_object()
-            ]
-            session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-                {Respondent.password_verification_token: token}
-            )
-            payload = {
-                "token": token,
-            }
-            account_controller.add_respondent_password_token.__wrapped__(respondent_id, payload["token"], session)
+            token = generate_email_token("ons@fake.ons")
+            session.execute().scalar_one_or_none.return_value = 1
+            account_controller.add_respondent_password_token.__wrapped__(respondent_id, token, session)
             # Nothing to assert it's just a database modification
 
+    def test_add_verification_token_fail(self):
+        session = MagicMock()
+        session.execute().scalar_one_or_none.return_value = None
+        with self.assertRaises(NotFound):
+            account_controller.add_respondent_password_token.__wrapped__(self.invalid_respondent_id, "token", session)
+
     def test_delete_verification_token(self):
         with self.app.app_context():
             session = MagicMock()
             respondent_id = self.valid_business_party_id
             token = "Im9uc190b2tlbl9lbWFpbEBmYWtlLm9ucyI.YjBxJA.50gUQJB9kajNqk2hkIK_B6EwMKw"
-            session.query(Respondent).filter(Respondent.party_uuid == respondent_id).first().return_value = [
-                self.get_respondent_object()
-            ]
-            session.query(Respondent).filter(Respondent.party_uuid == respondent_id).update(
-                {Respondent.password_verification_token: None}
-            )
+            session.execute().scalar_one_or_none.return_value = 1
             account_controller.delete_respondent_password_token.__wrapped__(respondent_id, token, session)
             # Nothing to assert it's just a database modification
 
-    def test_get_password_reset_counter_success(self):
+    def test_delete_verification_token_not_found(self):
         session = MagicMock()
         respondent_id = self.valid_business_party_id
+        session.execute().scalar_one_or_none.return_value = None
         session.query().filter().first.return_value = self.get_respondent_object()
+        with self.assertRaisesRegex(NotFound, "Verification token not found"):
+            account_controller.delete_respondent_password_token.__wrapped__(respondent_id, "token", session)
+
+    def test_get_password_reset_counter_success(self):
+        session = MagicMock()
+        respondent_id = self.valid_business_party_id
+        session.query().filter().one_or_none.return_value = SimpleNamespace(password_reset_counter=0)
         counter = account_controller.get_password_counter.__wrapped__(respondent_id, session)
         self.assertEqual(0, counter)
 
     def test_get_password_reset_counter_fail(self):
         session = MagicMock()
         party_uuid = self.invalid_respondent_id
-        session.query().filter().first.side_effect = NotFound
+        session.query().filter().one_or_none.return_value = None
         with self.assertRaises(NotFound):
             account_controller.get_password_counter.__wrapped__(party_uuid, session)
 
     def test_increase_password_reset_counter_success(self):
         session = MagicMock()
         respondent_id = self.valid_business_party_id
-        session.query().filter().first.return_value = self.get_respondent_object()
-        session.query().filter().update(
-            {
-                self.get_respondent_object().password_reset_counter: self.get_respondent_object().password_reset_counter
-                + 1
-            }
-        )
+        session.execute().scalar_one_or_none.return_value = 1
         with self.app.app_context():
-            account_controller.increase_password_counter.__wrapped__(respondent_id, session)
+            counter = account_controller.increase_password_counter.__wrapped__(respondent_id, session)
+        self.assertEqual(1, counter)
 
     def test_increase_password_reset_counter_fail(self):
         session = MagicMock()
         party_uuid = self.invalid_respondent_id
-        session.query().filter().first.side_effect = NotFound
+        session.execute().scalar_one_or_none.return_value = None
         with self.assertRaises(NotFound):
             account_controller.increase_password_counter.__wrapped__(party_uuid, session)
 
     def test_reset_password_reset_counter_success(self):
         session = MagicMock()
         respondent_id = self.valid_business_party_id
-        session.query().filter().first.return_value = self.get_respondent_object()
-        session.query().filter().update({self.get_respondent_object().password_reset_counter: 0})
+        session.execute().scalar_one_or_none.return_value = 1
         account_controller.reset_password_counter.__wrapped__(respondent_id, session)
 
     def test_reset_password_reset_counter_fail(self):
         session = MagicMock()
         party_uuid = self.invalid_respondent_id
-        session.query().filter().first.side_effect = NotFound
+        session.execute().scalar_one_or_none.return_value = None
         with self.assertRaises(NotFound):
             account_controller.reset_password_counter.__wrapped__(party_uuid, session)
 
@@ -3,6 +3,7 @@ import uuid
 from unittest import TestCase
 from unittest.mock import MagicMock
 
+from sqlalchemy import and_
 from werkzeug.exceptions import BadRequest
 
 from ras_party.controllers import business_controller
@@ -74,7 +75,7 @@ class TestBusinessController(TestCase):
             }
         }
         session = MagicMock()
-        session.query().filter().all.return_value = [self.get_business_attribute_object()]
+        session.query().outerjoin().filter().all.return_value = [self.get_business_attribute_object()]
         value = business_controller.get_business_attributes.__wrapped__(self.valid_business_id, session)
         self.assertEqual(expected_output, value)
 
@@ -106,33 +107,39 @@ class TestBusinessController(TestCase):
             self.get_business_attribute_object(),
             self.get_business_attribute_object(collection_exercise_id=self.another_valid_collection_exercise_id),
         ]
-        session.query().filter().all.return_value = return_value
+        session.query().outerjoin().filter().all.return_value = return_value
         value = business_controller.get_business_attributes.__wrapped__(
             self.valid_business_id, session, collection_exercise_ids=self.valid_collection_exercises
         )
         self.assertEqual(expected_output, value)
 
     def test_query_business_attributes_one_missing_collection_exercise_id(self):
-        """Any attributes with a mission collection exercise id won't be inlcuded in the result"""
-        expected_output = {
-            self.valid_collection_exercise_id: {
-                "attributes": {},
-                "business_id": self.valid_business_id,
-                "collection_exercise": self.valid_collection_exercise_id,
-                "created_on": "2021-01-30 00:00:00",
-                "id": "id",
-                "name": "name",
-                "sample_summary_id": "sample_summary_id",
-                "trading_as": "trading_as",
-            }
-        }
+        """Any attributes with a missing collection exercise id are left out by the query"""
         session = MagicMock()
-        session.query().filter().all.return_value = [
-            self.get_business_attribute_object(),
-            self.get_business_attribute_object(collection_exercise_id=None),
-        ]
+        session.query().outerjoin().filter().all.return_value = [self.get_business_attribute_object()]
         value = business_controller.get_business_attributes.__wrapped__(self.valid_business_id, session)
-        self.assertEqual(expected_output, value)
+        self.assertEqual([self.valid_collection_exercise_id], list(value))
+        conditions = session.query.return_value.outerjoin.return_value.filter.call_args.args
+        self.assertIn("business_attributes.collection_exercise IS NOT NULL", str(and_(*conditions)))
+
+    def test_get_businesses_attributes(self):
+        another_business_id = "5e0c1bd8-e4a0-4ddd-a5e4-b0f56b5c6bca"
+        session = MagicMock()
+        session.query().outerjoin().filter().all.return_value = [self.get_business_attribute_object()]
+        value = business_controller.get_businesses_attributes.__wrapped__(
+            [self.valid_business_id.upper(), another_business_id], session
+        )
+        # Keyed by the ids in their canonical form, with an empty dict for a business without attributes
+        self.assertEqual([self.valid_business_id, another_business_id], list(value))
+        self.assertEqual([self.valid_collection_exercise_id], list(value[self.valid_business_id]))
+        self.assertEqual({}, value[another_business_id])
+
+    def test_get_businesses_attributes_too_many_attribute_keys(self):
+        session = MagicMock()
+        with self.assertRaises(BadRequest):
+            business_controller.get_businesses_attributes.__wrapped__(
+                [self.valid_business_id], session, attribute_keys=[f"key{i}" for i in range(51)]
+            )
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
+import importlib
+import os
 from unittest import TestCase
+from unittest.mock import patch
 
+import config
 from config import _is_true
 
 
@@ -18,3 +22,17 @@ class TestConfig(TestCase):
         self.assertTrue(_is_true("yes"))
         self.assertTrue(_is_true("y"))
         self.assertTrue(_is_true("1"))
+
+    def test_cache_ttls_without_a_shared_cache(self):
+        environ = {
+            key: value
+            for key, value in os.environ.items()
+            if key not in ("CACHE_REDIS_URL", "CACHE_TTL", "IS_RESPONDENT_ENROLLED_CACHE_TTL")
+        }
+        with patch.dict(os.environ, environ, clear=True):
+            unshared = importlib.reload(config).Config
+        importlib.reload(config)
+
+        self.assertIsNone(unshared.CACHE_REDIS_URL)
+        self.assertEqual(unshared.CACHE_TTL, 30)
+        self.assertEqual(unshared.IS_RESPONDENT_ENROLLED_CACHE_TTL, 10)
@@ -2,10 +2,21 @@ from test.party_client import PartyTestClient
 from unittest.mock import patch
 from uuid import UUID
 
+from flask import current_app
 from sqlalchemy.exc import DataError
 from sqlalchemy.orm.exc import NoResultFound
 
-from ras_party.controllers.enrolments_controller import respondent_enrolments
+from ras_party.controllers.account_controller import _change_respondent_enrolment_status
+from ras_party.controllers.cache_controller import (
+    business_cache_key,
+    is_respondent_enrolled_cache_key,
+)
+from ras_party.controllers.enrolments_controller import (
+    invalidate_is_respondent_enrolled,
+    is_respondent_enrolled,
+    rebuild_enrolment_summary,
+    respondent_enrolments,
+)
 from ras_party.models.models import (
     Business,
     BusinessAttributes,
@@ -13,6 +24,8 @@ from ras_party.models.models import (
     Enrolment,
     EnrolmentStatus,
     Respondent,
+    RespondentEnrolmentSummary,
+    RespondentStatus,
 )
 from ras_party.support.session_decorator import with_db_session
 
@@ -177,6 +190,213 @@ class TestEnrolments(PartyTestClient):
         with self.assertRaises(DataError):
             respondent_enrolments(party_uuid="malformed_id")
 
+    def test_enrolment_summary_follows_enrolment_changes(self):
+        self._update_enrolment_status("98e2c9dd-a760-47dd-ba18-439fd5fb93a3", EnrolmentStatus.SUSPENDED)
+        self._delete_enrolment("75d9af56-1225-4d43-b41d-1199f5f89daa")
+
+        summary = self._enrolment_summary()
+        self.assertEqual(
+            summary,
+            {
+                ("98e2c9dd-a760-47dd-ba18-439fd5fb93a3", "SUSPENDED", "Business 2"),
+                ("af25c9d5-6893-4342-9d24-4b88509e965f", "ENABLED", "Business 3"),
+            },
+        )
+
+    def test_enrolment_summary_follows_business_attribute_changes(self):
+        self._add_business_attributes("af25c9d5-6893-4342-9d24-4b88509e965f", "Business 3 Renamed")
+
+        summary = self._enrolment_summary()
+        self.assertIn(("af25c9d5-6893-4342-9d24-4b88509e965f", "ENABLED", "Business 3 Renamed"), summary)
+
+    def test_enrolment_summary_follows_business_attribute_updates_and_deletes(self):
+        self._add_business_attributes("af25c9d5-6893-4342-9d24-4b88509e965f", "Business 3 Renamed")
+        self._rename_business_attributes("Business 3 Renamed", "Business 3 Renamed Again")
+        self.assertIn(
+            ("af25c9d5-6893-4342-9d24-4b88509e965f", "ENABLED", "Business 3 Renamed Again"), self._enrolment_summary()
+        )
+
+        self._delete_business_attributes("Business 3 Renamed Again")
+
+        self.assertIn(("af25c9d5-6893-4342-9d24-4b88509e965f", "ENABLED", "Business 3"), self._enrolment_summary())
+
+    def test_rebuild_enrolment_summary(self):
+        expected = self._enrolment_summary()
+        self._clear_enrolment_summary()
+        self.assertEqual(self._enrolment_summary(), set())
+
+        records = rebuild_enrolment_summary()
+
+        self.assertEqual(records, 4)
+        self.assertEqual(self._enrolment_summary(), expected)
+
+    def test_is_respondent_enrolled(self):
+        self._activate_respondent("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85")
+
+        self.assertTrue(
+            is_respondent_enrolled(
+                "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+                "75d9af56-1225-4d43-b41d-1199f5f89daa",
+                "9200d295-9d6e-41fe-b541-747ae67a279f",
+            )
+        )
+        self.assertFalse(
+            is_respondent_enrolled(
+                "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+                "75d9af56-1225-4d43-b41d-1199f5f89daa",
+                "c641f6ad-a5eb-4d82-a647-7cd586549bbc",
+            )
+        )
+
+    def test_is_respondent_enrolled_respondent_not_active(self):
+        self.assertFalse(
+            is_respondent_enrolled(
+                "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+                "75d9af56-1225-4d43-b41d-1199f5f89daa",
+                "9200d295-9d6e-41fe-b541-747ae67a279f",
+            )
+        )
+
+    def test_is_respondent_enrolled_is_cached_until_invalidated(self):
+        self._activate_respondent("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85")
+        enrolment = (
+            "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+            "75d9af56-1225-4d43-b41d-1199f5f89daa",
+            "9200d295-9d6e-41fe-b541-747ae67a279f",
+        )
+        self.assertTrue(is_respondent_enrolled(*enrolment))
+
+        self._delete_enrolment("75d9af56-1225-4d43-b41d-1199f5f89daa")
+        self.assertTrue(is_respondent_enrolled(*enrolment))
+
+        invalidate_is_respondent_enrolled(*enrolment)
+        self.assertFalse(is_respondent_enrolled(*enrolment))
+
+    def test_new_enrolment_invalidates_is_respondent_enrolled(self):
+        self._activate_respondent("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85")
+        enrolment = (
+            "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+            "75d9af56-1225-4d43-b41d-1199f5f89daa",
+            "5a0f3e4c-8a1d-4d2b-9c3e-6f7a8b9c0d1e",
+        )
+        self.assertFalse(is_respondent_enrolled(*enrolment))
+
+        self._add_enrolment(*enrolment)
+
+        self.assertTrue(is_respondent_enrolled(*enrolment))
+
+    def test_respondent_status_change_invalidates_is_respondent_enrolled_and_businesses(self):
+        self._activate_respondent("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85")
+        enrolment = (
+            "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+            "75d9af56-1225-4d43-b41d-1199f5f89daa",
+            "9200d295-9d6e-41fe-b541-747ae67a279f",
+        )
+        self.assertTrue(is_respondent_enrolled(*enrolment))
+        business_key = business_cache_key("75d9af56-1225-4d43-b41d-1199f5f89daa")
+        current_app.cache.set(business_key, {"verbose": {}}, 30)
+
+        self._set_respondent_status("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85", RespondentStatus.SUSPENDED)
+
+        self.assertIsNone(current_app.cache.get(is_respondent_enrolled_cache_key(*enrolment)))
+        self.assertIsNone(current_app.cache.get(business_key))
+        self.assertFalse(is_respondent_enrolled(*enrolment))
+
+    @patch("ras_party.controllers.account_controller.get_case_id_for_business_survey")
+    @patch("ras_party.controllers.account_controller.post_case_event")
+    def test_change_respondent_enrolment_status_invalidates_is_respondent_enrolled(self, _, __):
+        self._activate_respondent("b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85")
+        self.assertTrue(
+            is_respondent_enrolled(
+                "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+                "75d9af56-1225-4d43-b41d-1199f5f89daa",
+                "9200d295-9d6e-41fe-b541-747ae67a279f",
+            )
+        )
+        cache_key = is_respondent_enrolled_cache_key(
+            "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+            "75d9af56-1225-4d43-b41d-1199f5f89daa",
+            "9200d295-9d6e-41fe-b541-747ae67a279f",
+        )
+        self.assertTrue(current_app.cache.get(cache_key))
+
+        self._change_enrolment_status(
+            "b6f9d6e8-b840-4c95-a6ce-9ef145dd1f85",
+            "75d9af56-1225-4d43-b41d-1199f5f89daa",
+            "9200d295-9d6e-41fe-b541-747ae67a279f",
+            "DISABLED",
+        )
+
+        self.assertIsNone(current_app.cache.get(cache_key))
+
+    @with_db_session
+    def _activate_respondent(self, party_uuid, session):
+        session.query(Respondent).filter(Respondent.party_uuid == party_uuid).update(
+            {Respondent.status: RespondentStatus.ACTIVE}
+        )
+
+    @with_db_session
+    def _add_enrolment(self, party_uuid, business_id, survey_id, session):
+        respondent = session.query(Respondent).filter(Respondent.party_uuid == party_uuid).one()
+        session.add(
+            Enrolment(
+                respondent_id=respondent.id,
+                business_id=business_id,
+                survey_id=survey_id,
+                status=EnrolmentStatus.ENABLED,
+            )
+        )
+
+    @with_db_session
+    def _set_respondent_status(self, party_uuid, status, session):
+        respondent = session.query(Respondent).filter(Respondent.party_uuid == party_uuid).one()
+        respondent.status = status
+
+    @with_db_session
+    def _change_enrolment_status(self, party_uuid, business_id, survey_id, status, session):
+        respondent = session.query(Respondent).filter(Respondent.party_uuid == party_uuid).one()
+        _change_respondent_enrolment_status(respondent, survey_id, business_id, status, session)
+
+    @with_db_session
+    def _enrolment_summary(self, session):
+        return {
+            (str(summary.business_id), summary.status.name, summary.business_name)
+            for summary in session.query(RespondentEnrolmentSummary).all()
+        }
+
+    @with_db_session
+    def _clear_enrolment_summary(self, session):
+        session.query(RespondentEnrolmentSummary).delete()
+
+    @with_db_session
+    def _update_enrolment_status(self, business_id, status, session):
+        session.query(Enrolment).filter(Enrolment.business_id == business_id).update({Enrolment.status: status})
+
+    @with_db_session
+    def _delete_enrolment(self, business_id, session):
+        session.query(Enrolment).filter(Enrolment.business_id == business_id).delete()
+
+    @with_db_session
+    def _add_business_attributes(self, business_id, name, session):
+        session.add(
+            BusinessAttributes(
+                business_id=business_id, attributes={"name": name, "trading_as": name}, name=name, trading_as=name
+            )
+        )
+
+    @with_db_session
+    def _rename_business_attributes(self, name, new_name, session):
+        session.query(BusinessAttributes).filter(BusinessAttributes.name == name).update(
+            {
+                BusinessAttributes.attributes: {"name": new_name, "trading_as": new_name},
+                BusinessAttributes.name: new_name,
+            }
+        )
+
+    @with_db_session
+    def _delete_business_attributes(self, name, session):
+        session.query(BusinessAttributes).filter(BusinessAttributes.name == name).delete()
+
     @with_db_session
     def _add_enrolments(self, session):
         businesses = {}
@@ -11,6 +11,21 @@ class TestParties(PartyTestClient):
         self.assertIn("name", response_data)
         self.assertIn("version", response_data)
 
+    def test_metrics_endpoint(self):
+        self.client.open("/info", method="GET")
+
+        response = self.client.open("/metrics", method="GET")
+        metrics = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        self.assertIn(
+            'ras_party_request_duration_seconds_count{blueprint="info_view",method="GET",route="/info",status="200"}',
+            metrics,
+        )
+        self.assertIn("ras_party_db_pool_checked_out_connections", metrics)
+        self.assertIn("ras_party_db_pool_checkout_duration_seconds_count", metrics)
+
 
 if __name__ == "__main__":
     import unittest
@@ -1,6 +1,7 @@
+from datetime import datetime, timedelta
 from unittest import TestCase
 
-from ras_party.models.models import Business
+from ras_party.models.models import Business, Respondent, hash_attributes
 
 
 class TestModels(TestCase):
@@ -48,6 +49,114 @@ class TestModels(TestCase):
 
         self.assertEqual(len(business.attributes), 1)
 
-        business.add_versioned_attributes(party_data)
+        business.add_versioned_attributes({**party_data, "sampleSummaryId": "428533295"})
 
         self.assertEqual(len(business.attributes), 2)
+
+    @staticmethod
+    def _party_data(sample_summary_id, **attributes):
+        names = {
+            "runame1": "Runame-1",
+            "runame2": "",
+            "runame3": "",
+            "tradstyle1": "",
+            "tradstyle2": "",
+            "tradstyle3": "",
+        }
+        return {
+            "sampleUnitType": "B",
+            "sampleUnitRef": "428533294",
+            "sampleSummaryId": sample_summary_id,
+            "attributes": {"ruref": "428533294", "region": "UK", "froempment": 8, "cell_no": 1, **names, **attributes},
+            "id": "99b6553e-025a-481c-a8f6-5f2e6505d751",
+        }
+
+    def test_business_stores_versioned_attributes_as_deltas(self):
+        business = Business.from_party_dict(self._party_data("1", source="sample"))
+        snapshot = business.attributes[0]
+
+        business.add_versioned_attributes(self._party_data("2", region="WW"), snapshot_interval=3)
+        business.add_versioned_attributes(self._party_data("3", froempment=9), snapshot_interval=3)
+        business.add_versioned_attributes(self._party_data("4", cell_no=2), snapshot_interval=3)
+
+        _, delta, other_delta, new_snapshot = business.attributes
+        self.assertIs(delta.base, snapshot)
+        self.assertEqual(delta.attributes, {"region": "WW", "name": "Runame-1", "trading_as": ""})
+        self.assertEqual(delta.removed_attributes, ["source"])
+        self.assertEqual(
+            delta.full_attributes, self._party_data("2", region="WW", name="Runame-1", trading_as="")["attributes"]
+        )
+        self.assertIs(other_delta.base, snapshot)
+        self.assertEqual(other_delta.full_attributes["froempment"], 9)
+        self.assertIsNone(new_snapshot.base)
+        self.assertEqual(new_snapshot.full_attributes["cell_no"], 2)
+
+    def test_business_stores_versioned_attributes_in_full_when_mostly_changed(self):
+        business = Business.from_party_dict(self._party_data("1"))
+
+        party_data = self._party_data("2", ruref="49900000001", region="WW", froempment=9, cell_no=2, runame1="Other")
+        business.add_versioned_attributes(party_data, 10)
+
+        self.assertIsNone(business.attributes[1].base)
+        self.assertEqual(business.attributes[1].attributes["region"], "WW")
+
+    def test_business_compresses_attributes(self):
+        business = Business.from_party_dict(self._party_data("1"))
+        for version in range(2, 5):
+            business.add_versioned_attributes(self._party_data(str(version), froempment=version))
+        for days, version in enumerate(business.attributes):
+            version.created_on = datetime(2026, 1, 1) + timedelta(days=days)
+        full_attributes = [version.full_attributes for version in business.attributes]
+
+        self.assertEqual(business.compress_attributes(2), 2)
+        self.assertEqual([version.base is None for version in business.attributes], [True, False, True, False])
+        self.assertEqual([version.full_attributes for version in business.attributes], full_attributes)
+
+        self.assertEqual(business.compress_attributes(0), 0)
+        self.assertEqual([version.attributes for version in business.attributes], full_attributes)
+
+    def test_business_doesnt_add_identical_versioned_attributes(self):
+        business = Business.from_party_dict(self._party_data("1"))
+
+        # The same attributes in a different order, for the same sample
+        party_data = self._party_data("1")
+        party_data["attributes"] = dict(reversed(party_data["attributes"].items()))
+        self.assertIs(business.add_versioned_attributes(party_data), business.attributes[0])
+        self.assertIs(business.identical_attributes(party_data), business.attributes[0])
+        self.assertEqual(len(business.attributes), 1)
+
+        self.assertIsNone(business.identical_attributes(self._party_data("1", region="WW")))
+        business.add_versioned_attributes(self._party_data("1", region="WW"))
+        business.add_versioned_attributes(self._party_data("2"))
+        self.assertEqual(len(business.attributes), 3)
+
+    def test_business_adds_versioned_attributes_changed_back(self):
+        business = Business.from_party_dict(self._party_data("1"))
+        business.add_versioned_attributes(self._party_data("1", region="WW"))
+
+        # Back to the first version's content, which is no longer the latest for the sample
+        added = business.add_versioned_attributes(self._party_data("1"))
+
+        self.assertEqual(len(business.attributes), 3)
+        self.assertIs(added, business.attributes[2])
+        self.assertIs(business.identical_attributes(self._party_data("1")), added)
+        self.assertIsNone(business.identical_attributes(self._party_data("1", region="WW")))
+
+    def test_business_compares_attributes_stored_without_a_hash(self):
+        business = Business.from_party_dict(self._party_data("1"))
+        business.attributes[0].attributes_hash = None
+
+        business.add_versioned_attributes(self._party_data("1"))
+
+        self.assertEqual(len(business.attributes), 1)
+        self.assertEqual(hash_attributes({"a": 1, "b": [2]}), hash_attributes({"b": [2], "a": 1}))
+
+    def test_respondent_email_addresses_are_stored_lower_case(self):
+        respondent = Respondent(email_address="Mixed.Case@Example.COM", pending_email_address="New@Example.COM")
+
+        self.assertEqual(respondent.email_address, "mixed.case@example.com")
+        self.assertEqual(respondent.pending_email_address, "new@example.com")
+
+        respondent.pending_email_address = None
+
+        self.assertIsNone(respondent.pending_email_address)
@@ -1,13 +1,16 @@
 from concurrent.futures import TimeoutError
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from flask import current_app
 from flask_testing import TestCase
+from prometheus_client import REGISTRY
 
 from ras_party.controllers.notify_gateway import NotifyGateway
 from ras_party.exceptions import RasNotifyError
 from run import create_app
 
+PUBLISH_COUNT = "ras_party_pubsub_publish_duration_seconds_count"
+
 
 class TestNotifyGatewayUnit(TestCase):
     """
@@ -77,3 +80,47 @@ class TestNotifyGatewayUnit(TestCase):
         notify.publisher = publisher
         with self.assertRaises(RasNotifyError):
             notify.request_to_notify("test@email.com", "notify_account_locked")
+
+    def test_request_to_notify_records_publish_latency_by_outcome(self):
+        publisher = MagicMock()
+        publisher.publish.return_value.result.side_effect = ["msg_id", TimeoutError("bad")]
+        notify = NotifyGateway(current_app.config)
+        notify.publisher = publisher
+        successes = REGISTRY.get_sample_value(PUBLISH_COUNT, {"outcome": "success"}) or 0
+        timeouts = REGISTRY.get_sample_value(PUBLISH_COUNT, {"outcome": "timeout"}) or 0
+
+        notify.request_to_notify("test@email.com", "notify_account_locked")
+        with self.assertRaises(RasNotifyError):
+            notify.request_to_notify("test@email.com", "notify_account_locked")
+
+        self.assertEqual(REGISTRY.get_sample_value(PUBLISH_COUNT, {"outcome": "success"}), successes + 1)
+        self.assertEqual(REGISTRY.get_sample_value(PUBLISH_COUNT, {"outcome": "timeout"}), timeouts + 1)
+
+    def test_app_gateway_publishes_every_email_through_one_publisher(self):
+        with patch("ras_party.controllers.notify_gateway.pubsub_v1.PublisherClient") as publisher_client:
+            current_app.notify_gateway.request_to_notify("test@email.com", "notify_account_locked")
+            current_app.notify_gateway.request_to_notify("test@email.com", "request_password_change")
+
+        publisher_client.assert_called_once_with()
+        self.assertEqual(publisher_client.return_value.publish.call_count, 2)
+
+    def test_forked_process_creates_its_own_publisher(self):
+        notify = NotifyGateway(current_app.config)
+        with patch("ras_party.controllers.notify_gateway.pubsub_v1.PublisherClient") as publisher_client:
+            parent_publisher = notify.publisher
+            with patch("ras_party.controllers.notify_gateway.os.getpid", return_value=-1):
+                publisher_client.return_value = MagicMock()
+                child_publisher = notify.publisher
+
+        self.assertEqual(publisher_client.call_count, 2)
+        self.assertIsNot(parent_publisher, child_publisher)
+
+    def test_close_stops_the_publisher(self):
+        publisher = MagicMock()
+        notify = NotifyGateway(current_app.config)
+        notify.publisher = publisher
+
+        notify.close()
+        notify.close()
+
+        publisher.stop.assert_called_once_with()
@@ -2,7 +2,7 @@ import json
 import os
 import uuid
 from test.mocks import MockRequests
-from test.party_client import PartyTestClient, businesses
+from test.party_client import PartyTestClient, business_attributes, businesses
 from test.test_data.default_test_values import (
     DEFAULT_BUSINESS_UUID,
     DEFAULT_SURVEY_UUID,
@@ -19,12 +19,17 @@ from test.test_data.mock_respondent import (
     MockRespondentWithIdActive,
 )
 
+from flask import current_app
+from sqlalchemy import event
+
 from ras_party.controllers import account_controller
+from ras_party.controllers.cache_controller import business_cache_key
 from ras_party.controllers.queries import (
     query_business_by_party_uuid,
     query_respondent_by_party_uuid,
 )
 from ras_party.models.models import (
+    BusinessAttributes,
     BusinessRespondent,
     Enrolment,
     Respondent,
@@ -118,6 +123,66 @@ class TestParties(PartyTestClient):
         self.assertEqual(response.get("name"), mock_business.get("name"))
         self.assertEqual(response.get("trading_as"), "Tradstyle-1 Tradstyle-2 Tradstyle-3")
 
+    def test_get_business_by_id_is_invalidated_by_new_attributes(self):
+        mock_business = MockBusiness().as_business()
+        party_id = self.post_to_businesses(mock_business, 200)["id"]
+        self._make_business_attributes_active(mock_business)
+        self.assertEqual(self.get_business_by_id(party_id)["name"], mock_business["name"])
+
+        mock_business["runame1"] = "Renamed"
+        mock_business["sampleSummaryId"] = "new_sample_summary_id"
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business)
+
+        self.assertEqual(self.get_business_by_id(party_id)["name"], "Renamed Runame-2 Runame-3")
+
+    def test_get_business_by_id_returns_not_modified_for_matching_etag(self):
+        mock_business = MockBusiness().as_business()
+        party_id = self.post_to_businesses(mock_business, 200)["id"]
+        self._make_business_attributes_active(mock_business)
+        url = f"/party-api/v1/businesses/id/{party_id}"
+
+        etag = self.client.get(url, headers=self.auth_headers).headers["ETag"]
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        # Each representation has its own ETag
+        response = self.client.get(f"{url}?verbose=true", headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 200)
+
+        mock_business["runame1"] = "Renamed"
+        mock_business["sampleSummaryId"] = "new_sample_summary_id"
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business)
+
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json["name"], "Renamed Runame-2 Runame-3")
+
+    def test_get_business_by_id_serves_the_body_of_its_etag(self):
+        mock_business = MockBusiness().as_business()
+        party_id = self.post_to_businesses(mock_business, 200)["id"]
+        self._make_business_attributes_active(mock_business)
+        url = f"/party-api/v1/businesses/id/{party_id}"
+        etag = self.client.get(url, headers=self.auth_headers).headers["ETag"]
+        cached = current_app.cache.get(business_cache_key(party_id))
+
+        mock_business["runame1"] = "Renamed"
+        mock_business["sampleSummaryId"] = "new_sample_summary_id"
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business)
+        # The old business cached again, as by a request that read it before the change and cached it after
+        current_app.cache.set(business_cache_key(party_id), cached, 30)
+
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 200)
+        self.assertEqual(response.json["name"], "Renamed Runame-2 Runame-3")
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": response.headers["ETag"]})
+        self.assertStatus(response, 304)
+
     def test_get_business_by_ids_returns_correct_representation(self):
         mock_business_1 = MockBusiness().as_business()
         mock_business_2 = MockBusiness().as_business()
@@ -162,6 +227,42 @@ class TestParties(PartyTestClient):
         self.assertEqual(res_dict[party_id_2].get("sampleSummaryId"), mock_business_2["sampleSummaryId"])
         self.assertEqual(res_dict[party_id_2].get("name"), mock_business_2.get("name"))
 
+    def test_get_business_by_ids_matches_the_business_summary_dict(self):
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business)
+        self.associate_business_and_respondent(
+            business_id=mock_business["id"], respondent_id=self.mock_respondent_with_id["id"]
+        )
+        self.populate_with_enrolment()
+        self.populate_with_enrolment(enrolment=MockEnrolmentPending().attributes(survey_id="other").as_enrolment())
+        other_mock_business = MockBusiness().as_business()
+        other_party_id = self.post_to_businesses(other_mock_business, 200)["id"]
+        self._make_business_attributes_active(other_mock_business)
+
+        response = self.get_businesses_by_ids([DEFAULT_BUSINESS_UUID, other_party_id])
+
+        res_dict = {res["id"]: res for res in response}
+        business_summary_dict = self._business_summary_dict(DEFAULT_BUSINESS_UUID)
+        for summary in (res_dict[DEFAULT_BUSINESS_UUID], business_summary_dict):
+            summary["associations"][0]["enrolments"].sort(key=lambda enrolment: enrolment["surveyId"])
+        self.assertEqual(res_dict[DEFAULT_BUSINESS_UUID], business_summary_dict)
+        self.assertEqual(len(business_summary_dict["associations"][0]["enrolments"]), 2)
+        self.assertEqual(res_dict[other_party_id]["associations"], [])
+
+    @with_db_session
+    def _business_summary_dict(self, party_uuid, session):
+        business_summary_dict = query_business_by_party_uuid(party_uuid, session).to_business_summary_dict()
+        return json.loads(json.dumps(business_summary_dict, default=str))
+
+    def test_get_business_by_ids_with_no_active_attributes_returns_400(self):
+        party_id = self.post_to_businesses(MockBusiness().as_business(), 200)["id"]
+
+        response = self.get_businesses_by_ids([party_id], expected_status=400)
+        self.assertEqual(response["description"], "Business with reference does not have any active attributes.")
+
     def test_get_business_by_ids_with_only_an_unknown_id_returns_nothing(self):
         response = self.get_businesses_by_ids([str(uuid.uuid4())])
         self.assertEqual(len(response), 0)
@@ -231,6 +332,32 @@ class TestParties(PartyTestClient):
         sample_id = mock_business["sampleSummaryId"]
         self.put_to_businesses_sample_link(sample_id, {}, 400)
 
+    def test_delete_business_attributes_by_sample_summary_id_deletes_in_batches(self):
+        sample_id = str(uuid.uuid4())
+        for _ in range(3):
+            self.post_to_businesses(MockBusiness().attributes(sampleSummaryId=sample_id).as_business(), 200)
+        other_business = MockBusiness().as_business()
+        self.post_to_businesses(other_business, 200)
+        self.app.config["DELETE_ATTRIBUTES_BATCH_SIZE"] = 2
+
+        self.delete_business_attributes_by_sample_summary_id(sample_id)
+
+        remaining = [attributes for business in businesses() for attributes in business.attributes]
+        self.assertEqual(len(remaining), 1)
+        self.assertEqual(remaining[0].sample_summary_id, other_business["sampleSummaryId"])
+
+    def test_delete_business_attributes_by_sample_summary_id_dry_run(self):
+        sample_id = str(uuid.uuid4())
+        for _ in range(2):
+            self.post_to_businesses(MockBusiness().attributes(sampleSummaryId=sample_id).as_business(), 200)
+
+        response = self.delete_business_attributes_by_sample_summary_id(
+            sample_id, expected_status=200, query_string={"dry_run": "true"}
+        )
+
+        self.assertEqual(response.json, {"sampleSummaryId": sample_id, "records": 2})
+        self.assertEqual(sum(len(business.attributes) for business in businesses()), 2)
+
     def test_get_business_by_ref_returns_correct_representation(self):
         with open(f"{project_root}/test/test_data/business/get_business_by_ref.json") as json_data:
             expected = json.load(json_data)
@@ -262,6 +389,19 @@ class TestParties(PartyTestClient):
         for x in mock_party_b:
             self.assertTrue(x in response)
 
+    def test_get_party_by_id_returns_not_modified_for_matching_etag(self):
+        mock_party_b = MockBusiness().as_party()
+        party_id_b = self.post_to_parties(mock_party_b, 200)["id"]
+        self._make_business_attributes_active(mock_party_b)
+        url = f"/party-api/v1/parties/type/B/id/{party_id_b}"
+
+        etag = self.client.get(url, headers=self.auth_headers).headers["ETag"]
+
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 304)
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": '"stale"'})
+        self.assertStatus(response, 200)
+
     def test_get_party_by_id_no_active_attributes_returns_404(self):
         mock_party_b = MockBusiness().as_party()
         party_id_b = self.post_to_parties(mock_party_b, 200)["id"]
@@ -292,6 +432,37 @@ class TestParties(PartyTestClient):
         self.assertEqual(len(businesses()), 1)
         self.assertEqual(response_2["attributes"]["version"], 2)
 
+    def test_identical_party_isnt_stored_again(self):
+        mock_business = MockBusiness().attributes(version=1)
+        response = self.post_to_parties(mock_business.as_party(), 200)
+
+        # Retries and reloads of the same sample, as a party and as a business
+        self.assertEqual(self.post_to_parties(mock_business.as_party(), 200), response)
+        self.assertEqual(self.patch_to_parties(mock_business.as_party(), 200), response)
+        self.assertEqual(
+            self.post_to_businesses(mock_business.as_business(), 200)["attributes"], response["attributes"]
+        )
+        self.assertEqual(len(business_attributes()), 1)
+
+        mock_business.attributes(version=2)
+        self.post_to_parties(mock_business.as_party(), 409)
+        self.assertEqual(self.patch_to_parties(mock_business.as_party(), 200)["attributes"]["version"], 2)
+        self.assertEqual(len(business_attributes()), 2)
+
+    def test_party_changed_back_is_stored_again(self):
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self.post_to_businesses({**mock_business, "region": "WW"}, 200)
+
+        response = self.post_to_businesses(mock_business, 200)
+
+        self.assertEqual(len(business_attributes()), 3)
+        self.assertEqual(response["attributes"]["region"], "UK")
+        self._make_business_attributes_active(mock_business)
+        business = self.get_business_by_id(DEFAULT_BUSINESS_UUID, query_string={"verbose": True})
+        self.assertEqual(business["region"], "UK")
+
     def test_post_businesses_with_no_body_returns_400(self):
         self.post_to_businesses(None, 400)
 
@@ -332,9 +503,64 @@ class TestParties(PartyTestClient):
             business_id=mock_business["id"], respondent_id=self.mock_respondent_with_id["id"]
         )  # NOQA
         self.populate_with_enrolment()  # NOQA
-        self.get_party_by_id_filtered_by_survey_and_enrolment(
+        self.populate_with_enrolment(enrolment=MockEnrolmentPending().attributes(survey_id="other").as_enrolment())
+        party = self.get_party_by_id_filtered_by_survey_and_enrolment(
             "B", mock_business["id"], DEFAULT_SURVEY_UUID, ["ENABLED", "PENDING"]
         )
+        self.assertEqual(
+            party["associations"],
+            [
+                {
+                    "partyId": self.mock_respondent_with_id["id"],
+                    "enrolments": [{"surveyId": DEFAULT_SURVEY_UUID, "enrolmentStatus": "ENABLED"}],
+                }
+            ],
+        )
+        self.assertEqual(party["name"], mock_business["name"])
+
+        respondent = self.get_party_by_id_filtered_by_survey_and_enrolment(
+            "BI", self.mock_respondent_with_id["id"], "other", []
+        )
+        self.assertEqual(
+            respondent["associations"],
+            [{"partyId": DEFAULT_BUSINESS_UUID, "enrolments": [{"surveyId": "other", "enrolmentStatus": "PENDING"}]}],
+        )
+
+    def test_get_party_by_survey_id_lists_associations_in_party_id_order(self):
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        party_ids = [
+            "c0000000-0000-4000-8000-000000000000",
+            "a0000000-0000-4000-8000-000000000000",
+            "b0000000-0000-4000-8000-000000000000",
+        ]
+        self._enrol_respondents(DEFAULT_BUSINESS_UUID, party_ids, DEFAULT_SURVEY_UUID)
+
+        party = self.get_party_by_id_filtered_by_survey_and_enrolment(
+            "B", DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID, []
+        )
+
+        self.assertEqual([association["partyId"] for association in party["associations"]], sorted(party_ids))
+
+    @with_db_session
+    def _enrol_respondents(self, business_id, party_ids, survey_id, session):
+        for number, party_id in enumerate(party_ids):
+            respondent = Respondent(
+                party_uuid=party_id,
+                email_address=f"respondent{number}@example.com",
+                first_name="First",
+                last_name="Last",
+                telephone="0123456789",
+                status=RespondentStatus.ACTIVE,
+            )
+            session.add(respondent)
+            session.flush()
+            session.add(BusinessRespondent(business_id=business_id, respondent_id=respondent.id))
+            session.add(
+                Enrolment(business_id=business_id, respondent_id=respondent.id, survey_id=survey_id, status="ENABLED")
+            )
 
     def test_get_party_by_survey_id_and_enrolment_statuses_with_invalid_enrolment(self):
         self.populate_with_respondent(respondent=self.mock_respondent_with_id)
@@ -346,9 +572,172 @@ class TestParties(PartyTestClient):
             business_id=mock_business["id"], respondent_id=self.mock_respondent_with_id["id"]
         )
         self.populate_with_enrolment(enrolment=self.mock_enrolment_disabled)  # NOQA
-        self.get_party_by_id_filtered_by_survey_and_enrolment(
+        party = self.get_party_by_id_filtered_by_survey_and_enrolment(
             "B", mock_business["id"], DEFAULT_SURVEY_UUID, ["ENABLED", "PENDING"]
         )
+        self.assertEqual(party["associations"], [])
+
+    def test_get_party_by_survey_id_and_enrolment_statuses_not_found(self):
+        self.get_party_by_id_filtered_by_survey_and_enrolment("B", DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID, [], 404)
+        self.get_party_by_id_filtered_by_survey_and_enrolment("XX", DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID, [], 400)
+
+    def test_get_business_attributes_selects_attribute_keys(self):
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        # Not linked to a collection exercise, so it isn't returned
+        self.post_to_businesses(MockBusiness().as_business(), 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+
+        attributes = self.get_business_attributes(DEFAULT_BUSINESS_UUID)
+        self.assertEqual(list(attributes), ["test_id"])
+        self.assertEqual(attributes["test_id"]["attributes"]["froempment"], 8)
+
+        attributes = self.get_business_attributes(DEFAULT_BUSINESS_UUID, attribute_key=["froempment", "missing"])
+        self.assertEqual(attributes["test_id"]["attributes"], {"froempment": 8, "missing": None})
+        self.assertEqual(attributes["test_id"]["sample_summary_id"], mock_business["sampleSummaryId"])
+
+    def test_post_businesses_attributes(self):
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        other_business_id = str(uuid.uuid4())
+
+        attributes = self.post_businesses_attributes(
+            {"business_ids": [DEFAULT_BUSINESS_UUID, other_business_id], "attribute_keys": ["ruref"]}
+        )
+        self.assertEqual(
+            attributes[DEFAULT_BUSINESS_UUID]["test_id"]["attributes"], {"ruref": mock_business["sampleUnitRef"]}
+        )
+        self.assertEqual(attributes[other_business_id], {})
+
+        self.post_businesses_attributes({"business_ids": []}, 400)
+        self.post_businesses_attributes({"business_ids": ["not-a-uuid"]}, 400)
+        self.post_businesses_attributes({"business_ids": DEFAULT_BUSINESS_UUID}, 400)
+        self.post_businesses_attributes({"business_ids": [1]}, 400)
+        self.post_businesses_attributes({"business_ids": [None]}, 400)
+        self.post_businesses_attributes({"business_ids": [DEFAULT_BUSINESS_UUID], "collection_exercise_ids": [1]}, 400)
+        self.post_businesses_attributes({"business_ids": [DEFAULT_BUSINESS_UUID], "attribute_keys": "ruref"}, 400)
+
+    def test_search_businesses_by_attributes(self):
+        collection_exercise_id = str(uuid.uuid4())
+        refs = []
+        for region in ("WW", "WW", "YY"):
+            mock_business = MockBusiness().attributes(region=region).as_business()
+            self.post_to_businesses(mock_business, 200)
+            self.put_to_businesses_sample_link(
+                mock_business["sampleSummaryId"], {"collectionExerciseId": collection_exercise_id}, 200
+            )
+            refs.append(mock_business["sampleUnitRef"])
+        other_business = MockBusiness().attributes(region="WW").as_business()
+        self.post_to_businesses(other_business, 200)
+        self._make_business_attributes_active(mock_business=other_business)
+
+        search = {"collection_exercise_id": collection_exercise_id, "attributes": {"region": "WW", "cell_no": 1}}
+        result = self.search_businesses_by_attributes(search)
+        self.assertEqual(result["total_count"], 2)
+        self.assertFalse(result["total_count_estimated"])
+        self.assertEqual([attributes["attributes"]["ruref"] for attributes in result["attributes"]], refs[:2])
+
+        result = self.search_businesses_by_attributes({**search, "page": 2, "limit": 1, "attribute_keys": ["ruref"]})
+        self.assertEqual(result["attributes"][0]["attributes"], {"ruref": refs[1]})
+        self.assertEqual(result["total_count"], 2)
+
+        result = self.search_businesses_by_attributes({**search, "max_rec": 1})
+        self.assertTrue(result["total_count_estimated"])
+        self.assertGreaterEqual(result["total_count"], 2)
+        self.assertEqual(len(result["attributes"]), 2)
+
+        result = self.search_businesses_by_attributes({**search, "attributes": {"region": "ZZ"}})
+        self.assertEqual(result, {"attributes": [], "total_count": 0, "total_count_estimated": False})
+
+        self.search_businesses_by_attributes({**search, "collection_exercise_id": "test_id"}, 400)
+        self.search_businesses_by_attributes({**search, "attributes": ["region"]}, 400)
+        self.search_businesses_by_attributes({**search, "page": 0}, 400)
+        self.search_businesses_by_attributes({**search, "limit": "many"}, 400)
+        self.search_businesses_by_attributes({**search, "limit": 1001}, 400)
+        self.search_businesses_by_attributes({**search, "max_rec": 100001}, 400)
+        self.search_businesses_by_attributes({**search, "attribute_keys": "region"}, 400)
+        self.search_businesses_by_attributes({**search, "attribute_keys": [1]}, 400)
+
+    def test_business_attributes_stored_as_deltas(self):
+        self.app.config["ATTRIBUTES_SNAPSHOT_INTERVAL"] = 3
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        versions = []
+        for region in ("UK", "WW", "YY"):
+            mock_business = {**mock_business, "sampleSummaryId": str(uuid.uuid4()), "region": region}
+            response = self.post_to_businesses(mock_business, 200)
+            self.assertEqual(response["attributes"]["region"], region)
+            collection_exercise_id = str(uuid.uuid4())
+            self.put_to_businesses_sample_link(
+                mock_business["sampleSummaryId"], {"collectionExerciseId": collection_exercise_id}, 200
+            )
+            versions.append((collection_exercise_id, mock_business))
+
+        snapshot, *deltas = business_attributes()
+        self.assertIsNone(snapshot.base_id)
+        for delta in deltas:
+            self.assertEqual(delta.base_id, snapshot.id)
+            self.assertEqual(set(delta.attributes), {"region", "name", "trading_as"})
+
+        full_attributes = snapshot.attributes
+        for collection_exercise_id, mock_business in versions:
+            business = self.get_business_by_id(
+                DEFAULT_BUSINESS_UUID, query_string={"collection_exercise_id": collection_exercise_id, "verbose": True}
+            )
+            self.assertEqual(business, {**business, **full_attributes, "region": mock_business["region"]})
+
+            attributes = self.post_businesses_attributes({"business_ids": [DEFAULT_BUSINESS_UUID]})
+            self.assertEqual(
+                attributes[DEFAULT_BUSINESS_UUID][collection_exercise_id]["attributes"],
+                {**full_attributes, "region": mock_business["region"]},
+            )
+
+            search = {"collection_exercise_id": collection_exercise_id, "attributes": {"cell_no": 1}}
+            self.assertEqual(self.search_businesses_by_attributes(search)["total_count"], 1)
+            search["attributes"]["region"] = "UK"
+            self.assertEqual(
+                self.search_businesses_by_attributes(search)["total_count"], int(mock_business["region"] == "UK")
+            )
+
+        self.delete_business_attributes_by_sample_summary_id(versions[0][1]["sampleSummaryId"])
+
+        self.assertEqual([attributes.base_id for attributes in business_attributes()], [None, None])
+        attributes = self.post_businesses_attributes({"business_ids": [DEFAULT_BUSINESS_UUID]})[DEFAULT_BUSINESS_UUID]
+        self.assertEqual(set(attributes), {versions[1][0], versions[2][0]})
+        self.assertEqual(attributes[versions[2][0]]["attributes"], {**full_attributes, "region": "YY"})
+
+    def test_business_attributes_deltas_load_their_snapshots_together(self):
+        self.app.config["ATTRIBUTES_SNAPSHOT_INTERVAL"] = 3
+        for _ in range(3):
+            mock_business = MockBusiness().as_business()
+            mock_business["id"] = str(uuid.uuid4())
+            self.post_to_businesses(mock_business, 200)
+            self.post_to_businesses({**mock_business, "sampleSummaryId": str(uuid.uuid4()), "region": "WW"}, 200)
+
+        statements, regions = self._load_deltas()
+
+        self.assertEqual(regions, ["WW", "WW", "WW"])
+        # One for the deltas and one for all of their snapshots
+        self.assertEqual(len(statements), 2)
+
+    @with_db_session
+    def _load_deltas(self, session):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        connection = session.connection()
+        event.listen(connection, "before_cursor_execute", record)
+        try:
+            deltas = session.query(BusinessAttributes).filter(BusinessAttributes.base_id.isnot(None)).all()
+            regions = [delta.full_attributes["region"] for delta in deltas]
+        finally:
+            event.remove(connection, "before_cursor_execute", record)
+        return statements, regions
 
     def test_get_latest_business_details(self):
         mock_business = MockBusiness().as_business()
@@ -1,5 +1,6 @@
 import json
 import uuid
+from functools import partial
 from test.mocks import MockRequests, MockResponse
 from test.party_client import (
     PartyTestClient,
@@ -40,6 +41,7 @@ from werkzeug.exceptions import Conflict, InternalServerError, NotFound
 
 from config import TestingConfig
 from ras_party.controllers import account_controller, respondent_controller
+from ras_party.controllers.cache_controller import respondent_cache_key
 from ras_party.controllers.queries import (
     query_business_by_party_uuid,
     query_respondent_by_party_uuid,
@@ -57,6 +59,7 @@ from ras_party.models.models import (
     Respondent,
     RespondentStatus,
 )
+from ras_party.support.parallel import call_in_parallel
 from ras_party.support.public_website import PublicWebsite
 from ras_party.support.requests_wrapper import Requests
 from ras_party.support.session_decorator import with_db_session
@@ -68,6 +71,14 @@ url_request_collection_exercises_for_survey = (
 url_casegroups_for_business = f"{TestingConfig.CASE_URL}/casegroups/partyid/3b136c4b-7a14-4904-9e01-13364dd7b972"
 url_get_cases_for_casegroup = f"{TestingConfig.CASE_URL}/cases/casegroupid/612f5c34-7e11-4740-8e24-cb321a86a917"
 url_change_respondent_enrolment_status = f"{TestingConfig.CASE_URL}/cases/10b04906-f478-47f9-a985-783400dd8482/events"
+# The second casegroup of the business belongs to this collection exercise of the alternate survey
+ALTERNATE_COLLECTION_EXERCISE = "9af403f8-5fc5-43b1-9fca-afbd9c65da5c"
+ALTERNATE_CASE = "3cd1a33a-e8b4-4d4d-9a93-2a4b5b0a8f76"
+url_alternate_collection_exercises_for_survey = (
+    f"{TestingConfig.COLLECTION_EXERCISE_URL}/collectionexercises/survey/{ALTERNATE_SURVEY_UUID}"
+)
+url_alternate_cases_for_casegroup = f"{TestingConfig.CASE_URL}/cases/casegroupid/f68c70d6-4a30-48bf-9c35-0202d3c2893f"
+url_alternate_case_event = f"{TestingConfig.CASE_URL}/cases/{ALTERNATE_CASE}/events"
 
 with open(f"{project_root}/test/test_data/respondent/ces_for_survey.json") as fp:
     ces_for_survey = json.load(fp)
@@ -86,7 +97,7 @@ class TestRespondents(PartyTestClient):
         self.mock_requests = MockRequests()
         Requests._lib = self.mock_requests
         self.mock_notify = MagicMock()
-        account_controller.NotifyGateway = MagicMock(return_value=self.mock_notify)
+        self.app.notify_gateway = self.mock_notify
         self.mock_respondent = MockRespondent().attributes().as_respondent()
         self.mock_respondent_with_id = MockRespondentWithId().attributes().as_respondent()
         self.mock_respondent_with_id_suspended = MockRespondentWithIdSuspended().attributes().as_respondent()
@@ -240,6 +251,20 @@ class TestRespondents(PartyTestClient):
         self.assertEqual(len(response), 1)
         self.assertEqual(res_dict[respondent_1.party_uuid]["emailAddress"], "res1@example.com")
 
+    def test_get_respondent_by_ids_matches_the_respondent_dict(self):
+        respondent = self.populate_with_respondent(
+            respondent=MockRespondent().attributes(pendingEmailAddress="pending@example.com").as_respondent()
+        )
+
+        response = self.get_respondents_by_ids([respondent.party_uuid])
+
+        self.assertEqual(response, [self._respondent_dict(respondent.party_uuid)])
+
+    @with_db_session
+    def _respondent_dict(self, party_uuid, session):
+        respondent_dict = query_respondent_by_party_uuid(party_uuid, session).to_respondent_dict()
+        return json.loads(json.dumps(respondent_dict, default=str))
+
     def test_get_respondent_by_ids_with_only_unknown_id_returns_none(self):
         self.populate_with_respondent()
         party_uuid = str(uuid.uuid4())
@@ -950,7 +975,7 @@ class TestRespondents(PartyTestClient):
     def test_request_password_change_uses_case_insensitive_email_query():
         with patch("ras_party.controllers.account_controller.query_respondent_by_email") as query, patch(
             "ras_party.support.session_decorator.current_app.db"
-        ) as db, patch("ras_party.controllers.account_controller.NotifyGateway"), patch(
+        ) as db, patch("ras_party.controllers.account_controller.current_app.notify_gateway"), patch(
             "ras_party.controllers.account_controller.PublicWebsite"
         ):
             payload = {"email_address": "test@example.test"}
@@ -989,7 +1014,7 @@ class TestRespondents(PartyTestClient):
         with patch("ras_party.controllers.account_controller.query_respondent_by_email") as query, patch(
             "ras_party.support.session_decorator.current_app.db"
         ) as db, patch("ras_party.controllers.account_controller.OauthClient") as client, patch(
-            "ras_party.controllers.account_controller.NotifyGateway"
+            "ras_party.controllers.account_controller.current_app.notify_gateway"
         ):
             client().update_account().status_code = 201
             payload = {"new_password": "abc", "email_address": "test@example.test", "token": "test_token"}
@@ -1019,18 +1044,16 @@ class TestRespondents(PartyTestClient):
         with patch("ras_party.controllers.account_controller.query_respondent_by_email") as query, patch(
             "ras_party.support.session_decorator.current_app.db"
         ) as db, patch("ras_party.controllers.account_controller.OauthClient") as client, patch(
-            "ras_party.controllers.account_controller.NotifyGateway"
+            "ras_party.controllers.account_controller.current_app.notify_gateway"
         ) as notify:
-            notify.side_effect = RasNotifyError(mock.Mock())
+            notify.request_to_notify.side_effect = RasNotifyError(mock.Mock())
             client().update_account().status_code = 201
             payload = {"new_password": "abc", "email_address": "test@example.test", "token": "test_token"}
             account_controller.change_respondent_password(payload)
             query.assert_called_once_with("test@example.test", db.session())
 
     def test_notify_account_lock(self):
-        with patch("ras_party.controllers.account_controller.NotifyGateway"), patch(
-            "ras_party.controllers.account_controller.PublicWebsite"
-        ):
+        with patch.object(self.app, "notify_gateway"), patch("ras_party.controllers.account_controller.PublicWebsite"):
             self.populate_with_respondent(respondent=self.mock_respondent_with_id_suspended)
             party_id = self.mock_respondent_with_id["id"]
             db_respondent = respondents()[0]
@@ -1048,11 +1071,11 @@ class TestRespondents(PartyTestClient):
         self.put_respondent_account_status(payload, party_id, expected_status=400)
 
     def test_notify_account_ras_notify_error(self):
-        with patch("ras_party.controllers.account_controller.NotifyGateway") as notify, patch(
+        with patch.object(self.app, "notify_gateway") as notify, patch(
             "ras_party.controllers.account_controller.PublicWebsite"
         ):
             with self.assertLogs() as ctx:
-                notify.side_effect = RasNotifyError(mock.Mock())
+                notify.request_to_notify.side_effect = RasNotifyError(mock.Mock())
                 self.populate_with_respondent(respondent=self.mock_respondent_with_id_suspended)
                 party_id = self.mock_respondent_with_id["id"]
                 db_respondent = respondents()[0]
@@ -1066,6 +1089,34 @@ class TestRespondents(PartyTestClient):
                     if "ERROR" in logs.levelname:
                         self.assertIn("Error sending request to Notify Gateway", logs.message)
 
+    def test_password_reset_counter_increases_are_not_lost(self):
+        respondent = self.populate_with_respondent()
+        party_uuid = str(respondent.party_uuid)
+        with self.app.app_context():
+            counters = call_in_parallel(
+                partial(account_controller.increase_password_counter, party_uuid) for _ in range(8)
+            )
+            # Each increase is made by the database, so none of them see the same counter
+            self.assertCountEqual(counters, range(2, 10))
+            self.assertEqual(account_controller.get_password_counter(party_uuid), 9)
+            account_controller.reset_password_counter(party_uuid)
+            self.assertEqual(account_controller.get_password_counter(party_uuid), 0)
+            with self.assertRaises(NotFound):
+                account_controller.increase_password_counter(str(uuid.uuid4()))
+
+    def test_delete_password_verification_token(self):
+        respondent = self.populate_with_respondent()
+        party_uuid = str(respondent.party_uuid)
+        with self.app.app_context():
+            account_controller.add_respondent_password_token(party_uuid, "token")
+            self.assertEqual(account_controller.get_respondent_password_token(party_uuid), "token")
+            account_controller.delete_respondent_password_token(party_uuid, "token")
+            self.assertIsNone(account_controller.get_respondent_password_token(party_uuid))
+            with self.assertRaisesRegex(NotFound, "Verification token not found"):
+                account_controller.delete_respondent_password_token(party_uuid, "token")
+            with self.assertRaisesRegex(NotFound, "Respondent id does not exist"):
+                account_controller.delete_respondent_password_token(str(uuid.uuid4()), "token")
+
     def test_verify_token_with_bad_secrets(self):
         # Given a respondent exists with an invalid token
         respondent = self.populate_with_respondent()
@@ -1126,6 +1177,16 @@ class TestRespondents(PartyTestClient):
         response = self.put_email_to_respondents(put_data)
         self.assertTrue(respondents()[0].email_address == response["emailAddress"])
 
+    def test_put_respondent_email_change_of_case_is_not_a_change(self):
+        self.populate_with_respondent()
+        put_data = {
+            "email_address": self.mock_respondent["emailAddress"],
+            "new_email_address": self.mock_respondent["emailAddress"].upper(),
+        }
+        self.put_email_to_respondents(put_data)
+        self.assertIsNone(respondents()[0].pending_email_address)
+        self.assertFalse(self.mock_notify.request_to_notify.called)
+
     def test_put_respondent_email_returns_409_existing_email(self):
         respondent = self.populate_with_respondent()
         mock_respondent_b = self.mock_respondent.copy()
@@ -1350,7 +1411,7 @@ class TestRespondents(PartyTestClient):
     def test_post_respondent_uses_case_insensitive_email_query(self):
         with patch("ras_party.controllers.queries.query_respondent_by_email") as query, patch(
             "ras_party.support.session_decorator.current_app.db"
-        ) as db, patch("ras_party.controllers.account_controller.NotifyGateway"), patch(
+        ) as db, patch.object(self.app, "notify_gateway"), patch(
             "ras_party.controllers.account_controller.Requests"
         ), patch(
             "ras_party.controllers.account_controller.request_iac"
@@ -1552,27 +1613,149 @@ class TestRespondents(PartyTestClient):
         }
         self.put_enrolment_status(request_json, 500)
 
-    @mock.patch("ras_party.controllers.account_controller.get_case_id_for_business_survey")
-    @mock.patch("ras_party.controllers.case_controller.post_case_event")
-    def test_disable_all_respondent_enrolments_disables_all_enrolments(self, mock_post_case, mock_get_case):
-        mock_get_case.return_value = "fdd36c0d-3037-4b80-9352-0da0f4acd777"
+    def test_disable_all_respondent_enrolments_disables_all_enrolments(self):
         respondent_email = self._create_enrolments(second_enrolment_status="PENDING")
         with responses.RequestsMock() as rsps:
-            url_post_case_event = f"{TestingConfig.CASE_URL}/cases/fdd36c0d-3037-4b80-9352-0da0f4acd777/events"
-            rsps.add(rsps.POST, url_post_case_event, json={})
+            self._add_case_lookups(rsps)
+            rsps.add(rsps.POST, url_change_respondent_enrolment_status, json={})
+            rsps.add(rsps.POST, url_alternate_case_event, json={})
             response = self.patch_disable_all_respondent_enrolments(respondent_email, expected_status=200)
             assert response == {"message": "2 enrolments removed"}
+            # The casegroups of the business are only requested once for both of its surveys
+            rsps.assert_call_count(url_casegroups_for_business, 1)
+            rsps.assert_call_count(url_change_respondent_enrolment_status, 1)
+            rsps.assert_call_count(url_alternate_case_event, 1)
+        self.assertEqual({enrolment.status for enrolment in enrolments()}, {EnrolmentStatus.DISABLED})
 
-    @mock.patch("ras_party.controllers.account_controller.get_case_id_for_business_survey")
-    @mock.patch("ras_party.controllers.case_controller.post_case_event")
-    def test_disable_all_respondent_enrolments_ignores_already_disabled_enrolments(self, mock_post_case, mock_get_case):
-        mock_get_case.return_value = "fdd36c0d-3037-4b80-9352-0da0f4acd777"
+    def test_disable_all_respondent_enrolments_ignores_already_disabled_enrolments(self):
         respondent_email = self._create_enrolments(second_enrolment_status="DISABLED")
-        with responses.RequestsMock() as rsps:
-            url_post_case_event = f"{TestingConfig.CASE_URL}/cases/fdd36c0d-3037-4b80-9352-0da0f4acd777/events"
-            rsps.add(rsps.POST, url_post_case_event, json={})
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            self._add_case_lookups(rsps)
+            rsps.add(rsps.POST, url_change_respondent_enrolment_status, json={})
             response = self.patch_disable_all_respondent_enrolments(respondent_email, expected_status=200)
             assert response == {"message": "1 enrolments removed"}
+            rsps.assert_call_count(url_change_respondent_enrolment_status, 1)
+            self.assertEqual(
+                json.loads(rsps.calls[-1].request.body)["category"],
+                "NO_ACTIVE_ENROLMENTS",
+            )
+
+    def test_put_enrolment_statuses_changes_each_enrolment(self):
+        self._create_enrolments(second_enrolment_status="ENABLED")
+        changes = [
+            {
+                "respondent_id": DEFAULT_RESPONDENT_UUID,
+                "business_id": DEFAULT_BUSINESS_UUID,
+                "survey_id": DEFAULT_SURVEY_UUID,
+                "change_flag": "SUSPENDED",
+            },
+            {
+                "respondent_id": DEFAULT_RESPONDENT_UUID,
+                "business_id": DEFAULT_BUSINESS_UUID,
+                "survey_id": ALTERNATE_SURVEY_UUID,
+                "change_flag": "DISABLED",
+            },
+        ]
+        with responses.RequestsMock() as rsps:
+            self._add_case_lookups(rsps)
+            rsps.add(rsps.POST, url_change_respondent_enrolment_status, json={})
+            rsps.add(rsps.POST, url_alternate_case_event, json={})
+            response = self.put_enrolment_statuses(changes)
+            rsps.assert_call_count(url_casegroups_for_business, 1)
+            rsps.assert_call_count(url_change_respondent_enrolment_status, 1)
+            rsps.assert_call_count(url_alternate_case_event, 1)
+
+        self.assertEqual(response, [{**change, "result": "UPDATED", "case_event": "SENT"} for change in changes])
+        statuses = {enrolment.survey_id: enrolment.status for enrolment in enrolments()}
+        self.assertEqual(
+            statuses, {DEFAULT_SURVEY_UUID: EnrolmentStatus.SUSPENDED, ALTERNATE_SURVEY_UUID: EnrolmentStatus.DISABLED}
+        )
+
+    def test_put_enrolment_statuses_reports_each_row(self):
+        self._create_enrolments(second_enrolment_status="ENABLED")
+        changes = [
+            {
+                "respondent_id": DEFAULT_RESPONDENT_UUID,
+                "business_id": DEFAULT_BUSINESS_UUID,
+                "survey_id": DEFAULT_SURVEY_UUID,
+                "change_flag": "DISABLED",
+            },
+            {
+                "respondent_id": DEFAULT_RESPONDENT_UUID,
+                "business_id": DEFAULT_BUSINESS_UUID,
+                "survey_id": "00000000-0ac8-41d3-ae0e-567e5ea1ef87",
+                "change_flag": "DISABLED",
+            },
+        ]
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            self._add_case_lookups(rsps)
+            rsps.add(rsps.POST, url_change_respondent_enrolment_status, status=500)
+            response = self.put_enrolment_statuses(changes)
+
+        # The change is kept when its case event fails, and an enrolment that doesn't exist is reported
+        self.assertEqual(
+            response,
+            [
+                {**changes[0], "result": "UPDATED", "case_event": "FAILED"},
+                {**changes[1], "result": "NOT_FOUND", "case_event": None},
+            ],
+        )
+        statuses = {enrolment.survey_id: enrolment.status for enrolment in enrolments()}
+        self.assertEqual(statuses[DEFAULT_SURVEY_UUID], EnrolmentStatus.DISABLED)
+
+    def test_put_enrolment_statuses_posts_the_events_of_the_cases_found(self):
+        self._create_enrolments(second_enrolment_status="ENABLED")
+        changes = [
+            {
+                "respondent_id": DEFAULT_RESPONDENT_UUID,
+                "business_id": DEFAULT_BUSINESS_UUID,
+                "survey_id": survey_id,
+                "change_flag": "DISABLED",
+            }
+            for survey_id in (DEFAULT_SURVEY_UUID, ALTERNATE_SURVEY_UUID)
+        ]
+        # The alternate survey's collection exercises can't be retrieved, then its case can't be read
+        for alternate_lookup in (
+            {"method": "GET", "url": url_alternate_collection_exercises_for_survey, "status": 500},
+            {"method": "GET", "url": url_alternate_cases_for_casegroup, "json": {"unexpected": "response"}},
+        ):
+            with self.subTest(alternate_lookup=alternate_lookup["url"]):
+                with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                    rsps.add(**alternate_lookup)
+                    self._add_case_lookups(rsps)
+                    rsps.add(rsps.POST, url_change_respondent_enrolment_status, json={})
+                    response = self.put_enrolment_statuses(changes)
+                    rsps.assert_call_count(url_change_respondent_enrolment_status, 1)
+                    rsps.assert_call_count(url_alternate_case_event, 0)
+
+                self.assertEqual(
+                    response,
+                    [
+                        {**changes[0], "result": "UPDATED", "case_event": "SENT"},
+                        {**changes[1], "result": "UPDATED", "case_event": "FAILED"},
+                    ],
+                )
+
+    def test_put_enrolment_statuses_bad_requests(self):
+        change = {
+            "respondent_id": DEFAULT_RESPONDENT_UUID,
+            "business_id": DEFAULT_BUSINESS_UUID,
+            "survey_id": DEFAULT_SURVEY_UUID,
+            "change_flag": "DISABLED",
+        }
+        self.put_enrolment_statuses([], 400)
+        self.put_enrolment_statuses([{**change, "change_flag": "REMOVED"}], 400)
+        self.put_enrolment_statuses([{**change, "business_id": "not-a-uuid"}], 400)
+        self.put_enrolment_statuses([{key: value for key, value in change.items() if key != "survey_id"}], 400)
+        self.put_enrolment_statuses([change, {**change, "change_flag": "ENABLED"}], 400)
+
+    @staticmethod
+    def _add_case_lookups(rsps):
+        rsps.add(rsps.GET, url_request_collection_exercises_for_survey, json=ces_for_survey)
+        rsps.add(rsps.GET, url_alternate_collection_exercises_for_survey, json=[{"id": ALTERNATE_COLLECTION_EXERCISE}])
+        rsps.add(rsps.GET, url_casegroups_for_business, json=business_casegroups)
+        rsps.add(rsps.GET, url_get_cases_for_casegroup, json=cases_for_casegroup)
+        rsps.add(rsps.GET, url_alternate_cases_for_casegroup, json=[{"id": ALTERNATE_CASE}])
 
     def _create_enrolments(self, second_enrolment_status):
         def mock_put_iac(*args, **kwargs):
@@ -1657,8 +1840,8 @@ class TestRespondents(PartyTestClient):
             "ras_party.controllers.account_controller.current_app"
         ), patch("ras_party.support.session_decorator.current_app.db"), patch(
             "ras_party.controllers.account_controller.enrol_respondent_for_survey"
-        ), patch(
-            "ras_party.controllers.account_controller.NotifyGateway"
+        ), patch.object(
+            self.app, "notify_gateway"
         ), patch(
             "ras_party.controllers.account_controller.OauthClient"
         ) as auth, patch(
@@ -1856,9 +2039,9 @@ class TestRespondents(PartyTestClient):
         respondent_controller.update_respondent_mark_for_deletion(respondent.email_address)
         response_respondent = self.get_respondent_by_id(respondent.party_uuid)
         self.assertEqual(response_respondent["markForDeletion"], True)
-        with patch("ras_party.controllers.respondent_controller.NotifyGateway") as respondent_mock_notify:
+        with patch.object(self.app, "notify_gateway") as respondent_mock_notify:
             respondent_controller.delete_respondents_marked_for_deletion()
-            self.assertTrue(respondent_mock_notify.called)
+            self.assertTrue(respondent_mock_notify.request_to_notify.called)
 
         with self.assertRaises(Exception):
             self.get_respondent_by_id(respondent.party_uuid)
@@ -2023,6 +2206,66 @@ class TestRespondents(PartyTestClient):
         # Then the respondent is returned
         self.assertEqual(respondent.id, respondent_by_party_id.id)
 
+    def test_get_respondent_by_party_id_returns_not_modified_for_matching_etag(self):
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)
+        respondent_id = self.mock_respondent_with_id["id"]
+        url = f"/party-api/v1/respondents/party_id/{respondent_id}"
+
+        etag = self.client.get(url, headers=self.auth_headers).headers["ETag"]
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 304)
+
+        payload = {"firstName": "John", "lastName": "Snow", "telephone": "07837230942"}
+        self.change_respondent_details(respondent_id, payload, 200)
+
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json["firstName"], "John")
+
+    def test_get_respondent_by_party_id_serves_the_body_of_its_etag(self):
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)
+        respondent_id = self.mock_respondent_with_id["id"]
+        url = f"/party-api/v1/respondents/party_id/{respondent_id}"
+        etag = self.client.get(url, headers=self.auth_headers).headers["ETag"]
+
+        # Changed without invalidating the cached respondent, as by a worker whose invalidation hasn't arrived
+        self._set_first_name(respondent_id, "John")
+
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": etag})
+        self.assertStatus(response, 200)
+        self.assertEqual(response.json["firstName"], "John")
+        response = self.client.get(url, headers={**self.auth_headers, "If-None-Match": response.headers["ETag"]})
+        self.assertStatus(response, 304)
+
+    @with_db_session
+    def _set_first_name(self, party_uuid, first_name, session):
+        session.query(Respondent).filter(Respondent.party_uuid == party_uuid).update(
+            {Respondent.first_name: first_name}
+        )
+
+    def test_get_respondent_dict_by_party_id_reads_password_fields_from_the_database(self):
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)
+        respondent_id = self.mock_respondent_with_id["id"]
+        respondent_controller.get_respondent_dict_by_party_id(respondent_id)
+
+        cached = current_app.cache.get(respondent_cache_key(respondent_id))["value"]
+        self.assertEqual(str(cached["id"]), respondent_id)
+        self.assertNotIn("password_verification_token", cached)
+        self.assertNotIn("password_reset_counter", cached)
+
+        self._set_password_fields(respondent_id, "token", 3)
+
+        respondent = respondent_controller.get_respondent_dict_by_party_id(respondent_id)
+        self.assertEqual(respondent["password_verification_token"], "token")
+        self.assertEqual(respondent["password_reset_counter"], 3)
+
+    @with_db_session
+    def _set_password_fields(self, party_uuid, token, counter, session):
+        session.query(Respondent).filter(Respondent.party_uuid == party_uuid).update(
+            {Respondent.password_verification_token: token, Respondent.password_reset_counter: counter}
+        )
+
     @with_db_session
     def _enroll_respondent(self, session):
         respondent = self.populate_with_respondent(respondent=self.mock_respondent)
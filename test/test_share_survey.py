@@ -1,6 +1,10 @@
 import uuid
 from test.mocks import MockRequests
-from test.party_client import PartyTestClient
+from test.party_client import (
+    PartyTestClient,
+    business_respondent_associations,
+    enrolments,
+)
 from test.test_data.default_test_values import (
     DEFAULT_BUSINESS_UUID,
     DEFAULT_RESPONDENT_UUID,
@@ -55,7 +59,7 @@ class TestShareSurvey(PartyTestClient):
         self.mock_pending_share = MockPendingShares().attributes().as_pending_shares()
         self.pending_share = None
         self.mock_notify = MagicMock()
-        account_controller.NotifyGateway = MagicMock(return_value=self.mock_notify)
+        self.app.notify_gateway = self.mock_notify
 
     @with_db_session
     def populate_pending_share(self, session):
@@ -152,6 +156,79 @@ class TestShareSurvey(PartyTestClient):
         # Then
         self.assertEqual(response, 2)
 
+    def test_share_survey_users_for_many_businesses_and_surveys(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        self.associate_business_and_respondent(
+            business_id=mock_business["id"], respondent_id=self.mock_respondent_with_id["id"]
+        )  # NOQA
+        self.populate_with_enrolment()  # NOQA
+        self.populate_pending_share()
+        # When
+        payload = {
+            "business_surveys": [
+                {"business_id": DEFAULT_BUSINESS_UUID, "survey_id": DEFAULT_SURVEY_UUID},
+                {"business_id": DEFAULT_BUSINESS_UUID, "survey_id": "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99"},
+            ]
+        }
+        response = self.post_pending_survey_users(payload)
+        # Then
+        self.assertEqual(
+            response,
+            [
+                {"business_id": DEFAULT_BUSINESS_UUID, "survey_id": DEFAULT_SURVEY_UUID, "count": 2},
+                {"business_id": DEFAULT_BUSINESS_UUID, "survey_id": "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99", "count": 0},
+            ],
+        )
+        # Transfers don't count pending shares
+        payload["is_transfer"] = True
+        response = self.post_pending_survey_users(payload)
+        self.assertEqual(response[0]["count"], 1)
+
+    def test_share_survey_users_for_many_businesses_and_surveys_ids_in_any_form(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        self.associate_business_and_respondent(
+            business_id=mock_business["id"], respondent_id=self.mock_respondent_with_id["id"]
+        )  # NOQA
+        self.populate_with_enrolment()  # NOQA
+        self.populate_pending_share()
+        business_id = DEFAULT_BUSINESS_UUID.upper()
+        survey_id = "{" + DEFAULT_SURVEY_UUID + "}"
+        # When
+        response = self.post_pending_survey_users(
+            {"business_surveys": [{"business_id": business_id, "survey_id": survey_id}]}
+        )
+        # Then the users are counted and the ids given are returned
+        self.assertEqual(response, [{"business_id": business_id, "survey_id": survey_id, "count": 2}])
+
+    def test_share_survey_users_for_many_businesses_and_surveys_invalid_survey_id(self):
+        # Given
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        # When
+        response = self.post_pending_survey_users(
+            {"business_surveys": [{"business_id": DEFAULT_BUSINESS_UUID, "survey_id": "not-a-uuid"}]}, 400
+        )
+        # Then
+        self.assertIn("must be valid UUIDs", response["description"])
+
+    def test_share_survey_users_for_many_businesses_and_surveys_bad_request(self):
+        # When
+        response = self.post_pending_survey_users({"business_surveys": [{"business_id": DEFAULT_BUSINESS_UUID}]}, 400)
+        # Then
+        self.assertEqual(response["description"], ["Required key 'survey_id' is missing."])
+
     def test_share_survey_users_with_pending_share_bad_request(self):
         # Given
         self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
@@ -258,6 +335,108 @@ class TestShareSurvey(PartyTestClient):
             pending_share_email.assert_called()
             pending_share_email.assert_called_once()
 
+    def test_post_pending_shares_sends_business_names(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        # When
+        payload = {
+            "pending_shares": [
+                {
+                    "business_id": DEFAULT_BUSINESS_UUID,
+                    "survey_id": DEFAULT_SURVEY_UUID,
+                    "email_address": "test@test.com",
+                    "shared_by": self.mock_respondent_with_id["id"],
+                },
+                {
+                    "business_id": DEFAULT_BUSINESS_UUID,
+                    "survey_id": "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99",
+                    "email_address": "test@test.com",
+                    "shared_by": self.mock_respondent_with_id["id"],
+                },
+            ]
+        }
+        with patch("ras_party.views.pending_survey_view.send_pending_survey_email") as pending_share_email:
+            self.post_pending_surveys(payload)
+            # Then
+            personalisation = pending_share_email.call_args.args[0]
+            self.assertEqual(personalisation["BUSINESSES"], ["Runame-1 Runame-2 Runame-3"])
+
+    def test_post_pending_shares_fail_already_in_progress(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        self.populate_pending_share()
+        # When
+        payload = {
+            "pending_shares": [
+                {
+                    "business_id": DEFAULT_BUSINESS_UUID,
+                    "survey_id": "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99",
+                    "email_address": "test@test.com",
+                    "shared_by": self.mock_respondent_with_id["id"],
+                },
+                {
+                    "business_id": DEFAULT_BUSINESS_UUID,
+                    "survey_id": DEFAULT_SURVEY_UUID,
+                    "email_address": "test@test.com",
+                    "shared_by": self.mock_respondent_with_id["id"],
+                },
+            ]
+        }
+        # Then
+        response = self.post_pending_surveys_fail(payload)
+        self.assertEqual(response["description"], "This pending survey is already in progress")
+        self.assertFalse(
+            self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99")
+        )
+
+    def test_post_pending_shares_fail_duplicate_share(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        # When
+        pending_share = {
+            "business_id": DEFAULT_BUSINESS_UUID,
+            "survey_id": DEFAULT_SURVEY_UUID,
+            "email_address": "test@test.com",
+            "shared_by": self.mock_respondent_with_id["id"],
+        }
+        payload = {"pending_shares": [pending_share, pending_share]}
+        # Then
+        with patch("ras_party.views.pending_survey_view.send_pending_survey_email") as pending_share_email:
+            response = self.post_pending_surveys_fail(payload)
+            self.assertEqual(response["description"], "This pending survey is already in progress")
+            self.assertFalse(self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID))
+            pending_share_email.assert_not_called()
+
+    def test_post_pending_shares_fail_unknown_business(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        # When
+        payload = {
+            "pending_shares": [
+                {
+                    "business_id": DEFAULT_BUSINESS_UUID,
+                    "survey_id": DEFAULT_SURVEY_UUID,
+                    "email_address": "test@test.com",
+                    "shared_by": self.mock_respondent_with_id["id"],
+                }
+            ]
+        }
+        # Then
+        response = self.post_pending_surveys_fail(payload, expected_status=404)
+        self.assertEqual(response["description"], "Business with party id does not exist")
+
     def test_post_pending_shares_fail_invalid_payload(self):
         # Given
         self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
@@ -377,10 +556,59 @@ class TestShareSurvey(PartyTestClient):
         )  # NOQA
         self.populate_pending_share()
         self.assertTrue(self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID))
-        with patch("ras_party.controllers.pending_survey_controller.NotifyGateway") as pending_share_email:
+        with patch.object(self.app, "notify_gateway") as pending_share_email:
             self.confirm_pending_survey(self.mock_pending_share["batch_no"])
         self.assertFalse(self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID))
-        self.assertEqual(pending_share_email.call_count, 1)
+        self.assertEqual(pending_share_email.request_to_notify.call_count, 1)
+
+    def test_accept_share_survey_with_existing_enrolment(self):
+        # Given
+        self.populate_with_respondent(respondent=self.mock_respondent_test_with_id)
+        self.populate_with_respondent(respondent=self.mock_respondent_with_id)  # NOQA
+        mock_business = MockBusiness().as_business()
+        mock_business["id"] = DEFAULT_BUSINESS_UUID
+        self.post_to_businesses(mock_business, 200)
+        self._make_business_attributes_active(mock_business=mock_business)
+        mock_business_new = MockBusiness().as_business()
+        mock_business_new["id"] = "3b136c4b-7a14-4904-9e01-13364dd7b973"
+        self.post_to_businesses(mock_business_new, 200)
+        self._make_business_attributes_active(mock_business=mock_business_new)
+        self.associate_business_and_respondent(
+            business_id=mock_business["id"], respondent_id=self.mock_respondent_test_with_id["id"]
+        )  # NOQA
+        self.populate_with_enrolment()  # NOQA
+        batch_no = uuid.uuid1()
+        for business_id, survey_id in (
+            (DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID),
+            (DEFAULT_BUSINESS_UUID, "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99"),
+            (mock_business_new["id"], DEFAULT_SURVEY_UUID),
+        ):
+            self.populate_pending_survey(
+                {
+                    "email_address": "test@test.com",
+                    "business_id": business_id,
+                    "survey_id": survey_id,
+                    "shared_by": DEFAULT_RESPONDENT_UUID,
+                    "batch_no": batch_no,
+                }
+            )
+        # When
+        with patch.object(self.app, "notify_gateway"):
+            self.confirm_pending_survey(batch_no)
+        # Then
+        recipient_enrolments = {(str(e.business_id), e.survey_id, e.status.name) for e in enrolments()}
+        self.assertEqual(
+            recipient_enrolments,
+            {
+                (DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID, "ENABLED"),
+                (DEFAULT_BUSINESS_UUID, "cb0711c3-0ac8-41d3-ae0e-567e5ea1ef99", "ENABLED"),
+                (mock_business_new["id"], DEFAULT_SURVEY_UUID, "ENABLED"),
+            },
+        )
+        self.assertEqual(
+            {str(association.business_id) for association in business_respondent_associations()},
+            {DEFAULT_BUSINESS_UUID, mock_business_new["id"]},
+        )
 
     def test_accept_share_survey_verification_fail(self):
         # Given
@@ -416,13 +644,13 @@ class TestShareSurvey(PartyTestClient):
             "telephone": "076843676789",
             "batch_no": str(self.mock_pending_share["batch_no"]),
         }
-        with patch("ras_party.controllers.pending_survey_controller.NotifyGateway") as pending_share_email:
+        with patch.object(self.app, "notify_gateway") as pending_share_email:
             self.post_pending_survey_respondent(payload=payload)
         self.get_respondent_by_email(payload={"email": "testing@test.com"})
         self.get_pending_surveys_with_batch_no(
             self.mock_pending_share["batch_no"], expected_status=404, expected_quantity=0
         )
-        self.assertEqual(pending_share_email.call_count, 1)
+        self.assertEqual(pending_share_email.request_to_notify.call_count, 1)
 
     def test_post_share_survey_respondent_fail(self):
         # Given
@@ -571,11 +799,11 @@ class TestShareSurvey(PartyTestClient):
         }
         self.populate_pending_survey(mock_pending_survey_one)
         self.populate_pending_survey(mock_pending_survey_two)
-        with patch("ras_party.views.pending_survey_view.NotifyGateway") as pending_share_email:
+        with patch.object(self.app, "notify_gateway") as pending_share_email:
             not_found_response = self.post_resend_pending_surveys_email(
                 payload={"batch_no": batch_no}, expected_status=400
             )
-            self.assertEqual(pending_share_email.call_count, 0)
+            self.assertEqual(pending_share_email.request_to_notify.call_count, 0)
             self.assertEqual("Invalid request - batch_number missing", not_found_response["description"])
             invalid_request_response = self.post_resend_pending_surveys_email(
                 payload={"batch_number": uuid.uuid1()}, expected_status=404
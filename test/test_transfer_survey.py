@@ -55,7 +55,7 @@ class TestShareSurvey(PartyTestClient):
         self.mock_pending_transfer = MockPendingtransfers().attributes().as_pending_transfers()
         self.pending_transfer = None
         self.mock_notify = MagicMock()
-        account_controller.NotifyGateway = MagicMock(return_value=self.mock_notify)
+        self.app.notify_gateway = self.mock_notify
 
     @with_db_session
     def populate_pending_transfer(self, session, pending_transfer=None):
@@ -378,10 +378,10 @@ class TestShareSurvey(PartyTestClient):
         )  # NOQA
         self.populate_pending_transfer()
         self.assertTrue(self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID))
-        with patch("ras_party.controllers.pending_survey_controller.NotifyGateway") as pending_transfer_email:
+        with patch.object(self.app, "notify_gateway") as pending_transfer_email:
             self.confirm_pending_survey(self.mock_pending_transfer["batch_no"])
         self.assertFalse(self.is_pending_survey_registered(DEFAULT_BUSINESS_UUID, DEFAULT_SURVEY_UUID))
-        self.assertEqual(pending_transfer_email.call_count, 1)
+        self.assertEqual(pending_transfer_email.request_to_notify.call_count, 1)
 
     def test_accept_transfer_survey_verification_fail(self):
         # Given
@@ -417,13 +417,13 @@ class TestShareSurvey(PartyTestClient):
             "telephone": "076843676789",
             "batch_no": str(self.mock_pending_transfer["batch_no"]),
         }
-        with patch("ras_party.controllers.pending_survey_controller.NotifyGateway") as pending_transfer_email:
+        with patch.object(self.app, "notify_gateway") as pending_transfer_email:
             self.post_pending_survey_respondent(payload=payload)
         self.get_respondent_by_email(payload={"email": "testing@test.com"})
         self.get_pending_surveys_with_batch_no(
             self.mock_pending_transfer["batch_no"], expected_status=404, expected_quantity=0
         )
-        self.assertEqual(pending_transfer_email.call_count, 1)
+        self.assertEqual(pending_transfer_email.request_to_notify.call_count, 1)
 
     def test_post_transfer_survey_respondent_fail(self):
         # Given
@@ -578,11 +578,11 @@ class TestShareSurvey(PartyTestClient):
         }
         self.populate_pending_survey(mock_pending_survey_one)
         self.populate_pending_survey(mock_pending_survey_two)
-        with patch("ras_party.views.pending_survey_view.NotifyGateway") as pending_share_email:
+        with patch.object(self.app, "notify_gateway") as pending_share_email:
             not_found_response = self.post_resend_pending_surveys_email(
                 payload={"batch_no": batch_no}, expected_status=400
             )
-            self.assertEqual(pending_share_email.call_count, 0)
+            self.assertEqual(pending_share_email.request_to_notify.call_count, 0)
             self.assertEqual("Invalid request - batch_number missing", not_found_response["description"])
             invalid_request_response = self.post_resend_pending_surveys_email(
                 payload={"batch_number": uuid.uuid1()}, expected_status=404